@@ -0,0 +1,139 @@
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from tone import load_tone
+
+# pygame导入较慢，在音频线程中才导入
+pygame = None
+
+# 预留的mixer声道数：三连提示音也不会互相抢占
+RESERVED_CHANNELS = 3
+# 重复播放之间的间隔（秒）
+REPEAT_INTERVAL = 1.0
+
+
+class AudioWorker:
+    """常驻音频线程：初始化mixer、预加载提示音，按队列中的截止时间播放"""
+
+    def __init__(self, profiler, sound_file="alert.wav", clock=time.time, metrics=None):
+        self.profiler = profiler
+        self.sound_file = sound_file
+        self.clock = clock
+        self.cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tone_cache")
+        self.requests = queue.Queue()
+        self.ready = threading.Event()
+        self.sound = None
+        self.channels = []
+        # 从计划的提示时间到实际调用play()的延迟（秒）
+        self.latencies = deque(maxlen=500)
+        self.thread = None
+        self._requests_total = self._played_total = self._lateness = None
+        if metrics is not None:
+            self._requests_total = metrics.counter("alert_requests_total", "Alert playback requests queued to the audio worker")
+            self._played_total = metrics.counter("alert_plays_total", "Alert sounds started on a mixer channel")
+            self._lateness = metrics.histogram("alert_lateness_seconds", "Delay between the scheduled alert time and playback")
+
+    def start(self):
+        """启动音频线程（导入pygame和初始化mixer都在该线程中完成）"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def play(self, repeat_count=1, deadline=None):
+        """请求播放提示音；deadline为计划的提示时间，用于统计延迟"""
+        if deadline is None:
+            deadline = self.clock()
+        self.requests.put((deadline, repeat_count))
+        if self._requests_total is not None:
+            self._requests_total.inc()
+
+    def shutdown(self, timeout=1.0):
+        """停止音频线程并退出mixer"""
+        if self.thread is None:
+            return
+        self.requests.put(None)
+        self.thread.join(timeout)
+
+    def latency_stats(self):
+        """返回(次数, 平均延迟, 最大延迟)，单位为秒"""
+        samples = list(self.latencies)
+        if not samples:
+            return 0, 0.0, 0.0
+        return len(samples), sum(samples) / len(samples), max(samples)
+
+    def _init_mixer(self):
+        global pygame
+        if pygame is None:
+            pygame = self.profiler.import_module("pygame")
+        # 初始化pygame用于播放音效，使用更高的音质设置
+        with self.profiler.step("pygame.mixer.init"):
+            pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=1024)
+            pygame.mixer.set_reserved(RESERVED_CHANNELS)
+            self.channels = [pygame.mixer.Channel(i) for i in range(RESERVED_CHANNELS)]
+        with self.profiler.step("加载提示音"):
+            # 尝试加载提示音
+            try:
+                self.sound = pygame.mixer.Sound(self.sound_file)
+            except Exception:
+                print(f"警告：未找到提示音文件 '{self.sound_file}'，将使用默认系统声音")
+                # 创建一个柔和的提示音作为默认（按mixer的实际格式生成，并缓存到磁盘）
+                frequency, _, channels = pygame.mixer.get_init()
+                buf = load_tone(self.cache_dir, sample_rate=frequency, channels=channels)
+                self.sound = pygame.mixer.Sound(buffer=buf)
+            # 设置音量为最大值（只需设置一次）
+            self.sound.set_volume(1.0)
+
+    def _run(self):
+        try:
+            self._init_mixer()
+            self.ready.set()
+        except Exception as e:
+            print(f"初始化音频出错: {e}")
+        self.profiler.mark("音频就绪")
+        if self.profiler.enabled:
+            print(self.profiler.report())
+
+        pending = []  # 待播放的(计划时间, 序号, 剩余播放次数)
+        seq = itertools.count()
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, pending[0][0] - self.clock())
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                request = ()
+            if request is None:
+                break
+            if request:
+                deadline, repeat_count = request
+                if repeat_count > 0:
+                    heapq.heappush(pending, (deadline, next(seq), repeat_count))
+            while pending and pending[0][0] <= self.clock():
+                play_at, _, remaining = heapq.heappop(pending)
+                self._play_now(play_at)
+                if remaining > 1:
+                    # 下一次从实际播放的时刻起算：唤醒迟到（GC停顿、从挂起恢复）时三连提示音也不会同时响起
+                    heapq.heappush(pending, (self.clock() + REPEAT_INTERVAL, next(seq), remaining - 1))
+
+        if self.ready.is_set():
+            pygame.mixer.quit()
+
+    def _play_now(self, play_at):
+        if not self.ready.is_set():
+            return
+        try:
+            # 优先使用空闲的预留声道，都在播放时复用最早的一个
+            channel = next((c for c in self.channels if not c.get_busy()), self.channels[0])
+            channel.play(self.sound)
+            latency = self.clock() - play_at
+            self.latencies.append(latency)
+            if self._lateness is not None:
+                self._played_total.inc()
+                self._lateness.observe(max(0.0, latency))
+        except Exception as e:
+            print(f"播放提示音时出错: {e}")
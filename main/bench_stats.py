@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from compact_events import load_compact_history
+from stats_rollup import StatsRollup
+from stats_store import JournalStatsStore, seconds_to_hms, hms_to_seconds
+
+# 提示和工作时间段的密度（每天）
+DENSITIES = {
+    "light": {"alerts": (10, 30), "sessions": (1, 4)},
+    "heavy": {"alerts": (150, 300), "sessions": (10, 25)},
+}
+YEARS = (1, 5, 20)
+
+
+def generate_history(years, density, seed=0):
+    """生成与timer_stats.json格式相同的合成历史数据"""
+    rng = random.Random(seed)
+    alerts_range = DENSITIES[density]["alerts"]
+    sessions_range = DENSITIES[density]["sessions"]
+    first_day = date(2025, 1, 1) - timedelta(days=365 * years)
+    daily_stats = {}
+    for offset in range(365 * years):
+        day = (first_day + timedelta(days=offset)).isoformat()
+        alert_seconds = sorted(rng.randrange(8 * 3600, 23 * 3600) for _ in range(rng.randint(*alerts_range)))
+        sessions = []
+        for _ in range(rng.randint(*sessions_range)):
+            start = rng.randrange(8 * 3600, 22 * 3600)
+            duration = rng.randrange(5 * 60, min(90 * 60, 24 * 3600 - 1 - start))
+            sessions.append({
+                'start_time': seconds_to_hms(start),
+                'end_time': seconds_to_hms(start + duration),
+                'duration': seconds_to_hms(duration)
+            })
+        daily_stats[day] = {
+            "total_time": seconds_to_hms(sum(hms_to_seconds(s['duration']) for s in sessions)),
+            "alert_times": [seconds_to_hms(s) for s in alert_seconds],
+            "work_sessions": sessions,
+        }
+    return daily_stats
+
+
+def measure(fn, repeat):
+    """返回(最短耗时秒数, 峰值内存字节数)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def bench_history(workdir, years, density, repeat):
+    """对一份合成历史测量加载、保存、汇总和图表数据准备"""
+    stats_file = os.path.join(workdir, f"stats_{years}y_{density}.json")
+    with open(stats_file, "w", encoding="utf-8") as f:
+        json.dump(generate_history(years, density), f, ensure_ascii=False, indent=2)
+
+    store = JournalStatsStore(stats_file)
+    store.load()
+    days = store.days_in_range()
+    last_day = days[-1][0]
+    events_file = os.path.splitext(stats_file)[0] + ".events.bin"
+    results = {"years": years, "density": density, "days": len(days),
+               "file_bytes": os.path.getsize(stats_file)}
+
+    def cold_load():
+        # 没有快照缓存：解析JSON、转换旧格式并写入缓存
+        os.remove(store.cache_file)
+        JournalStatsStore(stats_file).load()
+
+    def load():
+        # 快照缓存有效时的启动加载
+        JournalStatsStore(stats_file).load()
+
+    def save_event():
+        # 一次会话结束：一次总时长增量、几次提示和一个时间段
+        store.record_total_time(last_day, 60)
+        for _ in range(5):
+            store.record_alert(last_day, "12:00:00")
+        store.record_work_session(last_day, {'start_time': "12:00:00", 'end_time': "12:01:00", 'duration': "00:01:00"})
+        store.save()
+
+    def compact():
+        store.compact()
+
+    def aggregate():
+        StatsRollup(os.path.join(workdir, "rollup.json")).rebuild(days, store.seq)
+
+    def chart_prep():
+        if os.path.exists(events_file):
+            os.remove(events_file)
+        history = load_compact_history(events_file, store)
+        sessions = [(d, start, duration)
+                    for d, _, _, day_sessions in history.iter_range()
+                    for start, _, duration in day_sessions]
+        history.close()
+        return sessions
+
+    for name, fn in (("cold_load", cold_load), ("load", load), ("save_event", save_event), ("compact", compact),
+                     ("aggregate", aggregate), ("chart_prep", chart_prep)):
+        seconds, peak = measure(fn, repeat)
+        results[name] = {"seconds": round(seconds, 6), "peak_bytes": peak}
+    return results
+
+
+def compare(results, baseline_file, threshold):
+    """与之前保存的结果比较，打印变慢超过阈值的项目"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {(r["years"], r["density"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    for r in results:
+        old = baseline.get((r["years"], r["density"]))
+        if not old:
+            continue
+        for name in ("cold_load", "load", "save_event", "compact", "aggregate", "chart_prep"):
+            if name not in old:
+                continue
+            ratio = r[name]["seconds"] / max(old[name]["seconds"], 1e-9)
+            if ratio > threshold:
+                regressions += 1
+                print(f"变慢: {r['years']}年/{r['density']} {name} {old[name]['seconds']:.4f}s -> {r[name]['seconds']:.4f}s (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="统计数据持久化与分析的规模基准测试")
+    parser.add_argument("--years", type=int, nargs="+", default=list(YEARS), help="历史年数")
+    parser.add_argument("--density", choices=sorted(DENSITIES), nargs="+", default=sorted(DENSITIES), help="提示密度")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最短耗时）")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    parser.add_argument("--compare", help="与之前的JSON结果比较")
+    parser.add_argument("--threshold", type=float, default=1.2, help="判定变慢的耗时比例")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="pomodoro-bench-")
+    try:
+        results = []
+        for years in args.years:
+            for density in args.density:
+                r = bench_history(workdir, years, density, args.repeat)
+                results.append(r)
+                print(f"{years:>2}年 {density:<5} {r['days']:>5}天 {r['file_bytes'] / 1e6:7.1f}MB  " + "  ".join(
+                    f"{name}={r[name]['seconds'] * 1000:.1f}ms/{r[name]['peak_bytes'] / 1e6:.1f}MB"
+                    for name in ("cold_load", "load", "save_event", "compact", "aggregate", "chart_prep")))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,368 @@
+import base64
+import hashlib
+import io
+import os
+import queue
+import threading
+import time
+
+# matplotlib在后台线程中首次使用时才导入
+Figure = None
+FigureCanvasAgg = None
+
+
+def load_matplotlib(profiler):
+    """导入matplotlib用于数据可视化（只使用Agg后端，可以在后台线程中绘制）"""
+    global Figure, FigureCanvasAgg
+    if Figure is None:
+        matplotlib = profiler.import_module("matplotlib")
+        # 配置matplotlib支持中文显示
+        matplotlib.rcParams['font.family'] = ['Songti SC']  # 使用Songti SC字体
+        matplotlib.rcParams['axes.unicode_minus'] = False  # 解决负号'-'显示为方块的问题
+        FigureCanvasAgg = profiler.import_module("matplotlib.backends.backend_agg").FigureCanvasAgg
+        Figure = profiler.import_module("matplotlib.figure").Figure
+
+
+def rotate_date_labels(ax):
+    """旋转x轴标签以避免重叠"""
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_ha('right')
+
+
+def build_alert_distribution(alert_hours):
+    """当前会话提示时间分布图"""
+    fig = Figure(figsize=(4, 3), dpi=80)
+    ax = fig.subplots()
+
+    # 绘制散点图
+    ax.scatter(range(len(alert_hours)), alert_hours, color='blue', s=50, alpha=0.7)
+    ax.set_xlabel('提示序号')
+    ax.set_ylabel('时间 (小时)')
+    ax.set_title('当前会话提示时间分布')
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+    # 设置y轴刻度为小时格式
+    ax.set_yticks([i for i in range(24)])
+    ax.set_yticklabels([f"{i:02d}:00" for i in range(24)])
+    return fig
+
+
+def build_runtime_trend(dates, runtimes):
+    """每日运行时长趋势图"""
+    fig = Figure(figsize=(4, 3), dpi=80)
+    ax = fig.subplots()
+    ax.plot(dates, runtimes, marker='o', linestyle='-', color='blue', linewidth=2, markersize=6)
+    ax.set_xlabel('日期')
+    ax.set_ylabel('运行时长 (小时)')
+    ax.set_title('每日运行时长趋势')
+    ax.grid(True, linestyle='--', alpha=0.7)
+    rotate_date_labels(ax)
+    fig.tight_layout()
+    return fig
+
+
+def build_alert_frequency(dates, alert_counts):
+    """每日提示频率图"""
+    fig = Figure(figsize=(4, 3), dpi=80)
+    ax = fig.subplots()
+    ax.bar(dates, alert_counts, color='green', alpha=0.7)
+    ax.set_xlabel('日期')
+    ax.set_ylabel('提示次数')
+    ax.set_title('每日提示频率')
+    ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+    rotate_date_labels(ax)
+    fig.tight_layout()
+    return fig
+
+
+def build_work_session_chart(all_sessions):
+    """工作时间段分布图（左：每日时间线，右：时长分布），all_sessions为(日期, 开始秒数, 时长秒数)"""
+    fig = Figure(figsize=(8, 3), dpi=80)
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # 左图：每日工作时间段时间线
+    dates = sorted(list(set([date for date, _, _ in all_sessions])))
+    y_positions = {date: i for i, date in enumerate(dates)}
+
+    for date, start_seconds, duration_seconds in all_sessions:
+        y_pos = y_positions[date]
+        start_hour = start_seconds // 60 / 60
+        duration_hours = duration_seconds / 3600
+
+        # 绘制时间段条形图
+        ax1.barh(y_pos, duration_hours, left=start_hour, height=0.6,
+                alpha=0.7, color='skyblue', edgecolor='navy')
+
+    ax1.set_yticks(range(len(dates)))
+    ax1.set_yticklabels(dates)
+    ax1.set_xlabel('时间 (小时)')
+    ax1.set_title('每日工作时间段分布')
+    ax1.set_xlim(0, 24)
+    ax1.set_xticks(range(0, 25, 4))
+    ax1.set_xticklabels([f"{i:02d}:00" for i in range(0, 25, 4)])
+    ax1.grid(True, axis='x', linestyle='--', alpha=0.7)
+
+    # 右图：工作时间段时长分布
+    durations = [duration / 3600 for _, _, duration in all_sessions]  # 转换为小时
+    ax2.hist(durations, bins=10, alpha=0.7, color='lightgreen', edgecolor='darkgreen')
+    ax2.set_xlabel('时间段时长 (小时)')
+    ax2.set_ylabel('频次')
+    ax2.set_title('工作时间段时长分布')
+    ax2.grid(True, axis='y', linestyle='--', alpha=0.7)
+
+    fig.tight_layout()
+    return fig
+
+
+def build_focus_heatmap(heatmap):
+    """星期 x 小时的提示热力图"""
+    fig = Figure(figsize=(4, 3), dpi=80)
+    ax = fig.subplots()
+    image = ax.imshow(heatmap, aspect='auto', cmap='YlOrRd', interpolation='nearest')
+    ax.set_yticks(range(7))
+    ax.set_yticklabels(['周一', '周二', '周三', '周四', '周五', '周六', '周日'])
+    ax.set_xticks(range(0, 24, 3))
+    ax.set_xticklabels([f"{i:02d}" for i in range(0, 24, 3)])
+    ax.set_xlabel('小时')
+    ax.set_title('提示时间热力图')
+    fig.colorbar(image, ax=ax)
+    fig.tight_layout()
+    return fig
+
+
+def build_interval_distribution(interval_bins):
+    """相邻两次提示的间隔分布（每分钟一个桶，最后一个为60分钟及以上）"""
+    fig = Figure(figsize=(4, 3), dpi=80)
+    ax = fig.subplots()
+    ax.bar(range(len(interval_bins)), interval_bins, width=1.0, color='orange', alpha=0.7, edgecolor='darkorange')
+    ax.set_xlabel('提示间隔 (分钟)')
+    ax.set_ylabel('次数')
+    ax.set_title('提示间隔分布')
+    ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+    fig.tight_layout()
+    return fig
+
+
+def build_rolling_averages(dates, daily_hours, rolling):
+    """每日工作时长及滚动平均，rolling为{窗口天数: 均值列表}"""
+    fig = Figure(figsize=(8, 3), dpi=80)
+    ax = fig.subplots()
+    positions = range(len(dates))
+    ax.bar(positions, daily_hours, color='lightgray', label='每日')
+    for (window, values), color in zip(sorted(rolling.items()), ('blue', 'red')):
+        ax.plot(positions, values, color=color, linewidth=2, label=f'{window}日平均')
+    step = max(1, len(dates) // 8)
+    ax.set_xticks(list(positions)[::step])
+    ax.set_xticklabels(dates[::step])
+    ax.set_ylabel('工作时长 (小时)')
+    ax.set_title('工作时长滚动平均')
+    ax.legend(loc='upper left')
+    ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+    rotate_date_labels(ax)
+    fig.tight_layout()
+    return fig
+
+
+def build_session_histogram(labels, counts):
+    """工作时间段时长分布图"""
+    fig = Figure(figsize=(4, 3), dpi=80)
+    ax = fig.subplots()
+    ax.bar(labels, counts, color='purple', alpha=0.7)
+    ax.set_xlabel('时长')
+    ax.set_ylabel('时间段数')
+    ax.set_title('工作时间段时长分布')
+    ax.grid(True, linestyle='--', alpha=0.7, axis='y')
+    fig.tight_layout()
+    return fig
+
+
+def build_user_totals(users, hours):
+    """每个用户的总工作时长（团队报表）"""
+    fig = Figure(figsize=(6, max(3, 0.25 * len(users))), dpi=80)
+    ax = fig.subplots()
+    ax.barh(users, hours, color='blue', alpha=0.7)
+    ax.set_xlabel('工作时长 (小时)')
+    ax.set_title('成员工作时长')
+    ax.invert_yaxis()
+    ax.grid(True, linestyle='--', alpha=0.7, axis='x')
+    fig.tight_layout()
+    return fig
+
+
+def render_png(fig):
+    """把图表栅格化为PNG字节"""
+    buf = io.BytesIO()
+    FigureCanvasAgg(fig).print_png(buf)
+    return buf.getvalue()
+
+
+# 图表缓存格式版本，修改绘图代码或样式时递增以作废旧缓存
+CHART_CACHE_VERSION = 1
+
+
+def chart_cache_key(build_fn, args):
+    """图表缓存键：绘图函数名和输入数据（日期范围、数值和选项）的哈希"""
+    payload = repr((CHART_CACHE_VERSION, build_fn.__name__, args)).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+class ChartCache:
+    """磁盘上的PNG缓存，按最近使用时间淘汰，总大小不超过max_bytes"""
+
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024, read_only=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.read_only = read_only  # 只读取已有的图表，不写入、不更新使用时间（独立的统计进程）
+        self._lock = threading.Lock()
+        self._entries = None  # 键 -> [大小, 最近使用时间]，首次使用时扫描目录
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"chart_{key}.png")
+
+    def _load_index(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        try:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.startswith("chart_") and entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    self._entries[entry.name[6:-4]] = [stat.st_size, stat.st_mtime]
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        """返回缓存的PNG字节，没有时返回None"""
+        with self._lock:
+            self._load_index()
+            if key not in self._entries:
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    png = f.read()
+                if self.read_only:
+                    return png
+                now = time.time()
+                # 用修改时间记录最近使用，重启后仍可按LRU淘汰
+                os.utime(self._path(key), (now, now))
+                self._entries[key][1] = now
+                return png
+            except OSError:
+                del self._entries[key]
+                return None
+
+    def put(self, key, png):
+        """写入缓存（先写临时文件再替换），超过总大小时淘汰最久未用的图表"""
+        if self.read_only:
+            return
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(png)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                print(f"写入图表缓存出错: {e}")
+                return
+            self._entries[key] = [len(png), time.time()]
+            total = sum(size for size, _ in self._entries.values())
+            for old_key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+                if total <= self.max_bytes or old_key == key:
+                    break
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+                del self._entries[old_key]
+                total -= size
+
+
+class ChartRenderer:
+    """后台绘图线程：在工作线程中栅格化图表（以及准备图表数据），在Tk主线程中交付结果"""
+
+    POLL_MS = 50
+
+    def __init__(self, widget, profiler, metrics=None, cache=None):
+        self.widget = widget
+        self.profiler = profiler
+        self.cache = cache
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.outstanding = 0
+        self.worker = None
+        self._render_seconds = self._cache_hits = self._cache_misses = self._errors = None
+        if metrics is not None:
+            self._render_seconds = metrics.histogram("chart_render_seconds", "Time to build and rasterize one chart on the worker thread")
+            self._cache_hits = metrics.counter("chart_cache_hits_total", "Charts served from the PNG cache")
+            self._cache_misses = metrics.counter("chart_cache_misses_total", "Charts that had to be rendered")
+            self._errors = metrics.counter("chart_render_errors_total", "Background chart jobs that failed")
+
+    def submit(self, build_fn, args, on_done, on_error=None):
+        """提交一个绘图任务，完成后在主线程调用on_done(png_bytes)，出错时调用on_error(异常)；
+        输入数据未变时直接使用缓存（缓存键的哈希和磁盘读取也在绘图线程中进行）"""
+        self._enqueue(self._render, (build_fn, args), on_done, on_error)
+
+    def run(self, fn, args, on_done, on_error=None):
+        """在绘图线程中执行其他耗时任务（例如读取历史数据），完成后在主线程调用on_done(返回值)"""
+        self._enqueue(fn, args, on_done, on_error)
+
+    def _enqueue(self, fn, args, on_done, on_error):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+        self.jobs.put((fn, args, on_done, on_error))
+        self.outstanding += 1
+        if self.outstanding == 1:
+            self.widget.after(self.POLL_MS, self._deliver)
+
+    def _render(self, build_fn, args):
+        key = None
+        if self.cache is not None:
+            key = chart_cache_key(build_fn, args)
+            png = self.cache.get(key)
+            if self._cache_hits is not None:
+                (self._cache_hits if png is not None else self._cache_misses).inc()
+            if png is not None:
+                return png
+        load_matplotlib(self.profiler)
+        started = time.perf_counter()
+        png = render_png(build_fn(*args))
+        if self._render_seconds is not None:
+            self._render_seconds.observe(time.perf_counter() - started)
+        if key is not None:
+            self.cache.put(key, png)
+        return png
+
+    def _run(self):
+        while True:
+            fn, args, on_done, on_error = self.jobs.get()
+            try:
+                self.results.put((on_done, on_error, fn(*args), None))
+            except Exception as e:
+                self.results.put((on_done, on_error, None, e))
+
+    def _deliver(self):
+        while True:
+            try:
+                on_done, on_error, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding -= 1
+            if error is None:
+                on_done(result)
+                continue
+            if self._errors is not None:
+                self._errors.inc()
+            if on_error is not None:
+                on_error(error)
+        if self.outstanding > 0:
+            self.widget.after(self.POLL_MS, self._deliver)
+
+
+def png_to_photo(png, master):
+    """把PNG字节转换为Tk图片"""
+    import tkinter as tk  # 无显示的批量报表只用绘图函数，不需要tkinter
+    return tk.PhotoImage(data=base64.b64encode(png), format="png", master=master)
@@ -1,101 +1,129 @@
+import argparse
 import tkinter as tk
 import threading
 import time
-import random
-import pygame
-import math
-import json
 import os
-# 导入matplotlib用于数据可视化
-import matplotlib.pyplot as plt
-
-# 配置matplotlib支持中文显示
-plt.rcParams['font.family'] = ['Songti SC']  # 使用Songti SC字体
-plt.rcParams['axes.unicode_minus'] = False  # 解决负号'-'显示为方块的问题
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkinter import ttk
 from tkinter import filedialog
-from datetime import datetime, timedelta
+from datetime import datetime
 from collections import OrderedDict
+from scheduler import TkScheduler
+from timer_engine import TimerEngine
+from audio_worker import AudioWorker
+from ui_updates import UiUpdates
+from stats_export import export_stats as export_records, guess_format
+from stats_store import JournalStatsStore, seconds_to_hms, hms_to_seconds
+from stats_sqlite import SqliteStatsStore, migrate_json_to_sqlite
+from stats_rollup import StatsRollup, merge_foreign_events, record_session, store_source
+from startup_profile import StartupProfiler
+from session_checkpoint import SessionCheckpoint
+from metrics import MetricsRegistry, SamplingProfiler
+from chart_render import ChartRenderer, ChartCache
+from focus_analytics import FocusAnalytics
+from stats_window import StatsWindow
+from stats_viewer import StatsViewerProcess
+from time_source import SUSPEND_POLICIES, TimeSource
 
 class TimerApp:
-    def __init__(self, root):
+    # 定期写出Prometheus指标文件的间隔（秒）
+    METRICS_INTERVAL = 60
+    # 向独立统计进程推送诊断信息的间隔（秒）
+    VIEWER_DIAGNOSTICS_INTERVAL = 5
+    # 统计存储后端："json"（只追加日志）或 "sqlite"
+    STATS_BACKENDS = ("json", "sqlite")
+    
+    def __init__(self, root, profiler=None, metrics_file=None, sample_profile=False, suspend_policy="exclude",
+                 stats_process=False, stats_backend="json", stats_view_days=None):
         self.root = root
         self.root.title("定时提示音程序")
         self.root.geometry("400x400")
         self.root.resizable(False, False)
+        self.profiler = profiler or StartupProfiler()
+        
+        # 进程内指标：调度、提示音、统计读写和界面的计数与耗时直方图
+        self.metrics = MetricsRegistry()
+        self.metrics_file = metrics_file
+        self.load_seconds = self.metrics.histogram("load_daily_stats_seconds", "Time to load the daily stats store")
+        self.save_seconds = self.metrics.histogram("save_daily_stats_seconds", "Time to persist the daily stats store and rollup")
+        self.view_stats_seconds = self.metrics.histogram("view_stats_seconds", "Time to open the statistics window")
+        self.metrics.gauge("threads", "Live Python threads", threading.active_count)
+        # 可选的采样分析器（--sample-profile或诊断面板中开启）
+        self.sampler = SamplingProfiler()
+        if sample_profile:
+            self.sampler.start()
+        
+        # 计时用的单调时钟：校时不影响截止时间，系统挂起的时间按策略计入或排除
+        self.time_source = TimeSource(suspend_policy)
+        self.metrics.gauge("clock_suspended_seconds", "System suspend time detected by the timer clock", lambda: self.time_source.suspended)
+        self.metrics.gauge("clock_suspends", "System suspends detected by the timer clock", lambda: self.time_source.suspends)
+        self.metrics.gauge("clock_wall_steps", "Wall clock adjustments detected by the timer clock", lambda: self.time_source.wall_steps)
+        
+        # 常驻音频线程，在窗口出现后才导入pygame并初始化mixer
+        self.audio = AudioWorker(self.profiler, clock=self.time_source, metrics=self.metrics)
+        
+        # 截止时间调度器：只在提示、循环结束或显示跳秒时唤醒
+        self.scheduler = TkScheduler(self.root, clock=self.time_source, metrics=self.metrics)
+        # 计时核心（工作/休息循环、随机提示、纯工作时间），界面只订阅它的事件
+        self.engine = TimerEngine(self.scheduler, clock=self.time_source)
+        self.engine.subscribe(self.on_engine_event)
+        self.countdown_window = None
+        self.countdown_var = None
+        
+        # 统计图表在后台线程中绘制，渲染结果按输入数据的哈希缓存在磁盘上
+        chart_cache = ChartCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), "chart_cache"))
+        self.chart_renderer = ChartRenderer(self.root, self.profiler, self.metrics, chart_cache)
+        self.analytics_seconds = self.metrics.histogram("focus_analytics_seconds", "Time to refresh and aggregate focus analytics")
         
-        # 初始化pygame用于播放音效，使用更高的音质设置
-        pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=1024)
-        
-        # 程序状态变量
-        self.running = False
-        self.timer_thread = None
-        self.stop_event = threading.Event()
-        
-        # 数据统计变量
-        self.alert_times = []  # 记录每次提示的时间
-        self.session_start_time = None  # 本次会话开始时间
-        self.total_run_time = 0  # 总运行时间（秒）
-        self.current_interval_start_time = None  # 当前随机片段开始时间
-        self.last_interval_duration = 0  # 上个随机片段的持续时间
-        
-        # 纯工作时间记录
-        self.pure_work_time = 0  # 纯工作时间（不包括暂停和休息）
-        self.work_start_time = None  # 当前工作开始时间
-        
-        self.work_sessions = []  # 记录工作时间段 [{'start': timestamp, 'end': timestamp, 'duration': seconds}]
-        self.current_work_session_start = None  # 当前工作时间段开始时间
         self.stats_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_stats.json")
+        self.stats_backend = stats_backend
+        self.stats_view_days = stats_view_days  # 历史数据和图表只查询最近这么多天，None为全部
+        self.stats_store = self.create_stats_store()
+        # 可选：统计窗口在独立进程中运行，本进程不加载matplotlib，只通过管道推送会话数据
+        self.stats_process = stats_process
+        self.stats_viewer = StatsViewerProcess(self.stats_file, getattr(self.stats_store, "db_file", None), self.stats_view_days)
         self.daily_stats = {}  # 初始化为空字典
-        self.load_daily_stats()  # 加载每日统计数据
+        with self.profiler.step("加载统计数据"):
+            self.load_daily_stats()  # 加载每日统计数据
+        # 每日/每周/每月/每年汇总索引，图表和历史表格直接读取
+        self.stats_rollup = StatsRollup(os.path.splitext(self.stats_file)[0] + ".rollup.json")
+        # 图表使用的紧凑二进制历史文件（按需生成，可mmap）
+        self.events_file = os.path.splitext(self.stats_file)[0] + ".events.bin"
+        # 专注分析按天缓存（保存在磁盘上），再次打开统计窗口或重新启动时只重新计算有变化的日期
+        self.focus_analytics = FocusAnalytics(cache_file=os.path.splitext(self.stats_file)[0] + ".focus")
+        with self.profiler.step("加载汇总索引"):
+            self.stats_rollup.load(self.stats_store)
+        self.stats_window = StatsWindow(self.root, self.stats_store, self.stats_rollup, self.events_file, self.chart_renderer,
+                                        self.focus_analytics, self.stats_view_days, self.analytics_seconds)
+        # 会话检查点：上次异常退出时把会话合并到每日统计，之后随计时核心的状态变化原地更新
+        self.checkpoint = SessionCheckpoint(os.path.splitext(self.stats_file)[0] + ".checkpoint")
+        with self.profiler.step("恢复会话检查点"):
+            recovered = self.recover_checkpoint()
+        self.checkpoint.open(self.engine)
         
         # 创建UI元素
-        self.create_widgets()
-        
-        # 设置默认参数
-        self.work_duration = 90 * 60  # 90分钟工作时间（秒）
-        self.break_duration = 20 * 60  # 20分钟休息时间（秒）
-        self.min_interval = 3 * 60  # 最小提示间隔（秒）
-        self.max_interval = 5 * 60  # 最大提示间隔（秒）
-        
-        # 尝试加载提示音
-        try:
-            self.alert_sound = pygame.mixer.Sound("alert.wav")
-            # 为外部音频文件设置音量
-            self.alert_sound.set_volume(1.0)
-        except:
-            print("警告：未找到提示音文件 'alert.wav'，将使用默认系统声音")
-            # 创建一个简单的提示音作为默认
-            self.create_default_sound()
-    
-    def create_default_sound(self):
-        # 创建一个柔和的提示音作为默认
-        sample_rate = 44100
-        duration = 1.5  # 1.5秒
-        # 使用较低的频率（320Hz）使声音更柔和
-        frequency = 320
-        # 创建缓冲区
-        buf = bytearray(int(sample_rate * duration))
-        
-        # 生成带有淡入淡出效果的正弦波
-        for i in range(len(buf)):
-            # 计算当前时间点
-            t = i / sample_rate
-            # 应用淡入淡出效果（ADSR包络）
-            if t < 0.3:  # 淡入阶段
-                amplitude = t / 0.3
-            elif t > duration - 0.5:  # 淡出阶段
-                amplitude = (duration - t) / 0.5
-            else:  # 持续阶段
-                amplitude = 1.0
-            
-            # 提高音量（最大值为120而不是80）
-            value = int(120 * amplitude * math.sin(t * frequency * 2 * math.pi))
-            # 居中在128
-            buf[i] = 128 + value
-        
-        self.alert_sound = pygame.mixer.Sound(buf)
+        with self.profiler.step("创建界面"):
+            self.create_widgets()
+        # 显示值统一经过更新通道：按帧合并，只刷新文本有变化的标签
+        self.ui = UiUpdates(self.root)
+        self.ui.bind("status", self.status_var)
+        self.ui.bind("timer", self.timer_var)
+        self.ui.bind("next_alert", self.next_alert_var)
+        self.ui.bind("last_interval", self.last_interval_var)
+        self.ui.bind("total_runtime", self.total_runtime_var)
+        if recovered is not None:
+            self.ui.post(status=f"已恢复上次未正常退出的会话（{recovered.date}，{len(recovered.alert_times)} 次提示）")
+        self.metrics.gauge("ui_redraws", "Label updates written to Tk", lambda: self.ui.redraws)
+        self.metrics.gauge("ui_skipped_updates", "Label updates skipped because the text was unchanged", lambda: self.ui.skipped)
+        if self.metrics_file:
+            self.scheduler.schedule_in(self.METRICS_INTERVAL, self.write_metrics, True)
+        
+        # 窗口第一次空闲时（已显示）再开始初始化音频
+        self.root.after_idle(self.on_window_shown)
+    
+    def on_window_shown(self):
+        """窗口已显示，在后台初始化音频"""
+        self.profiler.mark("首个窗口显示")
+        self.audio.start()
     
     def create_widgets(self):
         # 创建主框架
@@ -172,781 +200,401 @@ class TimerApp:
         copyright_label.pack(side=tk.BOTTOM, pady=5)
     
     def toggle_timer(self):
-        if not self.running:
+        if not self.engine.running:
             self.start_timer()
         else:
             self.pause_timer()
     
     def start_timer(self):
-        self.running = True
-        self.start_stop_button.config(text="暂停")
-        self.status_var.set("运行中")
-        
-        # 记录工作开始时间
-        self.work_start_time = time.time()
-        
-        # 如果是首次启动，记录会话开始时间
-        if not self.session_start_time:
-            self.session_start_time = time.time()
-            self.current_interval_start_time = time.time()
-            self.current_work_session_start = time.time()  # 记录工作时间段开始
-            # 重置上个片段运行时长
-            self.last_interval_duration = 0
-            self.update_last_interval_display(self.last_interval_duration)
-        else:
-            # 从暂停状态恢复，只更新当前片段开始时间，保持会话开始时间不变
-            # 累计之前的运行时间
-            if hasattr(self, 'pause_start_time'):
-                pause_duration = time.time() - self.pause_start_time
-                # 调整session_start_time以排除暂停时间
-                self.session_start_time += pause_duration
-                delattr(self, 'pause_start_time')
-            self.current_interval_start_time = time.time()
-            self.current_work_session_start = time.time()  # 重新开始工作时间段
-        
-        # 重置停止事件
-        self.stop_event.clear()
-        
-        # 创建并启动计时器线程
-        self.timer_thread = threading.Thread(target=self.timer_loop)
-        self.timer_thread.daemon = True
-        self.timer_thread.start()
+        self.engine.start()
     
     def pause_timer(self):
         """暂停计时器（不清空数据）"""
-        if self.running:
-            self.running = False
-            self.start_stop_button.config(text="启动/暂停")
-            self.status_var.set("已暂停")
-            self.stop_event.set()
-            
-            # 累计纯工作时间
-            if self.work_start_time:
-                self.pure_work_time += time.time() - self.work_start_time
-                self.work_start_time = None
-            
-            # 记录暂停开始时间，用于计算暂停时长
-            self.pause_start_time = time.time()
-            
-            # 记录当前工作时间段结束
-            if self.current_work_session_start:
-                work_session = {
-                    'start': self.current_work_session_start,
-                    'end': time.time(),
-                    'duration': time.time() - self.current_work_session_start
-                }
-                self.work_sessions.append(work_session)
-                self.current_work_session_start = None
-            
-            # 不更新total_run_time，保持运行时长连续性
+        self.engine.pause()
     
     def stop_timer(self):
         """完全停止计时器（用于退出时）"""
-        if self.running:
-            self.running = False
-            self.start_stop_button.config(text="启动/暂停")
-            self.status_var.set("已停止")
-            self.stop_event.set()
-            
-            # 更新总运行时间
-            if self.session_start_time:
-                self.total_run_time += time.time() - self.session_start_time
-                self.update_daily_stats()
-            
-            # 重置计时器显示
-            self.timer_var.set("00:00:00")
-            self.next_alert_var.set("--:--:--")
+        self.engine.stop()
 
     def end_current_fragment(self):
         """结束当前随机片段"""
-        if self.running:
-            self.status_var.set("当前随机片段已结束，即将开始新的片段。")
-            self.play_alert()
-            # 计算当前片段持续时间并保存为上个片段时长
-            if self.current_interval_start_time:
-                current_time = time.time()
-                self.last_interval_duration = current_time - self.current_interval_start_time
-                self.update_last_interval_display(self.last_interval_duration)
-                # 重置当前随机片段开始时间
-                self.current_interval_start_time = current_time
-            self.status_var.set("运行中")
+        if self.engine.running:
+            self.ui.post(status="当前随机片段已结束，即将开始新的片段。")
+            self.engine.end_fragment()
+            self.ui.post(status="运行中")
         else:
-            self.status_var.set("计时器未运行，无法结束当前片段。")
+            self.ui.post(status="计时器未运行，无法结束当前片段。")
 
     def end_current_cycle(self):
         """结束当前90分钟循环"""
-        if self.running:
-            self.status_var.set("当前90分钟循环已结束，进入休息时间。")
-            self.play_alert()
+        if self.engine.running:
+            self.ui.post(status="当前90分钟循环已结束，进入休息时间。")
             # 不调用stop_timer，而是直接进入休息倒计时
-            self.start_break_countdown() # 进入休息倒计时
+            self.engine.end_cycle()
         else:
-            self.status_var.set("计时器未运行，无法结束当前循环。")
-    
-    def timer_loop(self):
-        start_time = time.time()
-        next_alert_time = start_time + random.randint(self.min_interval, self.max_interval)
-        
-        # 更新下一次提示时间显示
-        self.update_next_alert_display(next_alert_time)
-        
-        # 初始化当前随机片段开始时间
-        self.current_interval_start_time = time.time()
-        
-        while self.running and not self.stop_event.is_set():
-            current_time = time.time()
-            
-            # 计算当前累计工作时间
-            current_total_work_time = self.pure_work_time
-            if self.work_start_time:
-                current_total_work_time += (current_time - self.work_start_time)
-            
-            # 检查是否达到90分钟的倍数（90分钟、180分钟、270分钟...）
-            current_cycle = int(current_total_work_time // self.work_duration) + 1
-            previous_cycle = int(self.pure_work_time // self.work_duration) + 1
-            
-            # 如果进入了新的90分钟周期，触发休息
-            if current_cycle > previous_cycle:
-                self.play_alert(3)  # 进入休息时播放三次提示音
-                self.start_break_countdown()
-                break  # 退出timer_loop，等待用户手动重新启动
-            
-            # 检查是否到了提示时间
-            if current_time >= next_alert_time:
-                self.play_alert()  # 小循环提示音播放一次
-                # 计算当前片段持续时间并保存为上个片段时长
-                if self.current_interval_start_time:
-                    self.last_interval_duration = current_time - self.current_interval_start_time
-                    self.update_last_interval_display(self.last_interval_duration)
-                # 计算下一次提示时间
-                next_interval = random.randint(self.min_interval, self.max_interval)
-                next_alert_time = current_time + next_interval
-                # 更新下一次提示时间显示
-                self.update_next_alert_display(next_alert_time)
-                # 重置当前随机片段开始时间
-                self.current_interval_start_time = current_time
-            
-            # 更新工作/休息周期计时器（不再显示在主计时器上）
-            elapsed = current_time - start_time
-            # 在休息时间内不更新主计时器，保持显示当前随机片段运行时长
-            
-            # 更新当前随机片段运行时长（显示在计时器标签上）
-            if self.current_interval_start_time:
-                current_interval_elapsed = current_time - self.current_interval_start_time
-                self.update_timer_display(current_interval_elapsed)
-            
-            # 更新程序总运行时长（只计算纯工作时间）
-            if self.work_start_time:
-                current_work_time = self.pure_work_time + (current_time - self.work_start_time)
-                self.update_total_runtime_display(current_work_time)
-            else:
-                self.update_total_runtime_display(self.pure_work_time)
-            
-            # 短暂休眠以减少CPU使用
-            time.sleep(0.1)
+            self.ui.post(status="计时器未运行，无法结束当前循环。")
+    
+    def on_engine_event(self, event, **data):
+        """把计时核心的事件反映到界面上"""
+        if self.stats_viewer.running:
+            self.forward_to_viewer(event, data)
+        if event == "started":
+            self.start_stop_button.config(text="暂停")
+            self.ui.post(status="运行中")
+        elif event == "paused":
+            self.start_stop_button.config(text="启动/暂停")
+            self.ui.post(status="已暂停")
+        elif event == "stopped":
+            self.start_stop_button.config(text="启动/暂停")
+            self.ui.post(status="已停止")
+            self.update_daily_stats()
+            # 重置计时器显示
+            self.ui.post(timer="00:00:00", next_alert="--:--:--")
+        elif event == "alert":
+            self.play_alert(data["repeat_count"], data["deadline"])
+        elif event == "next_alert":
+            self.update_next_alert_display(data["time"])
+        elif event == "last_interval":
+            self.update_last_interval_display(data["duration"])
+        elif event == "tick":
+            self.update_timer_display(data["interval_elapsed"])
+            self.update_total_runtime_display(data["work_time"])
+        elif event == "break_started":
+            self.start_break_countdown()
+        elif event == "break_tick":
+            # 更新倒计时显示
+            hours, remainder = divmod(int(data["remaining"]), 3600)
+            minutes, seconds = divmod(remainder, 60)
+            self.ui.post(countdown=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
+        elif event == "break_ended":
+            self.finish_break()
+    
+    def forward_to_viewer(self, event, data):
+        """把当前会话的增量推送给独立的统计进程"""
+        if event == "alert":
+            self.stats_viewer.send("alert", time=self.engine.wall_time(data["time"]))
+        elif event == "tick":
+            self.stats_viewer.send("tick", run_time=self.engine.session_run_time())
+        elif event == "session_reset":
+            self.stats_viewer.send("session", **self.session_snapshot())
     
     def start_break_countdown(self):
-        # 累计纯工作时间
-        if self.work_start_time:
-            self.pure_work_time += time.time() - self.work_start_time
-            self.work_start_time = None
-        
-        # 暂停主计时器
-        self.running = False
-        self.stop_event.set()
-        
         # 进入休息倒计时
-        self.status_var.set("休息时间")
-        break_end_time = time.time() + self.break_duration
+        self.ui.post(status="休息时间")
         
         # 创建一个单独的倒计时窗口
         countdown_window = tk.Toplevel(self.root)
         countdown_window.title("休息倒计时")
         countdown_window.geometry("350x200")
         countdown_window.resizable(False, False)
+        # 直接关闭窗口等同于手动结束休息
+        countdown_window.protocol("WM_DELETE_WINDOW", self.engine.end_break)
         
         # 添加倒计时标签
         countdown_label = ttk.Label(countdown_window, text="休息时间剩余：", font=("Arial", 12))
         countdown_label.pack(pady=10)
         
-        countdown_var = tk.StringVar(value=f"{self.break_duration // 60}:00")
-        countdown_time = ttk.Label(countdown_window, textvariable=countdown_var, font=("SimHei", 24))
+        self.countdown_var = tk.StringVar(value=f"{self.engine.break_duration // 60}:00")
+        self.ui.bind("countdown", self.countdown_var)
+        countdown_time = ttk.Label(countdown_window, textvariable=self.countdown_var, font=("SimHei", 24))
         countdown_time.pack(pady=10)
         
         # 添加手动结束休息按钮
-        end_break_button = ttk.Button(countdown_window, text="结束休息", 
-                                    command=lambda: self.end_break_early(countdown_window, break_end_time))
+        end_break_button = ttk.Button(countdown_window, text="结束休息", command=self.engine.end_break)
         end_break_button.pack(pady=10)
-        
-        # 休息结束标志
-        self.break_ended = False
-        
-        def update_countdown():
-            if not self.break_ended:
-                remaining = break_end_time - time.time()
-                if remaining <= 0:
-                    self.end_break_naturally(countdown_window)
-                    return
-                
-                # 更新倒计时显示
-                hours, remainder = divmod(int(remaining), 3600)
-                minutes, seconds = divmod(remainder, 60)
-                countdown_var.set(f"{hours:02d}:{minutes:02d}:{seconds:02d}")
-                
-                # 继续更新
-                countdown_window.after(100, update_countdown)
-        
-        # 开始倒计时更新
-        update_countdown()
-    
-    def end_break_early(self, countdown_window, break_end_time):
-        """手动结束休息"""
-        self.break_ended = True
-        countdown_window.destroy()
-        self.finish_break()
-    
-    def end_break_naturally(self, countdown_window):
-        """自然结束休息（时间到）"""
-        self.break_ended = True
-        countdown_window.destroy()
-        self.finish_break()
+        self.countdown_window = countdown_window
     
     def finish_break(self):
-        """休息结束后的处理"""
-        # 播放提示音三次
-        self.play_alert(3)
+        """休息结束后的处理（提示音由计时核心发出）"""
+        if self.countdown_window is not None:
+            self.ui.unbind("countdown")
+            self.countdown_window.destroy()
+            self.countdown_window = None
         
         # 更新状态为休息结束，需要手动重新启动
-        self.status_var.set("休息结束，请点击启动按钮继续工作")
+        self.ui.post(status="休息结束，请点击启动按钮继续工作")
         
         # 重置按钮状态
         self.start_stop_button.config(text="启动/暂停")
         
         # 重置计时器显示
-        self.timer_var.set("00:00:00")
-        self.next_alert_var.set("--:--:--")
-        
-        # 不重置pure_work_time，保持累计工作时间的连续性
-        # 只重置当前工作时间段相关的变量
-        self.work_start_time = None
-        
-        # 不重置session_start_time，保持程序总运行时长的连续性
+        self.ui.post(timer="00:00:00", next_alert="--:--:--")
     
     def update_timer_display(self, elapsed_seconds):
         """更新计时器显示（当前随机片段运行时长）"""
         hours, remainder = divmod(int(elapsed_seconds), 3600)
         minutes, seconds = divmod(remainder, 60)
-        self.timer_var.set(f"{hours:02d}:{minutes:02d}:{seconds:02d}")
+        self.ui.post(timer=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
     
     def update_next_alert_display(self, next_time):
-        next_time_str = datetime.fromtimestamp(next_time).strftime("%H:%M:%S")
-        self.next_alert_var.set(next_time_str)
+        next_time_str = datetime.fromtimestamp(self.engine.wall_time(next_time)).strftime("%H:%M:%S")
+        self.ui.post(next_alert=next_time_str)
     
     def update_last_interval_display(self, elapsed_seconds):
         """更新上个随机片段运行时长显示"""
         hours, remainder = divmod(int(elapsed_seconds), 3600)
         minutes, seconds = divmod(remainder, 60)
-        self.last_interval_var.set(f"{hours:02d}:{minutes:02d}:{seconds:02d}")
+        self.ui.post(last_interval=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
     
     def update_total_runtime_display(self, elapsed_seconds):
         hours, remainder = divmod(int(elapsed_seconds), 3600)
         minutes, seconds = divmod(remainder, 60)
-        self.total_runtime_var.set(f"{hours:02d}:{minutes:02d}:{seconds:02d}")
+        self.ui.post(total_runtime=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
     
-    def play_alert(self, repeat_count=1):
-        try:
-            # 记录提示时间
-            alert_time = time.time()
-            self.alert_times.append(alert_time)
-            
-            # 在单独的线程中播放提示音，避免阻塞主线程
-            threading.Thread(target=self._play_sound, args=(repeat_count,)).start()
-        except Exception as e:
-            print(f"播放提示音时出错: {e}")
-    
-    def _play_sound(self, repeat_count=1):
-        try:
-            # 设置音量为最大值
-            self.alert_sound.set_volume(1.0)
-            
-            for i in range(repeat_count):
-                self.alert_sound.play()
-                if i < repeat_count - 1:  # 如果不是最后一次播放，等待一段时间
-                    time.sleep(1.0)  # 间隔1秒
-        except Exception as e:
-            print(f"播放提示音时出错: {e}")
+    def play_alert(self, repeat_count=1, deadline=None):
+        # 提示时间已由计时核心记录，交给音频线程播放，避免阻塞主线程
+        self.audio.play(repeat_count, deadline)
     
     def quit_app(self):
         # 停止计时器并保存当前会话的运行时长
-        if self.running:
-            self.running = False
-            self.stop_event.set()
-            
-            # 累计纯工作时间
-            if self.work_start_time:
-                self.pure_work_time += time.time() - self.work_start_time
-                self.work_start_time = None
-            
-            # 计算并累计当前会话的运行时长
-            if self.session_start_time:
-                current_session_time = time.time() - self.session_start_time
-                self.total_run_time += current_session_time
-                
-                # 记录最后一个工作时间段
-                if self.current_work_session_start:
-                    work_session = {
-                        'start': self.current_work_session_start,
-                        'end': time.time(),
-                        'duration': time.time() - self.current_work_session_start
-                    }
-                    self.work_sessions.append(work_session)
-                    self.current_work_session_start = None
-        
-        # 等待线程结束
-        if self.timer_thread and self.timer_thread.is_alive():
-            self.timer_thread.join(1.0)  # 等待最多1秒
+        self.engine.shutdown()
         
         # 更新并保存每日统计数据
-        if self.total_run_time > 0 or self.alert_times:
+        if self.engine.total_run_time > 0 or self.engine.alert_times:
             self.finalize_daily_stats()
         else:
             self.save_daily_stats()
         
-        # 退出pygame
-        pygame.mixer.quit()
+        # 会话已写入统计，标记检查点为已结算
+        self.checkpoint.close()
+        
+        # 关闭管道，独立的统计进程随之退出
+        self.stats_viewer.close()
+        
+        # 停止采样分析器并写出最后一次指标
+        self.sampler.stop()
+        if self.metrics_file:
+            self.write_metrics()
+        
+        # 停止音频线程并退出pygame
+        self.audio.shutdown()
         # 退出应用
         self.root.destroy()
     
     # 数据统计相关方法
     def seconds_to_hms(self, seconds):
         """将秒数转换为时分秒格式字符串"""
-        hours, remainder = divmod(int(seconds), 3600)
-        minutes, seconds = divmod(remainder, 60)
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        return seconds_to_hms(seconds)
     
     def hms_to_seconds(self, hms_str):
         """将时分秒格式字符串转换为秒数"""
-        try:
-            parts = hms_str.split(':')
-            if len(parts) == 3:
-                hours, minutes, seconds = map(int, parts)
-                return hours * 3600 + minutes * 60 + seconds
-            return 0
-        except (ValueError, AttributeError):
-            return 0
+        return hms_to_seconds(hms_str)
+    
+    def create_stats_store(self):
+        """根据配置创建统计存储，首次使用SQLite时自动从JSON迁移"""
+        if self.stats_backend == "sqlite":
+            db_file = os.path.splitext(self.stats_file)[0] + ".db"
+            if not os.path.exists(db_file) and os.path.exists(self.stats_file):
+                migrate_json_to_sqlite(self.stats_file, db_file)
+            return SqliteStatsStore(db_file)
+        return JournalStatsStore(self.stats_file)
     
     def load_daily_stats(self):
-        """加载每日统计数据"""
+        """加载每日统计数据（快照 + 日志重放，兼容旧格式）"""
         try:
-            with open(self.stats_file, "r", encoding="utf-8") as f:
-                self.daily_stats = json.load(f)
-                # 兼容旧格式：如果total_time是数字，转换为时分秒格式
-                for date, data in self.daily_stats.items():
-                    if isinstance(data.get("total_time"), (int, float)):
-                        data["total_time"] = self.seconds_to_hms(data["total_time"])
-                    # 兼容旧格式：如果work_sessions中的duration是数字，转换为时分秒格式
-                    if "work_sessions" in data:
-                        for session in data["work_sessions"]:
-                            if isinstance(session.get("duration"), (int, float)):
-                                session["duration"] = self.seconds_to_hms(session["duration"])
-        except FileNotFoundError:
-            self.daily_stats = {}
-        except json.JSONDecodeError:
-            self.daily_stats = {}
+            with self.load_seconds.time():
+                self.daily_stats = self.stats_store.load()
         except Exception as e:
             print(f"加载统计数据出错: {e}")
             self.daily_stats = {}
     
     def save_daily_stats(self):
-        """保存每日统计数据"""
+        """保存每日统计数据（追加日志，必要时压缩）"""
         try:
-            with open(self.stats_file, "w", encoding="utf-8") as f:
-                json.dump(self.daily_stats, f, ensure_ascii=False, indent=2)
+            with self.save_seconds.time():
+                self.stats_store.save()
+                # 其他进程（timer_cli、导入工具）同时写入的事件
+                merge_foreign_events(self.stats_store, self.stats_rollup)
+                self.stats_rollup.save(self.stats_store.seq, store_source(self.stats_store))
         except Exception as e:
             print(f"保存统计数据出错: {e}")
+            return
+        # 独立的统计进程重新读取统计数据
+        self.stats_viewer.send("stats_saved")
+    
+    def record_session_stats(self):
+        """把当前会话的工作时间、提示和工作时间段作为事件写入统计日志"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        record_session(self.stats_store, self.stats_rollup, today, self.engine)
+    
+    def recover_checkpoint(self):
+        """把上次未正常退出的会话从检查点合并到每日统计，返回恢复的会话"""
+        try:
+            recovered = self.checkpoint.recover()
+        except Exception as e:
+            print(f"读取会话检查点出错: {e}")
+            return None
+        if recovered is not None:
+            record_session(self.stats_store, self.stats_rollup, recovered.date, recovered)
+            self.save_daily_stats()
+        return recovered
     
     def update_daily_stats(self):
         """更新每日统计数据"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        if today not in self.daily_stats:
-            self.daily_stats[today] = {"total_time": "00:00:00", "alert_times": []}
-        
-        # 更新总时间（使用纯工作时间，转换为时分秒格式）
-        current_total_seconds = self.hms_to_seconds(self.daily_stats[today].get("total_time", "00:00:00"))
-        new_total_seconds = current_total_seconds + self.pure_work_time
-        self.daily_stats[today]["total_time"] = self.seconds_to_hms(new_total_seconds)
-        
-        # 更新提示时间
-        for alert_time in self.alert_times:
-            alert_time_str = datetime.fromtimestamp(alert_time).strftime("%H:%M:%S")
-            self.daily_stats[today]["alert_times"].append(alert_time_str)
-        
-        # 更新工作时间段
-        if "work_sessions" not in self.daily_stats[today]:
-            self.daily_stats[today]["work_sessions"] = []
-        
-        for session in self.work_sessions:
-            session_data = {
-                'start_time': datetime.fromtimestamp(session['start']).strftime("%H:%M:%S"),
-                'end_time': datetime.fromtimestamp(session['end']).strftime("%H:%M:%S"),
-                'duration': self.seconds_to_hms(session['duration'])
-            }
-            self.daily_stats[today]["work_sessions"].append(session_data)
+        self.record_session_stats()
         
         # 只在程序退出时重置会话数据，其他时候保持运行时长连续性
-        self.total_run_time = 0
-        self.alert_times = []
-        self.work_sessions = []  # 重置工作时间段
-        # 不重置session_start_time，保持运行时长连续性
+        self.engine.reset_session()
         
         # 保存数据
         self.save_daily_stats()
     
     def finalize_daily_stats(self):
         """程序退出时最终保存每日统计数据并重置所有会话数据"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        if today not in self.daily_stats:
-            self.daily_stats[today] = {"total_time": "00:00:00", "alert_times": []}
-        
-        # 更新总时间（使用纯工作时间，转换为时分秒格式）
-        current_total_seconds = self.hms_to_seconds(self.daily_stats[today].get("total_time", "00:00:00"))
-        new_total_seconds = current_total_seconds + self.pure_work_time
-        self.daily_stats[today]["total_time"] = self.seconds_to_hms(new_total_seconds)
-        
-        # 更新提示时间
-        for alert_time in self.alert_times:
-            alert_time_str = datetime.fromtimestamp(alert_time).strftime("%H:%M:%S")
-            self.daily_stats[today]["alert_times"].append(alert_time_str)
-        
-        # 更新工作时间段
-        if "work_sessions" not in self.daily_stats[today]:
-            self.daily_stats[today]["work_sessions"] = []
-        
-        for session in self.work_sessions:
-            session_data = {
-                'start_time': datetime.fromtimestamp(session['start']).strftime("%H:%M:%S"),
-                'end_time': datetime.fromtimestamp(session['end']).strftime("%H:%M:%S"),
-                'duration': self.seconds_to_hms(session['duration'])
-            }
-            self.daily_stats[today]["work_sessions"].append(session_data)
+        self.record_session_stats()
         
         # 程序退出时完全重置所有会话数据
-        self.total_run_time = 0
-        self.alert_times = []
-        self.work_sessions = []
-        self.session_start_time = None
-        self.current_work_session_start = None
+        self.engine.reset_session(full=True)
         
         # 保存数据
         self.save_daily_stats()
     
     def export_stats(self):
-        """导出统计数据到文件"""
-        # 确保数据是最新的
-        if self.running and self.session_start_time:
-            current_run_time = time.time() - self.session_start_time
-            temp_total = self.total_run_time + current_run_time
-        else:
-            temp_total = self.total_run_time
-        
-        # 准备导出数据
-        export_data = {
-            "daily_stats": self.daily_stats,
-            "current_session": {
-                "start_time": datetime.fromtimestamp(self.session_start_time).strftime("%Y-%m-%d %H:%M:%S") if self.session_start_time else None,
-                "run_time": temp_total,
-                "alert_times": [datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S") for t in self.alert_times]
-            }
+        """流式导出统计数据（NDJSON包含所有记录，CSV为每日汇总；.gz结尾时压缩）"""
+        # 当前会话尚未写入统计，作为最后一条记录附加在NDJSON中
+        current_session = {
+            "type": "current_session",
+            "start_time": datetime.fromtimestamp(self.engine.wall_time(self.engine.session_start_time)).strftime("%Y-%m-%d %H:%M:%S") if self.engine.session_start_time else None,
+            "run_time": self.engine.session_run_time(),
+            "alert_times": [datetime.fromtimestamp(self.engine.wall_time(t)).strftime("%Y-%m-%d %H:%M:%S") for t in self.engine.alert_times]
         }
         
         # 选择保存位置
         file_path = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")],
+            defaultextension=".ndjson",
+            filetypes=[("NDJSON文件", "*.ndjson"), ("NDJSON压缩文件", "*.ndjson.gz"),
+                       ("CSV文件（每日汇总）", "*.csv"), ("CSV压缩文件（每日汇总）", "*.csv.gz"), ("所有文件", "*.*")],
             initialdir=os.path.dirname(os.path.abspath(__file__)),
             title="保存统计数据"
         )
+        if not file_path:
+            return
         
-        if file_path:
+        # 在主线程中取快照，导出线程读取快照时主线程可以继续记录统计数据
+        store = self.stats_store.snapshot()
+        
+        def run():
             try:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    json.dump(export_data, f, ensure_ascii=False, indent=2)
-                self.status_var.set(f"数据已导出到: {os.path.basename(file_path)}")
+                if guess_format(file_path) == "csv":
+                    count = export_records(store, file_path, kind="days")
+                else:
+                    count = export_records(store, file_path, kind="all", extra=[current_session])
+                self.ui.post(status=f"数据已导出到: {os.path.basename(file_path)}（{count} 条记录）")
             except Exception as e:
-                self.status_var.set(f"导出数据出错: {e}")
+                self.ui.post(status=f"导出数据出错: {e}")
+        
+        # 在后台线程中导出，状态通过界面更新通道回到主线程
+        self.ui.post(status="正在导出数据...")
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.ui.watch(thread)
     
     def view_stats(self):
-        """查看统计数据（使用matplotlib进行可视化）"""
-        # 创建新窗口
-        stats_window = tk.Toplevel(self.root)
-        stats_window.title("统计数据")
-        stats_window.geometry("700x500")
-        stats_window.resizable(True, True)
-        
-        # 创建选项卡
-        notebook = ttk.Notebook(stats_window)
-        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # 当前会话选项卡
-        current_frame = ttk.Frame(notebook, padding=10)
-        notebook.add(current_frame, text="当前会话")
-        
-        # 历史数据选项卡
-        history_frame = ttk.Frame(notebook, padding=10)
-        notebook.add(history_frame, text="历史数据")
-        
-        # 图表分析选项卡
-        chart_frame = ttk.Frame(notebook, padding=10)
-        notebook.add(chart_frame, text="图表分析")
-        
-        # 填充当前会话数据
-        if self.running and self.session_start_time:
-            current_run_time = time.time() - self.session_start_time
-            temp_total = self.total_run_time + current_run_time
-        else:
-            temp_total = self.total_run_time
-        
-        hours, remainder = divmod(int(temp_total), 3600)
-        minutes, seconds = divmod(remainder, 60)
-        
-        # 创建当前会话信息框
-        info_frame = ttk.LabelFrame(current_frame, text="会话信息", padding=10)
-        info_frame.pack(fill=tk.X, pady=5)
-        
-        ttk.Label(info_frame, text=f"会话开始时间: {datetime.fromtimestamp(self.session_start_time).strftime('%Y-%m-%d %H:%M:%S') if self.session_start_time else '未开始'}", font=("SimHei", 10)).pack(anchor="w", pady=2)
-        ttk.Label(info_frame, text=f"运行时长: {hours:02d}:{minutes:02d}:{seconds:02d}", font=("SimHei", 10)).pack(anchor="w", pady=2)
-        ttk.Label(info_frame, text=f"提示次数: {len(self.alert_times)}", font=("SimHei", 10)).pack(anchor="w", pady=2)
-        
-        # 提示时间列表和分布图框架
-        alert_frame = ttk.Frame(current_frame)
-        alert_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-        
-        # 提示时间列表
-        alert_list_frame = ttk.LabelFrame(alert_frame, text="提示时间列表", padding=10)
-        alert_list_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
-        
-        # 创建滚动条
-        scrollbar = ttk.Scrollbar(alert_list_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # 创建列表框
-        alert_listbox = tk.Listbox(alert_list_frame, yscrollcommand=scrollbar.set, font=("SimHei", 9))
-        alert_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.config(command=alert_listbox.yview)
-        
-        # 填充提示时间
-        for i, alert_time in enumerate(self.alert_times):
-            alert_time_str = datetime.fromtimestamp(alert_time).strftime("%Y-%m-%d %H:%M:%S")
-            alert_listbox.insert(tk.END, f"{i+1}. {alert_time_str}")
-        
-        # 当前会话提示时间分布图
-        if len(self.alert_times) > 0:
-            alert_chart_frame = ttk.LabelFrame(alert_frame, text="提示时间分布", padding=10)
-            alert_chart_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
-            
-            # 创建图表
-            fig, ax = plt.subplots(figsize=(4, 3), dpi=80)
-            
-            # 提取小时和分钟
-            times = [datetime.fromtimestamp(t) for t in self.alert_times]
-            hours = [t.hour + t.minute/60 for t in times]
-            
-            # 绘制散点图
-            ax.scatter(range(len(hours)), hours, color='blue', s=50, alpha=0.7)
-            ax.set_xlabel('提示序号')
-            ax.set_ylabel('时间 (小时)')
-            ax.set_title('当前会话提示时间分布')
-            ax.grid(True, linestyle='--', alpha=0.7)
-            
-            # 设置y轴刻度为小时格式
-            ax.set_yticks([i for i in range(24)])
-            ax.set_yticklabels([f"{i:02d}:00" for i in range(24)])
-            
-            # 添加到Tkinter窗口
-            canvas = FigureCanvasTkAgg(fig, master=alert_chart_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-            plt.close(fig)  # 避免显示独立窗口
-        
-        # 填充历史数据
-        # 创建历史数据表格
-        history_table_frame = ttk.LabelFrame(history_frame, text="每日使用统计", padding=10)
-        history_table_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-        
-        # 创建表格头部
-        columns = ("日期", "总运行时长", "提示次数", "工作时间段数")
-        tree = ttk.Treeview(history_table_frame, columns=columns, show="headings")
-        
-        # 设置列宽和对齐方式
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, anchor="center", width=100)
-        
-        # 添加滚动条
-        tree_scroll = ttk.Scrollbar(history_table_frame, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=tree_scroll.set)
-        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        tree.pack(fill=tk.BOTH, expand=True)
-        
-        # 填充历史数据
-        for date, data in sorted(self.daily_stats.items(), reverse=True):
-            time_str = data.get("total_time", "00:00:00")
-            alert_count = len(data.get('alert_times', []))
-            work_session_count = len(data.get('work_sessions', []))
-            tree.insert("", tk.END, values=(date, time_str, alert_count, work_session_count))
-        
-        # 填充图表分析选项卡
-        if len(self.daily_stats) > 0:
-            # 创建上下分栏
-            top_chart_frame = ttk.Frame(chart_frame)
-            top_chart_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=(0, 5))
-            
-            bottom_chart_frame = ttk.Frame(chart_frame)
-            bottom_chart_frame.pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True, pady=(5, 0))
-            
-            # 在上部分创建左右分栏
-            left_chart_frame = ttk.Frame(top_chart_frame)
-            left_chart_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
-            
-            right_chart_frame = ttk.Frame(top_chart_frame)
-            right_chart_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
-            
-            # 每日运行时长趋势图
-            runtime_frame = ttk.LabelFrame(left_chart_frame, text="每日运行时长趋势", padding=10)
-            runtime_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-            
-            # 准备数据
-            dates = []
-            runtimes = []
-            
-            # 按日期排序
-            for date, data in sorted(self.daily_stats.items()):
-                dates.append(date)
-                # 转换为小时
-                total_seconds = self.hms_to_seconds(data.get("total_time", "00:00:00"))
-                runtimes.append(total_seconds / 3600)
-            
-            # 创建图表
-            fig1, ax1 = plt.subplots(figsize=(4, 3), dpi=80)
-            ax1.plot(dates, runtimes, marker='o', linestyle='-', color='blue', linewidth=2, markersize=6)
-            ax1.set_xlabel('日期')
-            ax1.set_ylabel('运行时长 (小时)')
-            ax1.set_title('每日运行时长趋势')
-            ax1.grid(True, linestyle='--', alpha=0.7)
-            
-            # 旋转x轴标签以避免重叠
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            # 添加到Tkinter窗口
-            canvas1 = FigureCanvasTkAgg(fig1, master=runtime_frame)
-            canvas1.draw()
-            canvas1.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-            plt.close(fig1)
-            
-            # 提示频率分析图
-            alert_freq_frame = ttk.LabelFrame(right_chart_frame, text="提示频率分析", padding=10)
-            alert_freq_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-            
-            # 准备数据
-            alert_counts = []
-            
-            for date, data in sorted(self.daily_stats.items()):
-                alert_counts.append(len(data.get('alert_times', [])))
-            
-            # 创建图表
-            fig2, ax2 = plt.subplots(figsize=(4, 3), dpi=80)
-            ax2.bar(dates, alert_counts, color='green', alpha=0.7)
-            ax2.set_xlabel('日期')
-            ax2.set_ylabel('提示次数')
-            ax2.set_title('每日提示频率')
-            ax2.grid(True, linestyle='--', alpha=0.7, axis='y')
-            
-            # 旋转x轴标签以避免重叠
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            # 添加到Tkinter窗口
-            canvas2 = FigureCanvasTkAgg(fig2, master=alert_freq_frame)
-            canvas2.draw()
-            canvas2.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-            plt.close(fig2)
-            
-            # 工作时间段分布图
-            work_session_frame = ttk.LabelFrame(bottom_chart_frame, text="工作时间段分布", padding=10)
-            work_session_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-            
-            # 创建工作时间段可视化
-            self.create_work_session_chart(work_session_frame)
-    
-    def create_work_session_chart(self, parent_frame):
-        """创建工作时间段分布图表"""
-        # 准备数据：收集所有工作时间段
-        all_sessions = []
-        for date, data in sorted(self.daily_stats.items()):
-            work_sessions = data.get('work_sessions', [])
-            for session in work_sessions:
-                # 解析时间
-                start_time = datetime.strptime(f"{date} {session['start_time']}", "%Y-%m-%d %H:%M:%S")
-                end_time = datetime.strptime(f"{date} {session['end_time']}", "%Y-%m-%d %H:%M:%S")
-                duration_seconds = self.hms_to_seconds(session.get('duration', '00:00:00'))
-                all_sessions.append({
-                    'date': date,
-                    'start': start_time,
-                    'end': end_time,
-                    'duration': duration_seconds
-                })
-        
-        if not all_sessions:
-            # 如果没有工作时间段数据，显示提示信息
-            ttk.Label(parent_frame, text="暂无工作时间段数据", font=("SimHei", 12)).pack(expand=True)
+        """查看统计数据（选项卡在首次选中时才创建，图表在后台线程中绘制；可在独立进程中打开）"""
+        with self.view_stats_seconds.time():
+            if not self.stats_process:
+                self.stats_window.open(self.session_snapshot(), self.build_diagnostics_tab)
+                return
+            was_running = self.stats_viewer.running
+            self.stats_viewer.start(self.session_snapshot())
+            if not was_running:
+                self.update_stats_viewer()
+    
+    def update_stats_viewer(self):
+        """统计进程运行期间定期推送诊断信息"""
+        if not self.stats_viewer.running:
             return
-        
-        # 创建图表
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(8, 3), dpi=80)
-        
-        # 左图：每日工作时间段时间线
-        dates = sorted(list(set([s['date'] for s in all_sessions])))
-        y_positions = {date: i for i, date in enumerate(dates)}
-        
-        for session in all_sessions:
-            y_pos = y_positions[session['date']]
-            start_hour = session['start'].hour + session['start'].minute / 60
-            end_hour = session['end'].hour + session['end'].minute / 60
-            duration_hours = session['duration'] / 3600
-            
-            # 绘制时间段条形图
-            ax1.barh(y_pos, duration_hours, left=start_hour, height=0.6, 
-                    alpha=0.7, color='skyblue', edgecolor='navy')
-        
-        ax1.set_yticks(range(len(dates)))
-        ax1.set_yticklabels(dates)
-        ax1.set_xlabel('时间 (小时)')
-        ax1.set_title('每日工作时间段分布')
-        ax1.set_xlim(0, 24)
-        ax1.set_xticks(range(0, 25, 4))
-        ax1.set_xticklabels([f"{i:02d}:00" for i in range(0, 25, 4)])
-        ax1.grid(True, axis='x', linestyle='--', alpha=0.7)
-        
-        # 右图：工作时间段时长分布
-        durations = [s['duration'] / 3600 for s in all_sessions]  # 转换为小时
-        ax2.hist(durations, bins=10, alpha=0.7, color='lightgreen', edgecolor='darkgreen')
-        ax2.set_xlabel('时间段时长 (小时)')
-        ax2.set_ylabel('频次')
-        ax2.set_title('工作时间段时长分布')
-        ax2.grid(True, axis='y', linestyle='--', alpha=0.7)
-        
-        plt.tight_layout()
-        
-        # 添加到Tkinter窗口
-        canvas = FigureCanvasTkAgg(fig, master=parent_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        plt.close(fig)
-
+        self.stats_viewer.send("diagnostics", text=self.diagnostics_text())
+        self.scheduler.schedule_in(self.VIEWER_DIAGNOSTICS_INTERVAL, self.update_stats_viewer)
+    
+    def session_snapshot(self):
+        """当前会话的快照（时间换算为墙上时间），统计窗口的当前会话选项卡只读取它"""
+        engine = self.engine
+        count, mean_latency, max_latency = self.audio.latency_stats()
+        return {
+            "start_time": engine.wall_time(engine.session_start_time) if engine.session_start_time else None,
+            "run_time": engine.session_run_time(),
+            "alert_times": [engine.wall_time(t) for t in engine.alert_times],
+            "info": [
+                f"提示音延迟: 平均 {mean_latency * 1000:.1f} ms，最大 {max_latency * 1000:.1f} ms（{count} 次）",
+                f"调度器唤醒: {self.scheduler.wakeups_per_minute():.1f} 次/分钟（旧版0.1秒轮询理论值: {self.scheduler.LEGACY_WAKEUPS_PER_MINUTE} 次/分钟）",
+                f"界面刷新: {self.ui.redraws} 次（文本未变而跳过 {self.ui.skipped} 次）",
+            ],
+        }
+    
+    def diagnostics_text(self):
+        """诊断选项卡的文本：指标摘要和采样分析结果"""
+        lines = [self.metrics.summary()]
+        if self.sampler.total:
+            lines.append("")
+            lines.append(f"采样分析（主线程，共 {self.sampler.total} 次采样）：")
+            for count, name in self.sampler.top():
+                lines.append(f"  {count * 100 / self.sampler.total:5.1f}%  {name}")
+        return "\n".join(lines)
+    
+    def build_diagnostics_tab(self, diagnostics_frame):
+        """填充诊断选项卡：指标摘要、采样分析结果和指标文件导出"""
+        text = tk.Text(diagnostics_frame, font=("Consolas", 9), wrap=tk.NONE, height=20)
+        text.pack(fill=tk.BOTH, expand=True)
+        
+        def refresh():
+            text.config(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, self.diagnostics_text())
+            text.config(state=tk.DISABLED)
+        
+        def toggle_sampler():
+            if self.sampler.running:
+                self.sampler.stop()
+                folded_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_profile.folded")
+                self.sampler.write_collapsed(folded_file)
+                self.ui.post(status=f"采样结果已写入: {os.path.basename(folded_file)}")
+            else:
+                self.sampler.start()
+            sampler_button.config(text="停止采样" if self.sampler.running else "开始采样")
+            refresh()
+        
+        def write_metrics():
+            path = self.write_metrics()
+            self.ui.post(status=f"指标已写入: {os.path.basename(path)}")
+        
+        button_frame = ttk.Frame(diagnostics_frame)
+        button_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(button_frame, text="刷新", command=refresh).pack(side=tk.LEFT, padx=5)
+        sampler_button = ttk.Button(button_frame, text="停止采样" if self.sampler.running else "开始采样", command=toggle_sampler)
+        sampler_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="写入Prometheus文件", command=write_metrics).pack(side=tk.LEFT, padx=5)
+        refresh()
+    
+    def write_metrics(self, reschedule=False):
+        """把指标写成Prometheus文本文件（node exporter的textfile收集器可以直接读取），返回文件路径"""
+        path = self.metrics_file or os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_metrics.prom")
+        try:
+            self.metrics.write_textfile(path)
+        except OSError as e:
+            print(f"写入指标文件出错: {e}")
+        if reschedule:
+            self.scheduler.schedule_in(self.METRICS_INTERVAL, self.write_metrics, True)
+        return path
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = TimerApp(root)
+    parser = argparse.ArgumentParser(description="定时提示音程序")
+    parser.add_argument("--startup-profile", action="store_true", help="打印每个导入和初始化步骤的耗时")
+    parser.add_argument("--metrics-file", help="定期把指标写入该Prometheus文本文件")
+    parser.add_argument("--sample-profile", action="store_true", help="启动时开启主线程采样分析")
+    parser.add_argument("--suspend-policy", choices=SUSPEND_POLICIES, default="exclude",
+                        help="系统挂起的时间是否计入工作时间（默认排除，像暂停一样）")
+    parser.add_argument("--stats-process", action="store_true", help="在独立进程中打开统计窗口，绘图不占用计时进程")
+    parser.add_argument("--stats-backend", choices=TimerApp.STATS_BACKENDS, default="json",
+                        help="统计存储后端（首次使用sqlite时自动从timer_stats.json迁移）")
+    parser.add_argument("--view-days", type=int, help="历史数据和图表只查询最近这么多天（默认显示全部）")
+    args = parser.parse_args()
+    profiler = StartupProfiler(enabled=args.startup_profile)
+    with profiler.step("创建Tk窗口"):
+        root = tk.Tk()
+    with profiler.step("TimerApp初始化"):
+        app = TimerApp(root, profiler, metrics_file=args.metrics_file, sample_profile=args.sample_profile,
+                       suspend_policy=args.suspend_policy, stats_process=args.stats_process,
+                       stats_backend=args.stats_backend, stats_view_days=args.view_days)
     root.protocol("WM_DELETE_WINDOW", app.quit_app)  # 处理窗口关闭事件
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from datetime import date as date_cls
+
+from stats_rollup import store_source
+from stats_store import hms_to_seconds, seconds_to_hms
+
+# 二进制历史文件格式（本机字节序，可直接mmap）：
+#   文件头  : 魔数、版本、保留、存储序号、天数、来源标识的sha1、只含后端和路径的来源标识的sha1
+#   日索引  : 每天6个uint32 —— 日期序数、工作秒数、提示起始下标、提示数、时间段起始下标、时间段数
+#   提示数组: int32，当天第一个是距零点的秒数，其后是与前一次提示的差值
+#   时间段  : 每段3个uint32 —— 开始秒数、结束秒数（距零点）、时长秒数
+MAGIC = b"PCEV"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("=4sHHQI20s20s")
+DAY_FIELDS = 6
+
+
+class AlertLog:
+    """以double数组存储的提示时间戳，接口与列表相同（每条8字节，运行很多天也只占很少内存）"""
+
+    def __init__(self):
+        self.times = array("d")
+
+    def append(self, timestamp):
+        self.times.append(timestamp)
+
+    def clear(self):
+        self.times = array("d")
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        return iter(self.times)
+
+    def __getitem__(self, index):
+        return self.times[index]
+
+
+class WorkSessionLog:
+    """以两个double数组存储的工作时间段，迭代时给出{'start', 'end', 'duration'}"""
+
+    def __init__(self):
+        self.starts = array("d")
+        self.ends = array("d")
+
+    def add(self, start, end):
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def clear(self):
+        self.starts = array("d")
+        self.ends = array("d")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield {'start': start, 'end': end, 'duration': end - start}
+
+
+def identity_digest(identity):
+    return hashlib.sha1(json.dumps(identity).encode("utf-8")).digest()
+
+
+def source_digests(source):
+    """来源标识的sha1：完整标识（与序号一起判断旧文件能否直接使用）和只含后端、路径的部分（判断能否增量更新）"""
+    return identity_digest(source), identity_digest(source[:2] if source else None)
+
+
+def encode_history(days, seq, previous=None, source=None):
+    """把(日期, 数据)序列编码为二进制历史文件内容
+
+    数据为None的日期直接从previous（旧的CompactHistory）中复制，不必解码存储中的数据。
+    source是存储的来源标识，写入文件头。
+    """
+    index = array("I")
+    alerts = array("i")
+    sessions = array("I")
+    previous_days = {}
+    if previous is not None:
+        previous_days = {ordinal: i for i, ordinal in enumerate(previous.ordinals)}
+    for date, data in days:
+        ordinal = date_cls.fromisoformat(date).toordinal()
+        alert_start = len(alerts)
+        session_start = len(sessions) // 3
+        if data is None:
+            _, total_seconds, old_alert_start, alert_count, old_session_start, session_count = \
+                previous.index[previous_days[ordinal] * DAY_FIELDS:(previous_days[ordinal] + 1) * DAY_FIELDS]
+            alerts.frombytes(previous.alerts[old_alert_start:old_alert_start + alert_count].tobytes())
+            sessions.frombytes(previous.sessions[old_session_start * 3:(old_session_start + session_count) * 3].tobytes())
+        else:
+            total_seconds = hms_to_seconds(data.get("total_time", "00:00:00"))
+            last = 0
+            for alert_time in data.get("alert_times", []):
+                offset = hms_to_seconds(alert_time)
+                alerts.append(offset - last)
+                last = offset
+            for session in data.get("work_sessions", []):
+                sessions.append(hms_to_seconds(session['start_time']))
+                sessions.append(hms_to_seconds(session['end_time']))
+                sessions.append(hms_to_seconds(session.get('duration', '00:00:00')))
+        index.extend([
+            ordinal, total_seconds,
+            alert_start, len(alerts) - alert_start,
+            session_start, len(sessions) // 3 - session_start,
+        ])
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, seq, len(index) // DAY_FIELDS, *source_digests(source))
+    return header + index.tobytes() + alerts.tobytes() + sessions.tobytes()
+
+
+def write_history(path, days, seq, previous=None, source=None):
+    """写入二进制历史文件（先写临时文件再替换；临时文件带进程号，统计进程可以同时生成）
+
+    previous是同一路径上旧文件的CompactHistory，编码完成后、替换文件前关闭。
+    """
+    try:
+        payload = encode_history(days, seq, previous, source)
+    finally:
+        if previous is not None:
+            previous.close()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def updated_days(store, previous):
+    """生成写入新文件的(日期, 数据)：previous中已有且之后没有变化的日期给出None（直接复制）
+
+    只按日期范围读取有变化的日期（SQLite存储走日期索引），不遍历整个存储。
+    """
+    changed = store.changed_since(previous.seq) if hasattr(store, "changed_since") else None
+    if changed is None:
+        yield from store.iter_days()
+        return
+    known = {date_cls.fromordinal(ordinal).isoformat() for ordinal in previous.ordinals}
+    fresh = {}
+    if changed:
+        fresh = {date: data for date, data in store.iter_days(min(changed), max(changed)) if date in changed}
+    for date in sorted(known | fresh.keys()):
+        yield date, fresh.get(date)
+
+
+class CompactHistory:
+    """通过mmap只读访问二进制历史文件，按需解码某个日期范围"""
+
+    def __init__(self, path, data=None):
+        if data is None:
+            with open(path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # 只在内存中重新编码的历史（只读打开时不写文件）
+            self.mm = data
+        magic, version, _, self.seq, day_count, self.source, self.origin = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.mm.close()
+            raise ValueError("不是有效的历史文件")
+        view = memoryview(self.mm)
+        offset = HEADER.size
+        self.index = view[offset:offset + day_count * DAY_FIELDS * 4].cast("I")
+        self.ordinals = self.index[0::DAY_FIELDS]
+        offset += day_count * DAY_FIELDS * 4
+        alert_count = sum(self.index[3::DAY_FIELDS])
+        self.alerts = view[offset:offset + alert_count * 4].cast("i")
+        offset += alert_count * 4
+        self.sessions = view[offset:].cast("I")
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def close(self):
+        for view in (self.ordinals, self.index, self.alerts, self.sessions):
+            view.release()
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+
+    def iter_range(self, start_date=None, end_date=None):
+        """按日期升序迭代范围内的(日期, 工作秒数, 提示秒数数组, 时间段列表)"""
+        first = bisect_left(self.ordinals, date_cls.fromisoformat(start_date).toordinal()) if start_date else 0
+        last_ordinal = date_cls.fromisoformat(end_date).toordinal() if end_date else None
+        for i in range(first, len(self.ordinals)):
+            if last_ordinal is not None and self.ordinals[i] > last_ordinal:
+                break
+            yield self.day(i)
+
+    def fingerprint(self, i):
+        """第i天的(日期序数, 工作秒数, 提示数, 时间段数)；数据只会追加，计数不变即内容不变"""
+        ordinal, total_seconds, _, alert_count, _, session_count = self.index[i * DAY_FIELDS:(i + 1) * DAY_FIELDS]
+        return ordinal, total_seconds, alert_count, session_count
+
+    def day(self, i):
+        """解码第i天，返回(日期, 工作秒数, 提示秒数数组, 时间段列表)"""
+        ordinal, total_seconds, alert_start, alert_count, session_start, session_count = \
+            self.index[i * DAY_FIELDS:(i + 1) * DAY_FIELDS]
+        # 还原差值编码
+        alert_seconds = array("i", self.alerts[alert_start:alert_start + alert_count])
+        for j in range(1, len(alert_seconds)):
+            alert_seconds[j] += alert_seconds[j - 1]
+        raw = self.sessions[session_start * 3:(session_start + session_count) * 3]
+        sessions = [tuple(raw[k:k + 3]) for k in range(0, len(raw), 3)]
+        return date_cls.fromordinal(ordinal).isoformat(), total_seconds, alert_seconds, sessions
+
+
+def load_compact_history(path, store, read_only=False):
+    """打开二进制历史文件，与存储不一致时先重新生成（只解码旧文件之后有变化的日期）
+
+    store应是在主线程中取的快照（store.snapshot()），可以在后台线程中调用。
+    read_only为True时（独立的统计进程）不一致的历史只在内存中重新编码，不写回文件。
+    旧文件按序号和存储的来源标识（后端、文件路径和文件状态）判断是否可用：
+    序号和来源都相同时直接使用；来自其他后端或文件、或者生成于加载之前但来源不同时完整重建。
+    """
+    try:
+        previous = CompactHistory(path)
+    except (OSError, ValueError, struct.error):
+        previous = None
+    source = store_source(store)
+    digest, origin = source_digests(source)
+    if previous is not None and previous.seq == store.seq and previous.source == digest:
+        return previous
+    if previous is not None and (previous.origin != origin or (
+            previous.seq <= getattr(store, "base_seq", store.seq)
+            and previous.source != identity_digest(getattr(store, "base_source", None)))):
+        previous.close()
+        previous = None
+    if read_only:
+        days = store.iter_days() if previous is None else updated_days(store, previous)
+        try:
+            payload = encode_history(days, store.seq, previous, source)
+        finally:
+            if previous is not None:
+                previous.close()
+        return CompactHistory(path, payload)
+    if previous is None:
+        write_history(path, store.iter_days(), store.seq, source=source)
+    else:
+        write_history(path, updated_days(store, previous), store.seq, previous, source)
+    return CompactHistory(path)
+
+
+def decode_day(total_seconds, alert_seconds, sessions):
+    """把紧凑格式的一天还原为timer_stats.json中的字典格式"""
+    return {
+        "total_time": seconds_to_hms(total_seconds),
+        "alert_times": [seconds_to_hms(s) for s in alert_seconds],
+        "work_sessions": [{'start_time': seconds_to_hms(start), 'end_time': seconds_to_hms(end),
+                           'duration': seconds_to_hms(duration)} for start, end, duration in sessions],
+    }
@@ -0,0 +1,274 @@
+import marshal
+import os
+from array import array
+from bisect import bisect_left
+from datetime import date as date_cls
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HOURS = 24
+# 提示间隔分布：每分钟一个桶，最后一个桶为60分钟及以上
+INTERVAL_BINS = 61
+# 当天工作时间达到该秒数才计入连续专注天数
+STREAK_SECONDS = 30 * 60
+ROLLING_WINDOWS = (7, 30)
+# 按天小结缓存文件的格式版本，小结的计算方式改变时递增
+CACHE_VERSION = 1
+
+
+def day_summary(alert_seconds, sessions):
+    """计算一天的固定长度小结：每小时提示数、提示间隔分布、各时间段时长"""
+    durations = array("l", (duration for _, _, duration in sessions))
+    if np is not None and len(alert_seconds):
+        seconds = as_numpy(alert_seconds)
+        hours = np.bincount(np.minimum(seconds // 3600, HOURS - 1), minlength=HOURS).tolist()
+        gaps = np.clip(np.diff(seconds) // 60, 0, INTERVAL_BINS - 1)
+        bins = np.bincount(gaps, minlength=INTERVAL_BINS).tolist()
+        return hours, bins, durations
+    hours = [0] * HOURS
+    for second in alert_seconds:
+        hours[min(second // 3600, HOURS - 1)] += 1
+    bins = [0] * INTERVAL_BINS
+    for j in range(1, len(alert_seconds)):
+        bins[max(0, min((alert_seconds[j] - alert_seconds[j - 1]) // 60, INTERVAL_BINS - 1))] += 1
+    return hours, bins, durations
+
+
+def histogram_median(bins):
+    """按桶计数求中位数所在的桶下标"""
+    total = sum(bins)
+    if not total:
+        return 0
+    seen = 0
+    for i, count in enumerate(bins):
+        seen += count
+        if seen * 2 >= total:
+            return i
+    return len(bins) - 1
+
+
+def as_numpy(values):
+    """把array模块的数组零拷贝地转换为numpy数组"""
+    return np.frombuffer(values, dtype=np.dtype(f"i{values.itemsize}"))
+
+
+def median(values):
+    if not len(values):
+        return 0.0
+    if np is not None:
+        return float(np.median(as_numpy(values)))
+    ordered = sorted(values)
+    n = len(ordered)
+    mid = n // 2
+    return float(ordered[mid]) if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def streaks(focused):
+    """返回(截至最后一天的连续天数, 最长连续天数)"""
+    longest = current = 0
+    for flag in focused:
+        current = current + 1 if flag else 0
+        longest = max(longest, current)
+    return current, longest
+
+
+def rolling_mean(values, window):
+    """尾随窗口均值；开头不足一个窗口时按已有天数计算"""
+    if np is not None:
+        data = np.asarray(values, dtype=float)
+        sums = np.cumsum(data)
+        sums[window:] = sums[window:] - sums[:-window]
+        counts = np.minimum(np.arange(1, len(data) + 1), window)
+        return (sums / counts).tolist()
+    result = []
+    running = 0.0
+    for i, value in enumerate(values):
+        running += value
+        if i >= window:
+            running -= values[i - window]
+        result.append(running / min(i + 1, window))
+    return result
+
+
+class FocusAnalytics:
+    """专注分析：按天缓存小结（列式数组），只重新计算发生变化的日期
+
+    每天占用列中的一个槽位：日期序数、工作秒数、24个小时提示数和61个间隔桶；
+    有numpy时直接在这些数组上做矢量化汇总。
+    指定cache_file时槽位保存在磁盘上，下次启动只需重新计算有变化的日期。
+    refresh、report和save都在同一个后台线程中调用。
+    """
+
+    def __init__(self, streak_seconds=STREAK_SECONDS, cache_file=None, read_only=False):
+        self.streak_seconds = streak_seconds
+        self.cache_file = cache_file
+        self.read_only = read_only  # 只读取缓存文件，不写回（独立的统计进程）
+        self.loaded = cache_file is None
+        self.dirty = False  # 槽位有变化，尚未保存
+        self.slots = {}  # 日期序数 -> 槽位
+        self.fingerprints = []
+        self.ordinals = array("l")
+        self.totals = array("l")
+        self.hours = array("l")  # 槽位 * 24
+        self.interval_bins = array("l")  # 槽位 * 61
+        self.durations = []  # 每个槽位的时间段时长数组
+        self.version = 0
+        self._reports = {}
+        self.recomputed = 0  # 最近一次refresh重新计算的天数
+
+    def load(self):
+        """从缓存文件恢复槽位（文件不存在或版本不符时从空开始）"""
+        self.loaded = True
+        try:
+            with open(self.cache_file, "rb") as f:
+                data = marshal.load(f)
+            if data["version"] != CACHE_VERSION or data["itemsize"] != array("l").itemsize:
+                return
+            ordinals = array("l", data["ordinals"])
+            totals = array("l", data["totals"])
+            hours = array("l", data["hours"])
+            interval_bins = array("l", data["interval_bins"])
+            durations = [array("l", blob) for blob in data["durations"]]
+            fingerprints = [tuple(fingerprint) for fingerprint in data["fingerprints"]]
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            return
+        count = len(ordinals)
+        if not (len(totals) == len(durations) == len(fingerprints) == count
+                and len(hours) == count * HOURS and len(interval_bins) == count * INTERVAL_BINS):
+            return
+        self.ordinals, self.totals, self.hours, self.interval_bins = ordinals, totals, hours, interval_bins
+        self.durations = durations
+        self.fingerprints = fingerprints
+        self.slots = {ordinal: slot for slot, ordinal in enumerate(ordinals)}
+        self.version += 1
+        self._reports.clear()
+
+    def save(self):
+        """有变化时把槽位写入缓存文件（先写临时文件再替换）"""
+        if self.cache_file is None or self.read_only or not self.dirty:
+            return
+        data = {
+            "version": CACHE_VERSION,
+            "itemsize": self.ordinals.itemsize,
+            "ordinals": self.ordinals.tobytes(),
+            "totals": self.totals.tobytes(),
+            "hours": self.hours.tobytes(),
+            "interval_bins": self.interval_bins.tobytes(),
+            "durations": [durations.tobytes() for durations in self.durations],
+            "fingerprints": [tuple(fingerprint) for fingerprint in self.fingerprints],
+        }
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                marshal.dump(data, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            # 缓存写不进去只影响下次启动的速度
+            return
+        self.dirty = False
+
+    def refresh(self, history, start_date=None):
+        """与紧凑历史同步：只扫描start_date及之后的日期，只解码指纹变化的日期，返回重新计算的天数"""
+        if not self.loaded:
+            self.load()
+        first = bisect_left(history.ordinals, date_cls.fromisoformat(start_date).toordinal()) if start_date else 0
+        changed = 0
+        for i in range(first, len(history)):
+            fingerprint = history.fingerprint(i)
+            ordinal = fingerprint[0]
+            slot = self.slots.get(ordinal)
+            if slot is not None and self.fingerprints[slot] == fingerprint:
+                continue
+            _, total_seconds, alert_seconds, sessions = history.day(i)
+            hours, bins, durations = day_summary(alert_seconds, sessions)
+            if slot is None:
+                slot = self.slots[ordinal] = len(self.fingerprints)
+                self.fingerprints.append(fingerprint)
+                self.ordinals.append(ordinal)
+                self.totals.append(total_seconds)
+                self.hours.extend(hours)
+                self.interval_bins.extend(bins)
+                self.durations.append(durations)
+            else:
+                self.fingerprints[slot] = fingerprint
+                self.totals[slot] = total_seconds
+                self.hours[slot * HOURS:(slot + 1) * HOURS] = array("l", hours)
+                self.interval_bins[slot * INTERVAL_BINS:(slot + 1) * INTERVAL_BINS] = array("l", bins)
+                self.durations[slot] = durations
+            changed += 1
+        if changed:
+            self.version += 1
+            self._reports.clear()
+            self.dirty = True
+        self.recomputed = changed
+        return changed
+
+    def _selected_slots(self, start_ordinal, end_ordinal):
+        return sorted((ordinal, slot) for ordinal, slot in self.slots.items()
+                      if (start_ordinal is None or ordinal >= start_ordinal)
+                      and (end_ordinal is None or ordinal <= end_ordinal))
+
+    def report(self, start_date=None, end_date=None):
+        """汇总日期范围内的分析结果（同一版本的数据只计算一次）"""
+        key = (start_date, end_date)
+        if key in self._reports:
+            return self._reports[key]
+        start_ordinal = date_cls.fromisoformat(start_date).toordinal() if start_date else None
+        end_ordinal = date_cls.fromisoformat(end_date).toordinal() if end_date else None
+        selected = self._selected_slots(start_ordinal, end_ordinal)
+        if not selected:
+            return None
+        slots = [slot for _, slot in selected]
+
+        # 星期 x 小时热力图和提示间隔分布
+        if np is not None:
+            index = np.array(slots)
+            weekdays = (np.array([ordinal for ordinal, _ in selected]) - 1) % 7
+            hours = as_numpy(self.hours).reshape(-1, HOURS)[index]
+            heat = np.zeros((7, HOURS), dtype=np.int64)
+            np.add.at(heat, weekdays, hours)
+            heatmap = heat.tolist()
+            bins = as_numpy(self.interval_bins).reshape(-1, INTERVAL_BINS)[index].sum(axis=0).tolist()
+        else:
+            heatmap = [[0] * HOURS for _ in range(7)]
+            bins = [0] * INTERVAL_BINS
+            for ordinal, slot in selected:
+                row = heatmap[(ordinal - 1) % 7]
+                base = slot * HOURS
+                for h in range(HOURS):
+                    row[h] += self.hours[base + h]
+                base = slot * INTERVAL_BINS
+                for b in range(INTERVAL_BINS):
+                    bins[b] += self.interval_bins[base + b]
+
+        # 按日历补齐没有数据的日期，计算滚动均值和连续天数
+        first = start_ordinal if start_ordinal is not None else selected[0][0]
+        last = end_ordinal if end_ordinal is not None else selected[-1][0]
+        daily_seconds = [0] * (last - first + 1)
+        for ordinal, slot in selected:
+            daily_seconds[ordinal - first] = self.totals[slot]
+        daily_hours = [seconds / 3600 for seconds in daily_seconds]
+        current_streak, longest_streak = streaks(seconds >= self.streak_seconds for seconds in daily_seconds)
+
+        durations = array("l")
+        for slot in slots:
+            durations.extend(self.durations[slot])
+
+        report = {
+            "dates": [date_cls.fromordinal(o).isoformat() for o in range(first, last + 1)],
+            "daily_hours": daily_hours,
+            "rolling": {window: rolling_mean(daily_hours, window) for window in ROLLING_WINDOWS},
+            "heatmap": heatmap,
+            "interval_bins": bins,
+            "interval_median_minutes": histogram_median(bins),
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+            "session_count": len(durations),
+            "session_median_seconds": median(durations),
+            "active_days": len(selected),
+        }
+        self._reports[key] = report
+        return report
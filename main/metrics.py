@@ -0,0 +1,223 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as FrameCounter
+from contextlib import contextmanager
+
+# 延迟直方图的默认桶上界（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """单调递增的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, "", self.value)]
+
+
+class Gauge:
+    """读取时才计算的当前值"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    @property
+    def value(self):
+        return self.read()
+
+    def samples(self):
+        return [(self.name, "", self.value)]
+
+
+class Histogram:
+    """按固定桶累计的延迟直方图（与Prometheus的histogram相同）"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为+Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    @contextmanager
+    def time(self):
+        """统计代码块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q):
+        """根据桶估算分位数（返回所在桶的上界）"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, n in zip(self.buckets + (self.max,), counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def samples(self):
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        samples = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            samples.append((f"{self.name}_bucket", f'{{le="{bound}"}}', cumulative))
+        samples.append((f"{self.name}_bucket", '{le="+Inf"}', total))
+        samples.append((f"{self.name}_sum", "", value_sum))
+        samples.append((f"{self.name}_count", "", total))
+        return samples
+
+
+class MetricsRegistry:
+    """进程内的指标注册表，可导出为Prometheus文本格式"""
+
+    def __init__(self, prefix="pomodoro_"):
+        self.prefix = prefix
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args):
+        name = self.prefix + name
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args)
+        return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, buckets)
+
+    def gauge(self, name, help_text, read):
+        return self._register(Gauge, name, help_text, read)
+
+    def prometheus_text(self):
+        """生成Prometheus文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """写入node exporter的textfile收集器可以读取的文件（先写临时文件再替换）"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """诊断面板使用的可读摘要"""
+        lines = []
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            name = metric.name[len(self.prefix):]
+            if metric.kind == "histogram":
+                mean = metric.sum / metric.count if metric.count else 0.0
+                lines.append(f"{name}: {metric.count} 次，平均 {mean * 1000:.1f} ms，"
+                             f"p95 ≤ {metric.quantile(0.95) * 1000:.1f} ms，最大 {metric.max * 1000:.1f} ms")
+            else:
+                lines.append(f"{name}: {metric.value:g}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """采样分析器：在后台线程定期抓取目标线程的调用栈，统计最常出现的函数"""
+
+    def __init__(self, thread_id=None, interval=0.01):
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.interval = interval
+        self.samples = FrameCounter()  # 折叠调用栈 -> 次数
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+            self.total += 1
+
+    def top(self, n=15):
+        """按自身采样次数返回最常出现的栈顶函数 [(次数, 函数)]"""
+        leaves = FrameCounter()
+        for stack, count in list(self.samples.items()):
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [(count, name) for name, count in leaves.most_common(n)]
+
+    def write_collapsed(self, path):
+        """写出折叠调用栈格式，可直接用flamegraph.pl生成火焰图"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
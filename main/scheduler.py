@@ -0,0 +1,316 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+
+class ScheduledJob:
+    """堆中的一个定时任务"""
+    __slots__ = ("deadline", "seq", "callback", "args", "cancelled")
+
+    def __init__(self, deadline, seq, callback, args):
+        self.deadline = deadline
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class DeadlineScheduler:
+    """基于截止时间堆的调度器：只在下一个真实事件到来时才唤醒"""
+
+    # 旧版轮询循环每0.1秒唤醒一次，按此计算的理论值（实测见PollingScheduler和timer_cli simulate）
+    LEGACY_WAKEUPS_PER_MINUTE = 600
+
+    def __init__(self, clock=time.time, metrics=None):
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        # 唤醒计数，用于对比轮询模式
+        self.wakeups = 0
+        self._created_at = clock()
+        # 可选的指标：每次唤醒执行任务的耗时，以及任务相对截止时间的延迟
+        self._run_seconds = self._lateness = None
+        if metrics is not None:
+            self._run_seconds = metrics.histogram("scheduler_run_seconds", "Time spent running due jobs per scheduler wakeup")
+            self._lateness = metrics.histogram("scheduler_lateness_seconds", "Delay between a job deadline and its execution")
+            metrics.gauge("scheduler_wakeups", "Scheduler wakeups since start", lambda: self.wakeups)
+
+    def schedule_at(self, deadline, callback, *args):
+        """在指定时间点执行回调，返回可取消的任务"""
+        job = ScheduledJob(deadline, next(self._seq), callback, args)
+        heapq.heappush(self._heap, job)
+        self._rearm()
+        return job
+
+    def schedule_in(self, delay, callback, *args):
+        """在delay秒后执行回调"""
+        return self.schedule_at(self.clock() + delay, callback, *args)
+
+    def cancel(self, job):
+        """取消任务（惰性删除，弹出时跳过）"""
+        if job is not None:
+            job.cancelled = True
+
+    def next_deadline(self):
+        """返回最近一个未取消任务的截止时间，没有任务时返回None"""
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+        return self._heap[0].deadline if self._heap else None
+
+    def run_pending(self, now=None):
+        """执行所有已到期的任务，返回执行的数量"""
+        self.wakeups += 1
+        if now is None:
+            now = self.clock()
+        started = time.perf_counter()
+        count = 0
+        while self._heap and self._heap[0].deadline <= now:
+            job = heapq.heappop(self._heap)
+            if job.cancelled:
+                continue
+            self._run_job(job, now)
+            count += 1
+        self._observe_run(started, count)
+        self._rearm()
+        return count
+
+    def _run_job(self, job, now):
+        if self._lateness is not None:
+            self._lateness.observe(max(0.0, now - job.deadline))
+        job.callback(*job.args)
+
+    def _observe_run(self, started, count):
+        if self._run_seconds is not None and count:
+            self._run_seconds.observe(time.perf_counter() - started)
+
+    def wakeups_per_minute(self):
+        """计算自创建以来平均每分钟的唤醒次数"""
+        elapsed = self.clock() - self._created_at
+        if elapsed <= 0:
+            return 0.0
+        return self.wakeups * 60.0 / elapsed
+
+    def _rearm(self):
+        """子类在这里安排下一次唤醒"""
+        pass
+
+
+class TkScheduler(DeadlineScheduler):
+    """使用Tk的after()驱动的调度器，所有回调都在Tk主线程中执行"""
+
+    def __init__(self, widget, clock=time.time, metrics=None):
+        self.widget = widget
+        self._after_id = None
+        self._armed_deadline = None
+        super().__init__(clock, metrics)
+
+    def _rearm(self):
+        deadline = self.next_deadline()
+        if deadline == self._armed_deadline:
+            return
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._armed_deadline = deadline
+        if deadline is None:
+            return
+        # 向上取整，避免提前几毫秒醒来却没有到期任务
+        delay_ms = max(0, math.ceil((deadline - self.clock()) * 1000))
+        self._after_id = self.widget.after(delay_ms, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._after_id = None
+        self._armed_deadline = None
+        self.run_pending()
+
+
+class BlockingScheduler(DeadlineScheduler):
+    """无界面模式使用的调度器：在当前线程中睡眠到下一个截止时间"""
+
+    def __init__(self, clock=time.time, metrics=None):
+        self._cond = threading.Condition(threading.RLock())
+        super().__init__(clock, metrics)
+
+    def schedule_at(self, deadline, callback, *args):
+        with self._cond:
+            return super().schedule_at(deadline, callback, *args)
+
+    def _rearm(self):
+        with self._cond:
+            self._cond.notify()
+
+    def run(self, stop_event):
+        """循环执行到期任务，直到stop_event被设置"""
+        while not stop_event.is_set():
+            with self._cond:
+                deadline = self.next_deadline()
+                timeout = None if deadline is None else max(0.0, deadline - self.clock())
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                if stop_event.is_set():
+                    break
+                self.run_pending()
+
+    def wake(self):
+        """唤醒run循环（例如设置stop_event之后）"""
+        self._rearm()
+
+
+class PollingScheduler(DeadlineScheduler):
+    """旧版的固定间隔轮询：不管有没有到期的任务，每poll_interval秒唤醒一次
+
+    只用于在虚拟时钟上复现旧版的主循环，用同一个唤醒计数测量改造前的唤醒次数。
+    """
+
+    def __init__(self, clock=time.time, metrics=None, poll_interval=0.1):
+        self.poll_interval = poll_interval
+        super().__init__(clock, metrics)
+        self._next_poll = self._created_at + poll_interval
+
+    def next_deadline(self):
+        """有任务时下一次唤醒总是下一个轮询时刻"""
+        if super().next_deadline() is None:
+            return None
+        return self._next_poll
+
+    def run_pending(self, now=None):
+        if now is None:
+            now = self.clock()
+        count = super().run_pending(now)
+        while self._next_poll <= now:
+            self._next_poll += self.poll_interval
+        return count
+
+
+class WheelJob(ScheduledJob):
+    """时间轮中的任务，额外记录所在的刻度"""
+    __slots__ = ("tick",)
+
+
+class TimerWheel(DeadlineScheduler):
+    """哈希时间轮：插入和取消都是O(1)，适合同时调度上万个会话的定时任务
+
+    时间被划分为resolution秒的刻度，任务按刻度放入slots个槽中的一个，
+    每次推进只检查经过的槽，超过一圈的任务留在槽中等下一圈。
+    """
+
+    def __init__(self, clock=time.time, resolution=0.1, slots=4096, metrics=None):
+        self.resolution = resolution
+        self.slots = [[] for _ in range(slots)]
+        self._due = []  # 插入时已经到期的任务
+        self.live = 0  # 未取消且未执行的任务数
+        super().__init__(clock, metrics)
+        self.current_tick = math.floor(self._created_at / resolution)
+
+    def _tick_of(self, deadline):
+        # 向上取整，保证任务不会在截止时间之前执行
+        return math.ceil(deadline / self.resolution)
+
+    def schedule_at(self, deadline, callback, *args):
+        job = WheelJob(deadline, next(self._seq), callback, args)
+        job.tick = self._tick_of(deadline)
+        if job.tick <= self.current_tick:
+            self._due.append(job)
+        else:
+            self.slots[job.tick % len(self.slots)].append(job)
+        self.live += 1
+        self._rearm()
+        return job
+
+    def cancel(self, job):
+        if job is not None and not job.cancelled:
+            job.cancelled = True
+            self.live -= 1
+
+    def next_deadline(self):
+        """返回最近的任务截止时间（需要扫描槽，只用于模拟和空闲判断）"""
+        if not self.live:
+            return None
+        due = [job.deadline for job in self._due if not job.cancelled]
+        if due:
+            return min(due)
+        best = None
+        n = len(self.slots)
+        for offset in range(1, n + 1):
+            tick = self.current_tick + offset
+            found = False
+            for job in self.slots[tick % n]:
+                if job.cancelled:
+                    continue
+                found = found or job.tick == tick
+                if best is None or job.deadline < best:
+                    best = job.deadline
+            if found:
+                break
+        return best
+
+    def run_pending(self, now=None):
+        """推进时间轮到now，执行所有到期的任务"""
+        self.wakeups += 1
+        if now is None:
+            now = self.clock()
+        target = math.floor(now / self.resolution)
+        ready = self._due
+        self._due = []
+        n = len(self.slots)
+        # 多检查一个槽，取出截止时间已到但刻度尚未走完的任务；落后超过一圈时每个槽只需检查一次
+        for tick in range(self.current_tick + 1, min(target + 1, self.current_tick + n) + 1):
+            slot = self.slots[tick % n]
+            if not slot:
+                continue
+            keep = []
+            for job in slot:
+                if job.cancelled:
+                    continue
+                if job.tick <= target or job.deadline <= now:
+                    ready.append(job)
+                else:
+                    keep.append(job)
+            self.slots[tick % n] = keep
+        self.current_tick = max(self.current_tick, target)
+        ready.sort()
+        started = time.perf_counter()
+        count = 0
+        for job in ready:
+            if job.cancelled:
+                continue
+            job.cancelled = True
+            self.live -= 1
+            self._run_job(job, now)
+            count += 1
+        self._observe_run(started, count)
+        self._rearm()
+        return count
+
+
+class SimulatedClock:
+    """可注入的虚拟时钟，用于比实际时间更快地模拟"""
+
+    def __init__(self, start=None):
+        # 默认从当前真实时间开始，时间戳可以正常格式化
+        self.now = time.time() if start is None else start
+
+    def __call__(self):
+        return self.now
+
+
+def run_simulation(scheduler, clock, until):
+    """把虚拟时钟依次拨到每个截止时间并执行任务，直到until"""
+    while True:
+        deadline = scheduler.next_deadline()
+        if deadline is None or deadline > until:
+            break
+        clock.now = max(clock.now, deadline)
+        scheduler.run_pending()
+    clock.now = until
+
+
+def next_whole_second(now, origin):
+    """计算从origin开始计时，下一次整秒跳变的时间点"""
+    elapsed = now - origin
+    return origin + int(elapsed) + 1
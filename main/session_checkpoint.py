@@ -0,0 +1,246 @@
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+
+from compact_events import AlertLog, WorkSessionLog
+
+# 会话检查点文件格式（本机字节序，mmap后原地更新）：
+#   文件头  : 魔数、版本、状态（已结算/空闲/运行中）、提示容量、时间段容量、会话开始时间、
+#             尚未写入统计的纯工作时间、当前工作开始时间、当前工作时间段开始时间、最后更新时间、提示数、时间段数
+#   提示数组: 提示容量个double时间戳
+#   时间段  : 时间段容量对double（开始、结束）
+# 先写数组元素再写计数，进程在任意时刻被杀都能读到一致的前缀；
+# 容量不够时把现有内容复制到容量加倍的临时文件，再原子替换并重新映射
+MAGIC = b"PCCK"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("=4sHHIIdddddII")
+STATE_CLEAN, STATE_IDLE, STATE_RUNNING = 0, 1, 2
+# 新建文件时的初始容量
+ALERT_CAPACITY = 8192
+SESSION_CAPACITY = 2048
+# 版本1的文件头和固定容量，只用于恢复升级前留下的检查点
+V1_HEADER = struct.Struct("=4sHHdddddII")
+V1_ALERT_CAPACITY = 8192
+V1_SESSION_CAPACITY = 2048
+# 两次msync之间的最短间隔（秒），进程崩溃不依赖msync，只有断电时才需要
+FLUSH_INTERVAL = 30.0
+# 这些事件只更新最后更新时间
+HEARTBEAT_EVENTS = ("tick", "break_tick", "next_alert", "last_interval")
+
+DOUBLE = struct.Struct("=d")
+PAIR = struct.Struct("=dd")
+COUNTS_OFFSET = HEADER.size - 8
+LAST_SEEN_OFFSET = COUNTS_OFFSET - 8
+WORK_START_OFFSET = LAST_SEEN_OFFSET - 16
+PURE_WORK_TIME_OFFSET = WORK_START_OFFSET - 8
+
+
+def file_size(alert_capacity, session_capacity, header=HEADER):
+    return header.size + alert_capacity * 8 + session_capacity * 16
+
+
+def read_checkpoint(data):
+    """解析检查点内容，返回(状态, 纯工作时间, 工作开始时间, 时间段开始时间, 最后更新时间,
+    提示数组偏移, 提示数, 时间段数组偏移, 时间段数)；格式不符时返回None"""
+    if len(data) < V1_HEADER.size or data[:4] != MAGIC:
+        return None
+    version = struct.unpack_from("=H", data, 4)[0]
+    if version == 1:
+        header = V1_HEADER
+        (_, _, state, _, pure_work_time, work_start, session_start,
+         last_seen, alert_count, session_count) = header.unpack_from(data)
+        alert_capacity, session_capacity = V1_ALERT_CAPACITY, V1_SESSION_CAPACITY
+    elif version == FORMAT_VERSION and len(data) >= HEADER.size:
+        header = HEADER
+        (_, _, state, alert_capacity, session_capacity, _, pure_work_time, work_start, session_start,
+         last_seen, alert_count, session_count) = header.unpack_from(data)
+    else:
+        return None
+    if len(data) != file_size(alert_capacity, session_capacity, header):
+        return None
+    alerts_offset = header.size
+    sessions_offset = alerts_offset + alert_capacity * 8
+    return (state, pure_work_time, work_start, session_start, last_seen,
+            alerts_offset, min(alert_count, alert_capacity), sessions_offset, min(session_count, session_capacity))
+
+
+class RecoveredSession:
+    """从检查点恢复的会话，字段与TimerEngine相同，可直接交给record_session"""
+
+    def __init__(self, pure_work_time, alert_times, work_sessions, last_seen):
+        self.pure_work_time = pure_work_time
+        self.alert_times = alert_times
+        self.work_sessions = work_sessions
+        self.last_seen = last_seen
+
+    def wall_time(self, t):
+        """检查点中保存的已经是墙上时间"""
+        return t
+
+    @property
+    def date(self):
+        return datetime.fromtimestamp(self.last_seen).strftime("%Y-%m-%d")
+
+
+class SessionCheckpoint:
+    """计时核心会话状态的mmap检查点：每次状态变化原地写入几个字段，不做序列化"""
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.engine = None
+        self.mm = None
+        self._file = None
+        self.alert_capacity = ALERT_CAPACITY
+        self.session_capacity = SESSION_CAPACITY
+        self.alert_count = 0
+        self.session_count = 0
+        self.last_flush = 0.0
+
+    def recover(self):
+        """读取上次未正常结束的会话，没有时返回None"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        parsed = read_checkpoint(data)
+        if parsed is None:
+            return None
+        (state, pure_work_time, work_start, session_start, last_seen,
+         alerts_offset, alert_count, sessions_offset, session_count) = parsed
+        if state == STATE_CLEAN:
+            return None
+
+        alert_times = AlertLog()
+        alert_times.times.frombytes(data[alerts_offset:alerts_offset + alert_count * 8])
+        work_sessions = WorkSessionLog()
+        for i in range(session_count):
+            work_sessions.add(*PAIR.unpack_from(data, sessions_offset + i * PAIR.size))
+        # 与正常退出时的结算相同：运行中的工作计到最后一次更新为止
+        if state == STATE_RUNNING:
+            if work_start:
+                pure_work_time += max(0.0, last_seen - work_start)
+            if session_start and last_seen > session_start:
+                work_sessions.add(session_start, last_seen)
+        if not pure_work_time and not len(alert_times) and not len(work_sessions):
+            return None
+        return RecoveredSession(pure_work_time, alert_times, work_sessions, last_seen)
+
+    def open(self, engine):
+        """创建（或重置）检查点文件并映射到内存，之后跟随计时核心的事件更新"""
+        self.alert_capacity = ALERT_CAPACITY
+        self.session_capacity = SESSION_CAPACITY
+        size = file_size(self.alert_capacity, self.session_capacity)
+        with open(self.path, "wb") as f:
+            f.truncate(size)
+        self._map(size)
+        self.alert_count = 0
+        self.session_count = 0
+        self.engine = engine
+        self.sync()
+        engine.subscribe(self.on_engine_event)
+
+    def _map(self, size):
+        self._file = open(self.path, "r+b")
+        self.mm = mmap.mmap(self._file.fileno(), size)
+
+    def alerts_offset(self):
+        return HEADER.size
+
+    def sessions_offset(self):
+        return HEADER.size + self.alert_capacity * 8
+
+    def grow(self, alert_count, session_count):
+        """容量加倍直到能容纳alert_count个提示和session_count个时间段：
+        把已写入的内容复制到新大小的临时文件，原子替换后重新映射"""
+        alert_capacity = self.alert_capacity
+        session_capacity = self.session_capacity
+        while alert_capacity < alert_count:
+            alert_capacity *= 2
+        while session_capacity < session_count:
+            session_capacity *= 2
+        mm = self.mm
+        alerts = mm[self.alerts_offset():self.alerts_offset() + self.alert_count * 8]
+        sessions = mm[self.sessions_offset():self.sessions_offset() + self.session_count * PAIR.size]
+        header = bytearray(mm[:HEADER.size])
+        struct.pack_into("=II", header, 8, alert_capacity, session_capacity)
+        size = file_size(alert_capacity, session_capacity)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+            f.write(header)
+            f.write(alerts)
+            f.seek(HEADER.size + alert_capacity * 8)
+            f.write(sessions)
+        # 先关闭旧的映射（Windows上不能替换仍被映射的文件），替换前崩溃时旧文件仍然完整
+        mm.close()
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self.alert_capacity = alert_capacity
+        self.session_capacity = session_capacity
+        self._map(size)
+
+    def on_engine_event(self, event, **data):
+        """订阅计时核心的事件，在每次状态变化后同步检查点"""
+        if self.mm is None:
+            return
+        if event in HEARTBEAT_EVENTS:
+            now = self.clock()
+            DOUBLE.pack_into(self.mm, WORK_START_OFFSET, self.work_start(now))
+            DOUBLE.pack_into(self.mm, LAST_SEEN_OFFSET, now)
+            return
+        if event == "session_reset":
+            # 会话数据已写入统计，清空检查点中的提示、时间段和纯工作时间（计时核心已清零）；
+            # 否则在写入统计之后、close()之前崩溃会在恢复时重复计算
+            self.alert_count = self.session_count = 0
+            struct.pack_into("=II", self.mm, COUNTS_OFFSET, 0, 0)
+            DOUBLE.pack_into(self.mm, PURE_WORK_TIME_OFFSET, 0.0)
+        self.sync()
+
+    def work_start(self, now):
+        """当前工作的起点折算为墙上时间：now减去计时时钟上已工作的时长（不含排除的挂起时间）"""
+        engine = self.engine
+        if not engine.work_start_time:
+            return 0
+        return now - (engine.clock() - engine.work_start_time)
+
+    def sync(self):
+        """把计时核心的状态写入检查点（只追加新增的提示和时间段，时间都换算为墙上时间）"""
+        mm = self.mm
+        engine = self.engine
+        wall_time = lambda t: engine.wall_time(t) if t else 0
+        alerts = engine.alert_times
+        sessions = engine.work_sessions
+        if len(alerts) > self.alert_capacity or len(sessions) > self.session_capacity:
+            self.grow(len(alerts), len(sessions))
+            mm = self.mm
+        alerts_offset = self.alerts_offset()
+        sessions_offset = self.sessions_offset()
+        for i in range(self.alert_count, len(alerts)):
+            DOUBLE.pack_into(mm, alerts_offset + i * 8, wall_time(alerts.times[i]))
+        for i in range(self.session_count, len(sessions)):
+            PAIR.pack_into(mm, sessions_offset + i * PAIR.size, wall_time(sessions.starts[i]), wall_time(sessions.ends[i]))
+        self.alert_count = len(alerts)
+        self.session_count = len(sessions)
+        now = self.clock()
+        HEADER.pack_into(mm, 0, MAGIC, FORMAT_VERSION, STATE_RUNNING if engine.running else STATE_IDLE,
+                         self.alert_capacity, self.session_capacity,
+                         wall_time(engine.session_start_time), engine.pure_work_time,
+                         self.work_start(now), wall_time(engine.current_work_session_start),
+                         now, self.alert_count, self.session_count)
+        if now - self.last_flush >= FLUSH_INTERVAL:
+            mm.flush()
+            self.last_flush = now
+
+    def close(self):
+        """正常退出：标记为已结算并关闭映射"""
+        if self.mm is None:
+            return
+        struct.pack_into("=H", self.mm, 6, STATE_CLEAN)
+        self.mm.flush()
+        self.mm.close()
+        self._file.close()
+        self.mm = None
@@ -0,0 +1,48 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """记录启动过程中每个导入和初始化步骤的耗时（--startup-profile）"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.steps = []  # [(步骤名, 耗时秒数)]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        """统计一个步骤的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - start)
+
+    def import_module(self, name):
+        """导入模块并统计导入耗时"""
+        with self.step(f"import {name}"):
+            return importlib.import_module(name)
+
+    def mark(self, name):
+        """记录从程序启动到当前时刻的时间（例如首个窗口出现）"""
+        self._add(name, time.perf_counter() - self.origin)
+
+    def _add(self, name, seconds):
+        with self._lock:
+            self.steps.append((name, seconds))
+        if self.enabled:
+            print(f"[startup] {name}: {seconds * 1000:.1f} ms")
+
+    def report(self):
+        """返回所有步骤的耗时报告"""
+        with self._lock:
+            steps = list(self.steps)
+        width = max((len(name) for name, _ in steps), default=0)
+        lines = ["启动耗时报告："]
+        for name, seconds in steps:
+            lines.append(f"  {name.ljust(width)}  {seconds * 1000:8.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,128 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+from stats_store import JournalStatsStore, hms_to_seconds
+
+# 每种记录的字段（CSV表头）
+FIELDS = {
+    "days": ("date", "total_seconds", "alerts", "work_sessions"),
+    "alerts": ("date", "time"),
+    "sessions": ("date", "start_time", "end_time", "duration_seconds"),
+}
+# "all"只用于NDJSON：按天依次输出汇总、提示和时间段，每条记录带type字段
+KINDS = ("days", "alerts", "sessions", "all")
+FORMATS = ("ndjson", "csv")
+
+
+def day_records(date, data, kind):
+    """生成某一天的导出记录"""
+    if kind in ("days", "all"):
+        record = {"date": date,
+                  "total_seconds": hms_to_seconds(data.get("total_time", "00:00:00")),
+                  "alerts": len(data.get("alert_times", [])),
+                  "work_sessions": len(data.get("work_sessions", []))}
+        yield {"type": "day", **record} if kind == "all" else record
+    if kind in ("alerts", "all"):
+        for alert_time in data.get("alert_times", []):
+            record = {"date": date, "time": alert_time}
+            yield {"type": "alert", **record} if kind == "all" else record
+    if kind in ("sessions", "all"):
+        for session in data.get("work_sessions", []):
+            record = {"date": date,
+                      "start_time": session['start_time'],
+                      "end_time": session['end_time'],
+                      "duration_seconds": hms_to_seconds(session['duration'])}
+            yield {"type": "session", **record} if kind == "all" else record
+
+
+def guess_format(path):
+    """根据扩展名（忽略.gz）判断导出格式"""
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "ndjson"
+
+
+def open_output(path, compress):
+    """打开文本输出流，"-"表示标准输出"""
+    if path == "-":
+        if compress:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb"), encoding="utf-8", newline="")
+        return io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="", write_through=True)
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def write_records(days, out, kind="days", fmt="ndjson", extra=()):
+    """把(日期, 数据)迭代器逐条写入out，返回写入的记录数；extra为附加在末尾的记录"""
+    if fmt == "csv":
+        if kind == "all":
+            raise ValueError("CSV导出需要指定单一的记录类型")
+        writer = csv.DictWriter(out, fieldnames=FIELDS[kind], extrasaction="ignore")
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            out.write("\n")
+    count = 0
+    for date, data in days:
+        for record in day_records(date, data, kind):
+            write(record)
+            count += 1
+    for record in extra:
+        write(record)
+        count += 1
+    return count
+
+
+def export_stats(store, path, kind="days", fmt=None, start_date=None, end_date=None, compress=None, extra=()):
+    """从统计存储流式导出到文件，返回记录数"""
+    fmt = fmt or guess_format(path)
+    if compress is None:
+        compress = path.endswith(".gz")
+    days = store.iter_days(start_date, end_date)
+    out = open_output(path, compress)
+    try:
+        return write_records(days, out, kind, fmt, extra)
+    finally:
+        if path == "-" and not compress:
+            # 不关闭标准输出本身
+            out.flush()
+            out.detach()
+        else:
+            out.close()
+
+
+def main(argv=None):
+    default_stats = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_stats.json")
+    parser = argparse.ArgumentParser(description="流式导出统计数据（NDJSON/CSV，可gzip压缩）")
+    parser.add_argument("output", help="输出文件，\"-\"为标准输出；以.gz结尾时自动压缩")
+    parser.add_argument("--stats-file", default=default_stats, help="统计数据文件（timer_stats.json）")
+    parser.add_argument("--db", help="改为从SQLite数据库导出")
+    parser.add_argument("--kind", choices=KINDS, default="days", help="导出的记录类型")
+    parser.add_argument("--format", choices=FORMATS, help="导出格式（默认按扩展名判断）")
+    parser.add_argument("--from", dest="start_date", help="起始日期 YYYY-MM-DD（含）")
+    parser.add_argument("--to", dest="end_date", help="结束日期 YYYY-MM-DD（含）")
+    parser.add_argument("--gzip", action="store_true", default=None, help="gzip压缩输出")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        from stats_sqlite import SqliteStatsStore
+        store = SqliteStatsStore(args.db)
+    else:
+        store = JournalStatsStore(args.stats_file)
+        store.load()
+    fmt = args.format or guess_format(args.output)
+    if fmt == "csv" and args.kind == "all":
+        parser.error("CSV导出需要指定 --kind days/alerts/sessions")
+    count = export_stats(store, args.output, args.kind, fmt, args.start_date, args.end_date, args.gzip)
+    print(f"已导出 {count} 条记录", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from stats_store import META_KEY, JournalStatsStore, hms_to_seconds, normalize_legacy, seconds_to_hms
+
+# 目录中会被导入的文件（统计快照、旧版导出、NDJSON和CSV导出，可gzip压缩）
+IMPORT_SUFFIXES = (".json", ".ndjson", ".jsonl", ".csv")
+# 同目录下的派生文件，不是统计数据
+SKIP_SUFFIXES = (".rollup.json",)
+
+
+def open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def base_name(path):
+    """去掉.gz后的小写文件名"""
+    name = path.lower()
+    return name[:-3] if name.endswith(".gz") else name
+
+
+def days_from_stats(daily_stats):
+    """把每日统计数据（时分秒格式）转换为 {日期: (秒数, 提示列表, [(开始, 结束, 秒数)])}"""
+    days = {}
+    for date, data in normalize_legacy(daily_stats).items():
+        sessions = [(s['start_time'], s['end_time'], hms_to_seconds(s['duration']))
+                    for s in data.get("work_sessions", [])]
+        days[date] = (hms_to_seconds(data.get("total_time", "00:00:00")), list(data.get("alert_times", [])), sessions)
+    return days
+
+
+def add_record(days, record):
+    """把一条导出记录（每日汇总、提示或时间段）合并到days"""
+    kind = record.get("type")
+    if kind is None:
+        kind = "day" if "total_seconds" in record else "session" if "start_time" in record else "alert"
+    total, alerts, sessions = days.setdefault(record["date"], (0, [], []))
+    if kind == "day":
+        days[record["date"]] = (max(total, int(record["total_seconds"])), alerts, sessions)
+    elif kind == "alert":
+        alerts.append(record["time"])
+    elif kind == "session":
+        sessions.append((record["start_time"], record["end_time"], int(record["duration_seconds"])))
+
+
+def parse_stats_file(path):
+    """解析一个统计文件（在工作进程中运行），返回(路径, 每天的数据, 错误信息)"""
+    try:
+        name = base_name(path)
+        if name.endswith(".csv"):
+            days = {}
+            with open_text(path) as f:
+                for record in csv.DictReader(f):
+                    add_record(days, record)
+        elif name.endswith((".ndjson", ".jsonl")):
+            days = {}
+            with open_text(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record.get("type") != "current_session":
+                        add_record(days, record)
+        else:
+            with open_text(path) as f:
+                data = json.load(f)
+            if isinstance(data.get("daily_stats"), dict):
+                # 旧版export_stats的输出
+                days = days_from_stats(data["daily_stats"])
+            elif path.endswith(".gz"):
+                days = days_from_stats({k: v for k, v in data.items() if k != META_KEY})
+            else:
+                # timer_stats.json：连同同名日志一起只读读取（不加锁，不在输入目录中创建锁文件和缓存）
+                days = days_from_stats(JournalStatsStore(path, snapshot_cache=False, read_only=True).load())
+        return path, days, None
+    except Exception as e:
+        return path, {}, f"{type(e).__name__}: {e}"
+
+
+def session_interval(session):
+    start_time, _, duration = session
+    start = hms_to_seconds(start_time)
+    return start, start + duration
+
+
+def dedupe_sessions(sessions):
+    """去掉重复和被其他时间段完全包含的时间段，按开始时间排序"""
+    # 每个时间段只解析一次开始时间
+    unique = sorted(((session_interval(s), s) for s in set(sessions)), key=lambda item: (item[0][0], -item[1][2]))
+    kept = []
+    covered_until = -1
+    for (start, end), session in unique:
+        if end <= covered_until:
+            continue
+        kept.append(session)
+        covered_until = max(covered_until, end)
+    return kept
+
+
+def union_seconds(sessions):
+    """时间段并集的总秒数（重叠部分只算一次）"""
+    total = 0
+    current_start = current_end = None
+    for start, end in sorted(session_interval(s) for s in sessions):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class StatsMerger:
+    """合并多个来源的每日数据
+
+    同一天出现在多个文件中时：提示按时间去重，时间段去掉重复和被包含的部分，
+    工作时间取各文件中的最大值与时间段并集时长两者中较大的一个。
+    这样同一台机器的重叠导出不会重复计算，不同机器的不同时间段会累加。
+    """
+
+    def __init__(self):
+        self.days = {}  # 日期 -> [最大秒数, 提示集合, 时间段集合]
+
+    def add(self, days):
+        for date, (total, alerts, sessions) in days.items():
+            merged = self.days.setdefault(date, [0, set(), set()])
+            merged[0] = max(merged[0], total)
+            merged[1].update(alerts)
+            merged[2].update(sessions)
+
+    def result(self, date):
+        """返回某天合并后的(秒数, 排序后的提示, 去重后的时间段)"""
+        total, alerts, sessions = self.days[date]
+        sessions = dedupe_sessions(sessions)
+        return max(total, union_seconds(sessions)), sorted(alerts), sessions
+
+
+def merge_into_store(merger, store):
+    """把合并结果以增量事件写入存储（已存在的数据不会重复写入），返回统计"""
+    summary = {"days": 0, "seconds": 0, "alerts": 0, "sessions": 0}
+    # 目标存储中已有的数据也作为一个来源参与去重
+    for date in merger.days:
+        existing = store.daily_stats.get(date)
+        if existing:
+            merger.add(days_from_stats({date: existing}))
+    for date in sorted(merger.days):
+        existing = days_from_stats({date: store.daily_stats[date]})[date] if date in store.daily_stats else (0, [], [])
+        total, alerts, sessions = merger.result(date)
+        changed = False
+        if total > existing[0]:
+            store.record_total_time(date, total - existing[0])
+            summary["seconds"] += total - existing[0]
+            changed = True
+        known_alerts = set(existing[1])
+        for alert_time in alerts:
+            if alert_time not in known_alerts:
+                store.record_alert(date, alert_time)
+                summary["alerts"] += 1
+                changed = True
+        known_sessions = set(existing[2])
+        for session in sessions:
+            if session not in known_sessions:
+                store.record_work_session(date, {'start_time': session[0], 'end_time': session[1],
+                                                 'duration': seconds_to_hms(session[2])})
+                summary["sessions"] += 1
+                changed = True
+        summary["days"] += changed
+    store.save()
+    return summary
+
+
+def collect_files(paths, exclude=()):
+    """展开目录，返回要导入的文件列表"""
+    exclude = {os.path.abspath(p) for p in exclude}
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if base_name(name).endswith(IMPORT_SUFFIXES) and not base_name(name).endswith(SKIP_SUFFIXES))
+        else:
+            files.append(path)
+    return [f for f in files if os.path.abspath(f) not in exclude]
+
+
+def parse_files(files, workers=None):
+    """在进程池中并行解析文件，按文件顺序逐个产出结果"""
+    if workers == 1 or len(files) <= 1:
+        yield from map(parse_stats_file, files)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(files) // ((workers or os.cpu_count() or 1) * 4))
+        yield from pool.map(parse_stats_file, files, chunksize=chunksize)
+
+
+def import_files(files, store, workers=None):
+    """并行解析多个统计文件并合并到store，返回(汇总, 失败列表)"""
+    merger = StatsMerger()
+    failures = []
+    for path, days, error in parse_files(files, workers):
+        if error:
+            failures.append((path, error))
+        else:
+            merger.add(days)
+    return merge_into_store(merger, store), failures
+
+
+def main(argv=None):
+    default_stats = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_stats.json")
+    parser = argparse.ArgumentParser(description="并行导入并合并多台机器的统计文件")
+    parser.add_argument("paths", nargs="+", help="统计文件或目录（timer_stats.json、导出的JSON/NDJSON/CSV，可gzip压缩）")
+    parser.add_argument("--into", default=default_stats, help="合并到的统计数据文件")
+    parser.add_argument("--db", help="改为合并到SQLite数据库")
+    parser.add_argument("--workers", type=int, default=None, help="解析进程数（默认为CPU核数）")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        from stats_sqlite import SqliteStatsStore
+        store = SqliteStatsStore(args.db)
+        target = args.db
+    else:
+        store = JournalStatsStore(args.into)
+        store.load()
+        target = args.into
+    files = collect_files(args.paths, exclude=[target])
+    summary, failures = import_files(files, store, args.workers)
+    for path, error in failures:
+        print(f"无法解析 {path}: {error}", file=sys.stderr)
+    print(f"已导入 {len(files) - len(failures)} 个文件：新增 {summary['alerts']} 次提示、"
+          f"{summary['sessions']} 个时间段、{seconds_to_hms(summary['seconds'])} 工作时间，涉及 {summary['days']} 天")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
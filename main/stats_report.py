@@ -0,0 +1,287 @@
+import argparse
+import bisect
+import csv
+import functools
+import html
+import importlib.util
+import os
+import re
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from stats_import import StatsMerger, base_name, collect_files, parse_stats_file
+from stats_rollup import period_keys
+from stats_store import seconds_to_hms
+
+PERIODS = ("day", "week", "month")
+PERIOD_NAMES = {"day": "日", "week": "周", "month": "月"}
+# 工作时间段时长分布的分界（分钟）
+SESSION_BUCKETS = (15, 30, 60, 90)
+BUCKET_LABELS = ("<15m", "15-30m", "30-60m", "60-90m", ">=90m")
+# 团队汇总行使用的用户名（带括号，不会与文件名得到的用户名冲突）
+TEAM = "(team)"
+FIELDS = ("user", "period", "users", "total_seconds", "total_time", "alerts", "work_sessions",
+          "mean_session_minutes", "median_session_minutes") + BUCKET_LABELS
+
+
+def user_name(path):
+    """文件对应的用户：文件名第一个点之前的部分；默认文件名timer_stats时用所在目录名"""
+    name = os.path.basename(base_name(path)).split(".")[0]
+    if name == "timer_stats":
+        name = os.path.basename(os.path.dirname(os.path.abspath(path))).lower()
+    return name
+
+
+def group_files(files):
+    """按用户分组文件：同一用户的多个文件（不同机器、不同格式的导出）一起合并"""
+    users = {}
+    for path in files:
+        users.setdefault(user_name(path), []).append(path)
+    return users
+
+
+def safe_file_name(name):
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def bucket_counts(durations):
+    """按SESSION_BUCKETS统计时间段时长（秒）的分布"""
+    bounds = [minutes * 60 for minutes in SESSION_BUCKETS]
+    counts = [0] * len(BUCKET_LABELS)
+    for duration in durations:
+        counts[bisect.bisect_right(bounds, duration)] += 1
+    return counts
+
+
+def summarize_user(task):
+    """解析并合并一个用户的全部文件（在工作进程中运行）
+
+    返回(用户, {日期: (秒数, 提示次数, [时间段秒数])}, 失败列表)。
+    合并规则与stats_import相同；chart_dir不为None时同时在本进程中绘制该用户的图表。
+    """
+    user, paths, start_date, end_date, chart_dir, period = task
+    sources = []
+    failures = []
+    for path in paths:
+        _, days, error = parse_stats_file(path)
+        if error:
+            failures.append((path, error))
+        else:
+            sources.append({date: day for date, day in days.items()
+                            if (not start_date or date >= start_date) and (not end_date or date <= end_date)})
+    # 与stats_import相同的合并规则：单个文件也去掉重复的提示和重叠的时间段
+    merger = StatsMerger()
+    for source in sources:
+        merger.add(source)
+    days = {}
+    for date in sorted(merger.days):
+        total, alerts, sessions = merger.result(date)
+        days[date] = (total, len(alerts), [duration for _, _, duration in sessions])
+    if chart_dir is not None and days:
+        render_charts(chart_dir, safe_file_name(user), days, period)
+    return user, days, failures
+
+
+# 同一天在每个用户的数据中都会出现，日期解析结果只计算一次
+cached_period_keys = functools.lru_cache(maxsize=None)(period_keys)
+
+
+def aggregate(days, period):
+    """把每天的数据汇总到日/周/月，返回 {键: [秒数, 提示次数, [时间段秒数]]}"""
+    index = {"week": 0, "month": 1}.get(period)
+    buckets = {}
+    for date, (total, alerts, durations) in days.items():
+        key = date if index is None else cached_period_keys(date)[index]
+        bucket = buckets.setdefault(key, [0, 0, []])
+        bucket[0] += total
+        bucket[1] += alerts
+        bucket[2].extend(durations)
+    return buckets
+
+
+def summary_row(user, key, total, alerts, durations, users=1):
+    row = {"user": user, "period": key, "users": users, "total_seconds": total,
+           "total_time": seconds_to_hms(total), "alerts": alerts, "work_sessions": len(durations),
+           "mean_session_minutes": round(sum(durations) / len(durations) / 60, 1) if durations else 0,
+           "median_session_minutes": round(statistics.median(durations) / 60, 1) if durations else 0}
+    row.update(zip(BUCKET_LABELS, bucket_counts(durations)))
+    return row
+
+
+def team_days(results):
+    """把所有用户的数据按天相加"""
+    team = {}
+    for days in results.values():
+        for date, (total, alerts, durations) in days.items():
+            merged = team.setdefault(date, [0, 0, []])
+            merged[0] += total
+            merged[1] += alerts
+            merged[2].extend(durations)
+    return {date: tuple(team[date]) for date in sorted(team)}
+
+
+def period_rows(results, period):
+    """每个用户和团队在每个日/周/月的汇总行"""
+    rows = []
+    active = {}  # 每个周期有记录的人数
+    for user in sorted(results):
+        for key, (total, alerts, durations) in sorted(aggregate(results[user], period).items()):
+            rows.append(summary_row(user, key, total, alerts, durations))
+            active[key] = active.get(key, 0) + 1
+    for key, (total, alerts, durations) in sorted(aggregate(team_days(results), period).items()):
+        rows.append(summary_row(TEAM, key, total, alerts, durations, active[key]))
+    return rows
+
+
+def user_totals(results):
+    """每个用户在整个日期范围内的汇总行"""
+    rows = []
+    for user in sorted(results):
+        days = results[user]
+        durations = [d for _, _, day_durations in days.values() for d in day_durations]
+        rows.append(summary_row(user, f"{min(days)}~{max(days)}" if days else "",
+                                sum(day[0] for day in days.values()), sum(day[1] for day in days.values()),
+                                durations))
+    return rows
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def render_charts(chart_dir, prefix, days, period):
+    """绘制工作时长趋势、提示次数和时间段分布图并写入PNG"""
+    import chart_render
+    from startup_profile import StartupProfiler
+    chart_render.load_matplotlib(StartupProfiler())
+    buckets = aggregate(days, period)
+    keys = sorted(buckets)
+    durations = [d for key in keys for d in buckets[key][2]]
+    charts = (
+        ("hours", chart_render.build_runtime_trend, (keys, [buckets[key][0] / 3600 for key in keys]), "工作时长趋势"),
+        ("alerts", chart_render.build_alert_frequency, (keys, [buckets[key][1] for key in keys]), "提示次数"),
+        ("sessions", chart_render.build_session_histogram, (list(BUCKET_LABELS), bucket_counts(durations)), None),
+    )
+    for name, build_fn, args, title in charts:
+        fig = build_fn(*args)
+        if title:
+            fig.axes[0].set_title(title)
+        with open(os.path.join(chart_dir, f"{prefix}_{name}.png"), "wb") as f:
+            f.write(chart_render.render_png(fig))
+    return None
+
+
+def render_team_totals(chart_dir, totals):
+    """团队报表的成员工作时长图"""
+    import chart_render
+    from startup_profile import StartupProfiler
+    chart_render.load_matplotlib(StartupProfiler())
+    fig = chart_render.build_user_totals([row["user"] for row in totals], [row["total_seconds"] / 3600 for row in totals])
+    with open(os.path.join(chart_dir, "team_users.png"), "wb") as f:
+        f.write(chart_render.render_png(fig))
+
+
+def html_table(rows, columns):
+    head = "".join(f"<th>{html.escape(c)}</th>" for c in columns)
+    body = "".join("<tr>" + "".join(f"<td>{html.escape(str(row[c]))}</td>" for c in columns) + "</tr>"
+                   for row in rows)
+    return f"<table><tr>{head}</tr>{body}</table>"
+
+
+def write_html(path, period, team_rows, totals, charts, generated):
+    """写入报表首页：团队按周期汇总、成员汇总和图表"""
+    columns = ("period", "users", "total_time", "alerts", "work_sessions",
+               "mean_session_minutes", "median_session_minutes") + BUCKET_LABELS
+    parts = ["<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>番茄钟团队报表</title>",
+             "<style>body{font-family:sans-serif}table{border-collapse:collapse;margin-bottom:1em}"
+             "td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}img{margin:4px}</style></head><body>",
+             f"<h1>番茄钟团队报表</h1><p>生成时间 {html.escape(generated)}，{len(totals)} 名成员</p>"]
+    if charts:
+        parts.append("<h2>团队</h2>" + "".join(f"<img src=\"charts/team_{name}.png\">"
+                                               for name in ("hours", "alerts", "sessions", "users")))
+    parts.append(f"<h2>团队（按{PERIOD_NAMES[period]}）</h2>")
+    parts.append(html_table(team_rows, columns))
+    parts.append("<h2>成员</h2>")
+    parts.append(html_table(totals, ("user",) + columns))
+    if charts:
+        for row in totals:
+            if not row["period"]:
+                continue  # 日期范围内没有记录
+            prefix = safe_file_name(row["user"])
+            parts.append(f"<h3>{html.escape(row['user'])}</h3>" + "".join(
+                f"<img src=\"charts/{html.escape(prefix)}_{name}.png\">" for name in ("hours", "alerts", "sessions")))
+    parts.append("</body></html>")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+    os.replace(tmp_path, path)
+
+
+def summarize_users(tasks, workers=None):
+    """在进程池中并行汇总每个用户，逐个产出结果"""
+    if workers == 1 or len(tasks) <= 1:
+        yield from map(summarize_user, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+        yield from pool.map(summarize_user, tasks, chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批量生成团队统计报表（HTML、PNG和CSV），适合定时任务")
+    parser.add_argument("paths", nargs="+", help="统计文件或目录（每个用户的timer_stats.json或导出文件，可gzip压缩）")
+    parser.add_argument("--output", default="report", help="报表输出目录")
+    parser.add_argument("--period", choices=PERIODS, default="week", help="HTML报表和图表的汇总周期")
+    parser.add_argument("--from", dest="start_date", help="起始日期 YYYY-MM-DD（含）")
+    parser.add_argument("--to", dest="end_date", help="结束日期 YYYY-MM-DD（含）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认为CPU核数）")
+    parser.add_argument("--no-charts", action="store_true", help="不绘制PNG图表（不需要matplotlib）")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    chart_dir = None
+    if not args.no_charts and importlib.util.find_spec("matplotlib") is None:
+        print("未安装matplotlib，不生成图表（可以使用--no-charts跳过）", file=sys.stderr)
+    elif not args.no_charts:
+        chart_dir = os.path.join(args.output, "charts")
+        os.makedirs(chart_dir, exist_ok=True)
+
+    files = collect_files(args.paths)
+    tasks = [(user, paths, args.start_date, args.end_date, chart_dir, args.period)
+             for user, paths in sorted(group_files(files).items())]
+    results = {}
+    failures = []
+    for user, days, user_failures in summarize_users(tasks, args.workers):
+        results[user] = days
+        failures.extend(user_failures)
+    for path, error in failures:
+        print(f"无法解析 {path}: {error}", file=sys.stderr)
+
+    team_rows = []
+    for period in PERIODS:
+        rows = period_rows(results, period)
+        write_csv(os.path.join(args.output, f"summary_{period}.csv"), rows)
+        if period == args.period:
+            team_rows = [row for row in rows if row["user"] == TEAM]
+    totals = user_totals(results)
+    write_csv(os.path.join(args.output, "users.csv"), totals)
+
+    charts = chart_dir is not None and bool(results)
+    if charts:
+        render_charts(chart_dir, "team", team_days(results), args.period)
+        render_team_totals(chart_dir, totals)
+    write_html(os.path.join(args.output, "index.html"), args.period, team_rows, totals, charts,
+               time.strftime("%Y-%m-%d %H:%M:%S"))
+    print(f"已汇总 {len(results)} 名成员的 {len(files) - len(failures)} 个文件，"
+          f"耗时 {time.perf_counter() - started:.2f} 秒，报表位于 {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
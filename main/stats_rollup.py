@@ -0,0 +1,127 @@
+import json
+import os
+from datetime import datetime
+
+from stats_store import hms_to_seconds, seconds_to_hms
+
+# 每个统计桶的字段：[工作秒数, 提示次数, 工作时间段数]
+SECONDS, ALERTS, SESSIONS = 0, 1, 2
+
+
+def period_keys(date):
+    """返回某天所属的周、月、年键"""
+    day = datetime.strptime(date, "%Y-%m-%d")
+    iso_year, iso_week, _ = day.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}", date[:7], date[:4]
+
+
+class StatsRollup:
+    """增量维护的汇总索引：每天以及每周、每月、每年的秒数和计数"""
+
+    def __init__(self, rollup_file):
+        self.rollup_file = rollup_file
+        self.seq = 0  # 与统计存储的序号对应，用来判断是否过期
+        self.source = None  # 统计存储的来源标识（后端、文件路径和文件状态），与序号一起判断是否过期
+        self.days = {}
+        self.weeks = {}
+        self.months = {}
+        self.years = {}
+
+    def load(self, store):
+        """读取持久化的汇总，序号或来源标识与存储不一致时从存储重建"""
+        source = store_source(store)
+        try:
+            with open(self.rollup_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("seq") == store.seq and data.get("source") == source:
+                self.seq = data["seq"]
+                self.source = source
+                self.days = data["days"]
+                self.weeks = data["weeks"]
+                self.months = data["months"]
+                self.years = data["years"]
+                return
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+        self.rebuild(store.days_in_range(), store.seq)
+        self.source = source
+
+    def rebuild(self, days, seq):
+        """从(日期, 数据)列表完整重建汇总"""
+        self.days, self.weeks, self.months, self.years = {}, {}, {}, {}
+        for date, data in days:
+            self.add(date,
+                     seconds=hms_to_seconds(data.get("total_time", "00:00:00")),
+                     alerts=len(data.get("alert_times", [])),
+                     sessions=len(data.get("work_sessions", [])))
+        self.seq = seq
+
+    def add(self, date, seconds=0, alerts=0, sessions=0):
+        """把增量累加到当天及其所在的周、月、年"""
+        week, month, year = period_keys(date)
+        for buckets, key in ((self.days, date), (self.weeks, week), (self.months, month), (self.years, year)):
+            bucket = buckets.setdefault(key, [0, 0, 0])
+            bucket[SECONDS] += int(seconds)
+            bucket[ALERTS] += alerts
+            bucket[SESSIONS] += sessions
+
+    def save(self, seq, source=None):
+        """持久化汇总（先写临时文件再替换）；source是保存后统计存储的来源标识"""
+        self.seq = seq
+        self.source = source
+        tmp_path = self.rollup_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": self.seq, "source": self.source, "days": self.days, "weeks": self.weeks,
+                       "months": self.months, "years": self.years}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.rollup_file)
+
+    def days_in_range(self, start_date=None, end_date=None):
+        """按日期升序返回[start_date, end_date]范围内的(日期, [秒数, 提示次数, 时间段数])"""
+        return [(date, bucket) for date, bucket in sorted(self.days.items())
+                if (start_date is None or date >= start_date) and (end_date is None or date <= end_date)]
+
+    def periods(self, kind):
+        """按键升序返回周（week）、月（month）或年（year）汇总"""
+        buckets = {"week": self.weeks, "month": self.months, "year": self.years}[kind]
+        return sorted(buckets.items())
+
+
+def store_source(store):
+    """统计存储的来源标识，存储不提供时返回None"""
+    source_identity = getattr(store, "source_identity", None)
+    return source_identity() if source_identity is not None else None
+
+
+def merge_foreign_events(store, rollup):
+    """存储保存时读入了其他进程写入的事件：把这些事件计入汇总索引；重新加载了全部数据时完整重建"""
+    if getattr(store, "reloaded", False):
+        rollup.rebuild(store.days_in_range(), store.seq)
+        return
+    for event in getattr(store, "foreign_events", ()):
+        kind = event["k"]
+        rollup.add(event["d"], seconds=event["v"] if kind == "t" else 0,
+                   alerts=int(kind == "a"), sessions=int(kind == "s"))
+
+
+def record_session(store, rollup, date, engine):
+    """把计时核心当前会话的工作时间、提示和工作时间段写入存储和汇总索引"""
+    # 更新总时间（使用纯工作时间）
+    store.record_total_time(date, engine.pure_work_time)
+
+    # 更新提示时间
+    for alert_time in engine.alert_times:
+        alert_time_str = datetime.fromtimestamp(engine.wall_time(alert_time)).strftime("%H:%M:%S")
+        store.record_alert(date, alert_time_str)
+
+    # 更新工作时间段
+    for session in engine.work_sessions:
+        session_data = {
+            'start_time': datetime.fromtimestamp(engine.wall_time(session['start'])).strftime("%H:%M:%S"),
+            'end_time': datetime.fromtimestamp(engine.wall_time(session['end'])).strftime("%H:%M:%S"),
+            'duration': seconds_to_hms(session['duration'])
+        }
+        store.record_work_session(date, session_data)
+
+    # 同步更新汇总索引
+    rollup.add(date, seconds=engine.pure_work_time,
+               alerts=len(engine.alert_times), sessions=len(engine.work_sessions))
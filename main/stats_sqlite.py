@@ -0,0 +1,237 @@
+import os
+import sqlite3
+import sys
+from urllib.request import pathname2url
+from collections.abc import Mapping
+
+from stats_store import JournalStatsStore, changed_dates, seconds_to_hms, hms_to_seconds
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    date TEXT PRIMARY KEY,
+    total_seconds INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_date_time ON alerts (date, time);
+CREATE TABLE IF NOT EXISTS work_sessions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    duration_seconds INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS work_sessions_date_start ON work_sessions (date, start_time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SqliteDailyStats(Mapping):
+    """按需从数据库读取的每日统计视图，接口与daily_stats字典一致"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, date):
+        days = self.store.days_in_range(date, date)
+        if not days:
+            raise KeyError(date)
+        return days[0][1]
+
+    def __iter__(self):
+        rows = self.store.conn.execute("SELECT date FROM days ORDER BY date")
+        return (row[0] for row in rows)
+
+    def __len__(self):
+        return self.store.conn.execute("SELECT COUNT(*) FROM days").fetchone()[0]
+
+    def __contains__(self, date):
+        row = self.store.conn.execute("SELECT 1 FROM days WHERE date = ?", (date,)).fetchone()
+        return row is not None
+
+
+class SqliteStatsStore:
+    """SQLite统计存储：按日期索引，只查询需要显示的范围"""
+
+    def __init__(self, db_file, read_only=False):
+        self.db_file = db_file
+        if read_only:
+            # 只读打开（快照、独立的统计进程）：不建表，写入时由SQLite报错
+            self.conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_file))}?mode=ro", uri=True)
+        else:
+            self.conn = sqlite3.connect(db_file)
+            self.conn.executescript(SCHEMA)
+        self.daily_stats = SqliteDailyStats(self)
+        # 写入序号，供汇总索引等缓存判断是否过期
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()
+        self.seq = row[0] if row else 0
+        self.disk_seq = self.seq  # 已提交的序号
+        self.base_seq = self.seq  # 打开时的序号
+        self.base_source = self.source_identity()  # 打开时的来源标识
+        self.day_seq = {}  # 日期 -> 本进程最后一次修改该日期的序号
+
+    def load(self):
+        """返回按需读取的每日统计视图"""
+        return self.daily_stats
+
+    def days_in_range(self, start_date=None, end_date=None):
+        """按日期升序返回[start_date, end_date]范围内的(日期, 数据)列表"""
+        start_date = start_date or ""
+        end_date = end_date or "9999-12-31"
+        days = {}
+        for date, total_seconds in self.conn.execute(
+                "SELECT date, total_seconds FROM days WHERE date BETWEEN ? AND ? ORDER BY date",
+                (start_date, end_date)):
+            days[date] = {"total_time": seconds_to_hms(total_seconds), "alert_times": [], "work_sessions": []}
+        for date, alert_time in self.conn.execute(
+                "SELECT date, time FROM alerts WHERE date BETWEEN ? AND ? ORDER BY id",
+                (start_date, end_date)):
+            days[date]["alert_times"].append(alert_time)
+        for date, start_time, end_time, duration in self.conn.execute(
+                "SELECT date, start_time, end_time, duration_seconds FROM work_sessions "
+                "WHERE date BETWEEN ? AND ? ORDER BY id", (start_date, end_date)):
+            days[date]["work_sessions"].append({
+                'start_time': start_time,
+                'end_time': end_time,
+                'duration': seconds_to_hms(duration)
+            })
+        return list(days.items())
+
+    def iter_days(self, start_date=None, end_date=None, chunk_days=64):
+        """逐天生成范围内的(日期, 数据)，每次只从数据库读取chunk_days天"""
+        dates = [row[0] for row in self.conn.execute(
+            "SELECT date FROM days WHERE date BETWEEN ? AND ? ORDER BY date",
+            (start_date or "", end_date or "9999-12-31"))]
+        for i in range(0, len(dates), chunk_days):
+            chunk = dates[i:i + chunk_days]
+            yield from self.days_in_range(chunk[0], chunk[-1])
+
+    def day_totals(self, start_date=None, end_date=None):
+        """按日期升序返回范围内的(日期, [秒数, 提示次数, 时间段数])，与汇总索引的每日数据格式相同（计数走日期索引）"""
+        return [(date, [total_seconds, alerts, sessions]) for date, total_seconds, alerts, sessions in self.conn.execute(
+            "SELECT date, total_seconds, "
+            "(SELECT COUNT(*) FROM alerts WHERE alerts.date = days.date), "
+            "(SELECT COUNT(*) FROM work_sessions WHERE work_sessions.date = days.date) "
+            "FROM days WHERE date BETWEEN ? AND ? ORDER BY date",
+            (start_date or "", end_date or "9999-12-31"))]
+
+    def changed_since(self, seq):
+        """返回序号seq之后有变化的日期集合；无法判断时返回None"""
+        return changed_dates(self.day_seq, self.base_seq, self.seq, seq)
+
+    def _touch(self, date):
+        self.seq += 1
+        self.day_seq[date] = self.seq
+
+    def _ensure_day(self, date):
+        self.conn.execute("INSERT OR IGNORE INTO days (date, total_seconds) VALUES (?, 0)", (date,))
+
+    def record_total_time(self, date, seconds):
+        """记录一次总时长增量（秒）"""
+        self._touch(date)
+        self.conn.execute(
+            "INSERT INTO days (date, total_seconds) VALUES (?, ?) "
+            "ON CONFLICT(date) DO UPDATE SET total_seconds = total_seconds + excluded.total_seconds",
+            (date, int(seconds)))
+
+    def record_alert(self, date, alert_time_str):
+        """记录一次提示（HH:MM:SS）"""
+        self._touch(date)
+        self._ensure_day(date)
+        self.conn.execute("INSERT INTO alerts (date, time) VALUES (?, ?)", (date, alert_time_str))
+
+    def record_work_session(self, date, session_data):
+        """记录一个工作时间段"""
+        self._touch(date)
+        self._ensure_day(date)
+        self.conn.execute(
+            "INSERT INTO work_sessions (date, start_time, end_time, duration_seconds) VALUES (?, ?, ?, ?)",
+            (date, session_data['start_time'], session_data['end_time'], hms_to_seconds(session_data['duration'])))
+
+    def save(self):
+        """提交事务；其他进程（timer_cli、导入工具）在此期间提交过时，本进程的序号接在其后"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()
+        committed = row[0] if row else 0
+        if committed != self.disk_seq:
+            # 序号与其他进程的写入交错，按序号判断变化的缓存（紧凑历史等）需要完整重建
+            self.seq = committed + self.seq - self.disk_seq
+            self.base_seq = self.seq
+            self.day_seq = {}
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seq', ?)", (self.seq,))
+        self.conn.commit()
+        self.disk_seq = self.seq
+
+    def close(self):
+        self.conn.close()
+
+    def source_identity(self):
+        """派生缓存（汇总索引等）的来源标识：后端、数据库路径和数据库文件的(mtime, 大小)"""
+        try:
+            stat = os.stat(self.db_file)
+        except OSError:
+            return ["sqlite", os.path.abspath(self.db_file)]
+        return ["sqlite", os.path.abspath(self.db_file), stat.st_mtime_ns, stat.st_size]
+
+    def snapshot(self):
+        """只读快照：在读取的线程中另外打开连接，只能看到已提交的数据（序号也取已提交的）"""
+        return SqliteSnapshot(self.db_file, self.disk_seq, dict(self.day_seq), self.base_seq,
+                              self.source_identity(), self.base_source)
+
+
+class SqliteSnapshot:
+    """SQLite存储的只读视图，每次读取时在当前线程中打开连接（SQLite连接不能跨线程使用）"""
+
+    def __init__(self, db_file, seq, day_seq=None, base_seq=None, source=None, base_source=None):
+        self.db_file = db_file
+        self.seq = seq
+        self.day_seq = day_seq or {}
+        self.base_seq = seq if base_seq is None else base_seq
+        self.source = source
+        self.base_source = base_source
+
+    def source_identity(self):
+        return self.source
+
+    def changed_since(self, seq):
+        """返回序号seq之后有变化的日期集合；无法判断时返回None"""
+        return changed_dates(self.day_seq, self.base_seq, self.seq, seq)
+
+    def days_in_range(self, start_date=None, end_date=None):
+        return list(self.iter_days(start_date, end_date))
+
+    def iter_days(self, start_date=None, end_date=None):
+        store = SqliteStatsStore(self.db_file, read_only=True)
+        try:
+            yield from store.iter_days(start_date, end_date)
+        finally:
+            store.close()
+
+
+def migrate_json_to_sqlite(json_file, db_file):
+    """一次性把timer_stats.json（含未压缩的日志）导入SQLite数据库，返回导入的天数"""
+    daily_stats = JournalStatsStore(json_file).load()
+
+    store = SqliteStatsStore(db_file)
+    for date, data in daily_stats.items():
+        store.record_total_time(date, hms_to_seconds(data.get("total_time", "00:00:00")))
+        for alert_time in data.get("alert_times", []):
+            store.record_alert(date, alert_time)
+        for session in data.get("work_sessions", []):
+            store.record_work_session(date, session)
+    store.save()
+    store.close()
+    return len(daily_stats)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("用法: python stats_sqlite.py timer_stats.json timer_stats.db")
+        sys.exit(1)
+    count = migrate_json_to_sqlite(sys.argv[1], sys.argv[2])
+    print(f"已导入 {count} 天的统计数据")
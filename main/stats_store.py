@@ -0,0 +1,519 @@
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# 旧版快照文件中记录日志序号的保留键（不属于任何日期），只在读取时识别；
+# 现在日志序号保存在旁边的.journal.meta文件中，timer_stats.json只包含日期
+META_KEY = "_journal"
+
+# 解析后快照的二进制缓存（.cache）：文件头 + marshal编码的(日志序号, {日期: 该天的marshal数据})
+#   文件头: 魔数、数据结构版本、Python版本（marshal格式随版本变化）、快照文件的mtime(ns)、大小、sha1
+SNAPSHOT_CACHE_MAGIC = b"PSSC"
+# 缓存数据的结构版本：1 = total_time和duration已统一为时分秒格式（旧格式只在生成缓存时转换一次）
+SNAPSHOT_SCHEMA_VERSION = 1
+SNAPSHOT_CACHE_HEADER = struct.Struct("=4sHIqq20s")
+# 只读加载时快照被其他进程压缩替换的重试次数
+READ_ONLY_RETRIES = 5
+
+
+def seconds_to_hms(seconds):
+    """将秒数转换为时分秒格式字符串"""
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def hms_to_seconds(hms_str):
+    """将时分秒格式字符串转换为秒数"""
+    try:
+        parts = hms_str.split(':')
+        if len(parts) == 3:
+            hours, minutes, seconds = map(int, parts)
+            return hours * 3600 + minutes * 60 + seconds
+        return 0
+    except (ValueError, AttributeError):
+        return 0
+
+
+def normalize_legacy(daily_stats):
+    """兼容旧格式：把数字形式的total_time和duration转换为时分秒格式"""
+    for date, data in daily_stats.items():
+        if isinstance(data.get("total_time"), (int, float)):
+            data["total_time"] = seconds_to_hms(data["total_time"])
+        if "work_sessions" in data:
+            for session in data["work_sessions"]:
+                if isinstance(session.get("duration"), (int, float)):
+                    session["duration"] = seconds_to_hms(session["duration"])
+    return daily_stats
+
+
+class LazyDailyStats(MutableMapping):
+    """从快照缓存加载的每日统计：每天的数据在第一次访问时才解码"""
+
+    def __init__(self, blobs):
+        self._blobs = blobs  # 日期 -> 尚未解码的marshal数据
+        self._days = {}  # 日期 -> 已解码的数据
+
+    def __getitem__(self, date):
+        day = self._days.get(date)
+        if day is None:
+            day = self._days[date] = marshal.loads(self._blobs.pop(date))
+        return day
+
+    def __setitem__(self, date, data):
+        self._blobs.pop(date, None)
+        self._days[date] = data
+
+    def __delitem__(self, date):
+        if self._blobs.pop(date, None) is None:
+            del self._days[date]
+
+    def __contains__(self, date):
+        return date in self._days or date in self._blobs
+
+    def __iter__(self):
+        yield from list(self._days)
+        yield from list(self._blobs)
+
+    def __len__(self):
+        return len(self._days) + len(self._blobs)
+
+
+class StatsSnapshot:
+    """统计数据的只读快照，可以交给后台线程读取（接口与存储的iter_days、days_in_range相同）"""
+
+    def __init__(self, daily_stats, seq, day_seq=None, base_seq=None, source=None, base_source=None):
+        self.daily_stats = daily_stats
+        self.seq = seq
+        self.day_seq = day_seq or {}
+        self.base_seq = seq if base_seq is None else base_seq
+        self.source = source  # 取快照时存储的来源标识
+        self.base_source = base_source  # 加载完成（base_seq）时存储的来源标识
+
+    def source_identity(self):
+        return self.source
+
+    def changed_since(self, seq):
+        """返回序号seq之后有变化的日期集合；无法判断时返回None"""
+        return changed_dates(self.day_seq, self.base_seq, self.seq, seq)
+
+    def days_in_range(self, start_date=None, end_date=None):
+        """按日期升序返回[start_date, end_date]范围内的(日期, 数据)列表"""
+        return list(self.iter_days(start_date, end_date))
+
+    def iter_days(self, start_date=None, end_date=None):
+        for date in sorted(self.daily_stats):
+            if (start_date is None or date >= start_date) and (end_date is None or date <= end_date):
+                yield date, self.daily_stats[date]
+
+
+def changed_dates(day_seq, base_seq, current_seq, seq):
+    """day_seq中在序号seq之后修改过的日期；seq不在[base_seq, current_seq]内时无法判断，返回None"""
+    if seq < base_seq or seq > current_seq:
+        return None
+    return {date for date, n in day_seq.items() if n > seq}
+
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.digest()
+
+
+def read_snapshot_cache(cache_file, stats_file):
+    """读取与快照文件一致的缓存，返回(每日统计, 日志序号)，缓存无效时返回None
+
+    mtime和大小都相同时直接使用；只有mtime变化时（复制、恢复备份）再比较哈希。
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            data = f.read()
+        magic, schema, python, mtime_ns, size, digest = SNAPSHOT_CACHE_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_CACHE_MAGIC or schema != SNAPSHOT_SCHEMA_VERSION or python != sys.hexversion:
+            return None
+        stat = os.stat(stats_file)
+        if stat.st_size != size:
+            return None
+        if stat.st_mtime_ns != mtime_ns and file_sha1(stats_file) != digest:
+            return None
+        seq, blobs = marshal.loads(memoryview(data)[SNAPSHOT_CACHE_HEADER.size:])
+    except (OSError, ValueError, EOFError, TypeError, struct.error):
+        return None
+    return LazyDailyStats(blobs), seq
+
+
+def write_snapshot_cache(cache_file, stats_file, daily_stats, seq, digest=None):
+    """把已规范化的每日统计写入缓存（先写临时文件再替换），失败时只打印错误"""
+    try:
+        stat = os.stat(stats_file)
+        if digest is None:
+            digest = file_sha1(stats_file)
+        payload = marshal.dumps((seq, {date: marshal.dumps(daily_stats[date]) for date in daily_stats}))
+        tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_CACHE_HEADER.pack(SNAPSHOT_CACHE_MAGIC, SNAPSHOT_SCHEMA_VERSION, sys.hexversion,
+                                               stat.st_mtime_ns, stat.st_size, digest))
+            f.write(payload)
+        os.replace(tmp_path, cache_file)
+    except (OSError, ValueError) as e:
+        print(f"写入统计快照缓存出错: {e}")
+
+
+@contextmanager
+def file_lock(path):
+    """进程间的独占锁：同一统计文件的所有进程在读取、追加日志和压缩时持有"""
+    try:
+        f = open(path, "a+b")
+    except OSError:
+        # 只读目录中的文件（例如其他机器导出的统计）只会被读取，不需要加锁
+        f = None
+    if f is None:
+        yield
+        return
+    with f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def file_identity(path):
+    """文件的(mtime, 大小, inode)，用来发现快照被其他进程替换；文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def read_journal_meta(meta_file):
+    """读取日志元数据：{"current": {"seq", "sha1"}, "previous": ...}，不存在或损坏时返回{}"""
+    try:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def snapshot_seq(meta, digest):
+    """返回与快照内容（sha1）对应的日志序号；两条记录都不匹配时返回None"""
+    for key in ("current", "previous"):
+        entry = meta.get(key)
+        if isinstance(entry, dict) and entry.get("sha1") == digest.hex():
+            return entry.get("seq", 0)
+    return None
+
+
+def write_journal_meta(meta_file, seq, digest, previous):
+    """写入新快照的日志序号（先写临时文件再替换），保留上一个快照的记录：
+    替换快照之前崩溃时，旧快照仍能找到自己的序号"""
+    meta = {"current": {"seq": seq, "sha1": digest.hex()}, "previous": previous}
+    tmp_path = f"{meta_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, meta_file)
+
+
+def ensure_day(daily_stats, date):
+    """确保某一天的记录存在"""
+    if date not in daily_stats:
+        daily_stats[date] = {"total_time": "00:00:00", "alert_times": []}
+    return daily_stats[date]
+
+
+def apply_event(daily_stats, event):
+    """把一条日志事件应用到每日统计数据上"""
+    day = ensure_day(daily_stats, event["d"])
+    kind = event["k"]
+    if kind == "t":
+        total = hms_to_seconds(day.get("total_time", "00:00:00")) + event["v"]
+        day["total_time"] = seconds_to_hms(total)
+        day.setdefault("work_sessions", [])
+    elif kind == "a":
+        day.setdefault("alert_times", []).append(event["v"])
+    elif kind == "s":
+        start_time, end_time, duration = event["v"]
+        day.setdefault("work_sessions", []).append({
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': duration
+        })
+
+
+class JournalStatsStore:
+    """只追加的日志存储：每个事件一行，定期压缩回timer_stats.json快照
+
+    同一统计文件可以有多个写入进程（计时程序、timer_cli、导入工具）：读取、追加和压缩都持有
+    锁文件上的独占锁，追加前先读入其他进程追加的事件，再接着日志末尾的序号为本进程的事件编号。
+    只读打开（read_only=True）时不加锁、不创建锁文件、不写缓存，只能加载不能保存。
+    """
+
+    def __init__(self, stats_file, compact_threshold=1000, snapshot_cache=True, read_only=False):
+        self.stats_file = stats_file
+        self.journal_file = os.path.splitext(stats_file)[0] + ".journal"
+        self.meta_file = self.journal_file + ".meta"  # 快照对应的日志序号
+        self.lock_file = os.path.splitext(stats_file)[0] + ".lock"
+        # 解析后快照的二进制缓存，只读取其他机器的文件时不需要
+        self.cache_file = os.path.splitext(stats_file)[0] + ".cache" if snapshot_cache else None
+        self.compact_threshold = compact_threshold
+        self.read_only = read_only
+        self.daily_stats = {}
+        self.seq = 0  # 最后一条日志的序号（包括尚未写入的事件）
+        self.journal_records = 0  # 日志文件中尚未压缩的记录数
+        self.pending = []  # 尚未写入磁盘的事件
+        self.disk_seq = 0  # 磁盘上（快照和日志中）最后一条事件的序号
+        self.journal_offset = 0  # 已读入的日志字节数（只含完整的行）
+        self.snapshot_identity = None  # 读入的快照文件，被其他进程压缩替换后需要重新加载
+        self.foreign_events = []  # 最近一次保存时读入的其他进程的事件
+        self.reloaded = False  # 最近一次保存时因其他进程压缩而重新加载了全部数据
+        self.base_seq = 0  # 加载完成时的序号
+        self.base_source = None  # 加载完成时的来源标识，判断加载之前生成的派生缓存是否来自同一份数据
+        self.day_seq = {}  # 日期 -> 本进程最后一次修改该日期的序号
+
+    def load(self):
+        """读取快照（优先使用二进制缓存）并重放日志，返回重建后的每日统计数据"""
+        if self.read_only:
+            self._load_unlocked()
+            return self.daily_stats
+        with file_lock(self.lock_file):
+            self._load()
+        return self.daily_stats
+
+    def _load_unlocked(self):
+        """不加锁地加载：压缩先替换快照再清空日志，读完日志后快照没有变化就说明两者一致，否则重新读取"""
+        for _ in range(READ_ONLY_RETRIES):
+            self._load()
+            if file_identity(self.stats_file) == self.snapshot_identity:
+                return
+
+    def _load(self):
+        self.snapshot_identity = file_identity(self.stats_file)
+        cached = read_snapshot_cache(self.cache_file, self.stats_file) if self.cache_file else None
+        if cached is not None:
+            self.daily_stats, self.seq = cached
+        else:
+            self.load_snapshot()
+
+        self.journal_records = 0
+        self.journal_offset = 0
+        self._read_journal()
+        self.disk_seq = self.seq
+        self.base_seq = self.seq
+        self.base_source = self.source_identity()
+        self.day_seq = {}
+
+    def _read_journal(self):
+        """从journal_offset读取日志中完整的行，应用序号更大的事件，返回这些事件"""
+        events = []
+        try:
+            with open(self.journal_file, "rb") as f:
+                f.seek(self.journal_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # 崩溃时可能留下半行，下次追加前补上换行
+                        break
+                    self.journal_offset += len(line)
+                    try:
+                        event = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        continue
+                    self.journal_records += 1
+                    # 快照已包含的事件不再重复应用
+                    if event["n"] <= self.seq:
+                        continue
+                    apply_event(self.daily_stats, event)
+                    self.seq = event["n"]
+                    events.append(event)
+        except FileNotFoundError:
+            pass
+        return events
+
+    def load_snapshot(self):
+        """解析JSON快照并转换旧格式，然后写入二进制缓存供下次启动使用"""
+        try:
+            with open(self.stats_file, "rb") as f:
+                raw = f.read()
+            self.daily_stats = json.loads(raw)
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+            self.daily_stats = {}
+            self.seq = 0
+            return
+        digest = hashlib.sha1(raw).digest()
+        legacy_meta = self.daily_stats.pop(META_KEY, None)
+        seq = snapshot_seq(read_journal_meta(self.meta_file), digest)
+        if seq is None:
+            # 旧版快照把序号写在文件内；更早的快照没有序号
+            seq = legacy_meta.get("seq", 0) if isinstance(legacy_meta, dict) else 0
+        self.seq = seq
+        normalize_legacy(self.daily_stats)
+        if self.cache_file and not self.read_only:
+            write_snapshot_cache(self.cache_file, self.stats_file, self.daily_stats, self.seq, digest)
+
+    def days_in_range(self, start_date=None, end_date=None):
+        """按日期升序返回[start_date, end_date]范围内的(日期, 数据)列表"""
+        return list(self.iter_days(start_date, end_date))
+
+    def iter_days(self, start_date=None, end_date=None):
+        """逐天生成[start_date, end_date]范围内的(日期, 数据)，不复制每天的数据（范围外的日期不解码）"""
+        for date in sorted(list(self.daily_stats)):
+            if (start_date is None or date >= start_date) and (end_date is None or date <= end_date):
+                yield date, self.daily_stats[date]
+
+    def snapshot(self):
+        """在主线程中取只读快照：尚未解码的日期直接共享marshal数据，已解码的日期重新编码，
+        之后主线程继续记录事件也不会影响后台线程的读取"""
+        daily_stats = self.daily_stats
+        if isinstance(daily_stats, LazyDailyStats):
+            blobs = dict(daily_stats._blobs)
+            decoded = daily_stats._days
+        else:
+            blobs = {}
+            decoded = daily_stats
+        for date, day in decoded.items():
+            blobs[date] = marshal.dumps(day)
+        return StatsSnapshot(LazyDailyStats(blobs), self.seq, dict(self.day_seq), self.base_seq,
+                             self.source_identity(), self.base_source)
+
+    def changed_since(self, seq):
+        """返回序号seq之后有变化的日期集合；无法判断时返回None"""
+        return changed_dates(self.day_seq, self.base_seq, self.seq, seq)
+
+    def source_identity(self):
+        """派生缓存（汇总索引等）的来源标识：后端、快照路径、快照的(mtime, 大小, inode)和已读入的日志长度
+
+        序号相同但换了统计文件、快照被替换或恢复时标识不同，缓存需要重建。
+        """
+        return ["json", os.path.abspath(self.stats_file), list(self.snapshot_identity or ()), self.journal_offset]
+
+    def _record(self, date, kind, value):
+        self.seq += 1
+        self.day_seq[date] = self.seq
+        event = {"n": self.seq, "d": date, "k": kind, "v": value}
+        apply_event(self.daily_stats, event)
+        self.pending.append(event)
+
+    def record_total_time(self, date, seconds):
+        """记录一次总时长增量（秒）"""
+        self._record(date, "t", int(seconds))
+
+    def record_alert(self, date, alert_time_str):
+        """记录一次提示（HH:MM:SS）"""
+        self._record(date, "a", alert_time_str)
+
+    def record_work_session(self, date, session_data):
+        """记录一个工作时间段"""
+        self._record(date, "s", [session_data['start_time'], session_data['end_time'], session_data['duration']])
+
+    def save(self):
+        """把待写事件追加到日志，超过阈值时压缩"""
+        self._check_writable()
+        with file_lock(self.lock_file):
+            self._append_pending()
+            if self.journal_records >= self.compact_threshold:
+                self._compact()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"统计数据以只读方式打开，不能写入: {self.stats_file}")
+
+    def _sync_journal(self):
+        """（持有锁时）读入其他进程在上次读写之后追加的事件；快照被其他进程压缩替换时重新加载"""
+        self.foreign_events = []
+        self.reloaded = False
+        try:
+            journal_size = os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            journal_size = 0
+        pending = self.pending
+        if file_identity(self.stats_file) != self.snapshot_identity or journal_size < self.journal_offset:
+            self._load()
+            self.reloaded = True
+        else:
+            self.seq = self.disk_seq
+            self.foreign_events = self._read_journal()
+            self.disk_seq = self.seq
+        # 本进程尚未写入的事件接在日志末尾之后重新编号
+        for event in pending:
+            if self.reloaded:
+                apply_event(self.daily_stats, event)
+            self.seq += 1
+            event["n"] = self.seq
+        self.pending = pending
+        if self.reloaded or self.foreign_events:
+            # 序号与其他进程的事件交错，按序号判断变化的缓存（紧凑历史等）需要完整重建
+            self.base_seq = self.seq
+            self.base_source = self.source_identity()
+            self.day_seq = {}
+
+    def _append_pending(self):
+        """（持有锁时）与日志同步后追加待写事件"""
+        self._sync_journal()
+        if self.pending:
+            data = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n"
+                           for e in self.pending).encode("utf-8")
+            with open(self.journal_file, "a+b") as f:
+                end = f.seek(0, os.SEEK_END)
+                if end > self.journal_offset:
+                    # 末尾是其他进程崩溃时留下的半行
+                    data = b"\n" + data
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                self.journal_offset = f.tell()
+            self.journal_records += len(self.pending)
+            self.pending = []
+        self.disk_seq = self.seq
+
+    def compact(self):
+        """把当前数据（包括待写事件）写成快照并清空日志"""
+        self._check_writable()
+        with file_lock(self.lock_file):
+            self._append_pending()
+            self._compact()
+
+    def _compact(self):
+        payload = json.dumps(dict(self.daily_stats), ensure_ascii=False, indent=2).encode("utf-8")
+        digest = hashlib.sha1(payload).digest()
+        tmp_path = self.stats_file + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # 先记录新快照的序号（按内容哈希对应），再原子替换快照：任何时刻崩溃，
+        # 磁盘上的快照都能找到自己的序号，清空日志前崩溃也不会重复计算
+        write_journal_meta(self.meta_file, self.seq, digest, read_journal_meta(self.meta_file).get("current"))
+        os.replace(tmp_path, self.stats_file)
+        with open(self.journal_file, "w", encoding="utf-8"):
+            pass
+        self.journal_records = 0
+        self.journal_offset = 0
+        self.snapshot_identity = file_identity(self.stats_file)
+        # 新快照的缓存，下次启动不必重新解析
+        if self.cache_file:
+            write_snapshot_cache(self.cache_file, self.stats_file, self.daily_stats, self.seq, digest)
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+# 管道中最多缓存的消息数，统计进程卡住时丢弃新消息而不是阻塞计时进程
+MAX_PENDING = 1000
+# 统计进程轮询消息的间隔（毫秒）
+POLL_MS = 100
+# 等待计时进程发送会话快照的最长时间（秒）
+SNAPSHOT_TIMEOUT = 10
+
+
+class StatsViewerProcess:
+    """在独立进程中打开统计窗口（计时进程一侧）
+
+    统计进程只读地打开统计存储，自己加载matplotlib并绘图；计时进程只通过管道
+    推送NDJSON消息：会话快照（session，启动时和会话重置后），之后是增量（tick、alert）、
+    统计已保存（stats_saved）、诊断文本（diagnostics）和置前（raise）。
+    关闭管道后统计进程随之退出。
+    """
+
+    def __init__(self, stats_file, db_file=None, view_days=None):
+        self.stats_file = stats_file
+        self.db_file = db_file
+        self.view_days = view_days
+        self.process = None
+        self.messages = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, session):
+        """启动统计进程并发送会话快照；已在运行时把窗口置前"""
+        if self.running:
+            self.send("raise")
+            return
+        command = [sys.executable, os.path.abspath(__file__), "--stats-file", self.stats_file]
+        if self.view_days is not None:
+            command += ["--view-days", str(self.view_days)]
+        if self.db_file:
+            command += ["--db", self.db_file]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.messages = queue.Queue(MAX_PENDING)
+        threading.Thread(target=self._write, args=(self.process, self.messages), daemon=True).start()
+        self.send("session", **session)
+
+    def send(self, kind, **data):
+        """排队一条消息（不阻塞）；统计进程未运行或队列已满时丢弃"""
+        if not self.running:
+            return
+        try:
+            self.messages.put_nowait({"type": kind, **data})
+        except queue.Full:
+            pass
+
+    def _write(self, process, messages):
+        """写线程：把消息逐行写入统计进程的标准输入"""
+        try:
+            while True:
+                message = messages.get()
+                if message is None:
+                    break
+                process.stdin.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+                process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def close(self):
+        """关闭管道，统计进程读到结尾后自行退出（不阻塞）；队列已满说明统计进程卡住，直接结束它"""
+        if self.running:
+            try:
+                self.messages.put_nowait(None)
+            except queue.Full:
+                self.process.terminate()
+        self.process = None
+
+
+def read_messages(stream, messages):
+    """读线程：把管道中的消息放入队列，管道关闭时放入None"""
+    for line in stream:
+        try:
+            messages.put(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    messages.put(None)
+
+
+def open_store(args):
+    """只读打开统计存储：不加锁，不写快照缓存，不能保存"""
+    if args.db:
+        from stats_sqlite import SqliteStatsStore
+        return SqliteStatsStore(args.db, read_only=True)
+    from stats_store import JournalStatsStore
+    store = JournalStatsStore(args.stats_file, read_only=True)
+    store.load()
+    return store
+
+
+def main(argv=None):
+    default_stats = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_stats.json")
+    parser = argparse.ArgumentParser(description="独立进程中的统计窗口（由计时程序启动，从标准输入接收会话数据）")
+    parser.add_argument("--stats-file", default=default_stats, help="统计数据文件（timer_stats.json）")
+    parser.add_argument("--db", help="改为读取SQLite数据库")
+    parser.add_argument("--view-days", type=int, help="历史数据和图表只查询最近这么多天（默认显示全部）")
+    args = parser.parse_args(argv)
+
+    import tkinter as tk
+    from chart_render import ChartCache, ChartRenderer
+    from focus_analytics import FocusAnalytics
+    from startup_profile import StartupProfiler
+    from stats_rollup import StatsRollup
+    from stats_window import StatsWindow
+
+    messages = queue.Queue()
+    threading.Thread(target=read_messages, args=(sys.stdin.buffer, messages), daemon=True).start()
+    try:
+        first = messages.get(timeout=SNAPSHOT_TIMEOUT)
+    except queue.Empty:
+        first = None
+    session = {"start_time": None, "run_time": 0, "alert_times": [], "info": []}
+    if first is not None and first.get("type") == "session":
+        session.update({key: value for key, value in first.items() if key != "type"})
+
+    base = os.path.splitext(args.stats_file)[0]
+    store = open_store(args)
+    rollup = StatsRollup(base + ".rollup.json")
+    rollup.load(store)  # 与存储不一致时只在内存中重建，不写回
+
+    root = tk.Tk()
+    root.withdraw()
+    # 图表缓存、紧凑历史和专注分析缓存都只读取，由计时进程负责写入
+    cache = ChartCache(os.path.join(os.path.dirname(base), "chart_cache"), read_only=True)
+    renderer = ChartRenderer(root, StartupProfiler(), cache=cache)
+    stats = StatsWindow(root, store, rollup, base + ".events.bin", renderer,
+                        FocusAnalytics(cache_file=base + ".focus", read_only=True), args.view_days, read_only=True)
+
+    diagnostics = {"text": "", "widget": None}
+
+    def build_diagnostics(frame):
+        text = tk.Text(frame, font=("Consolas", 9), wrap=tk.NONE, height=20)
+        text.pack(fill=tk.BOTH, expand=True)
+        diagnostics["widget"] = text
+        show_diagnostics()
+
+    def show_diagnostics():
+        text = diagnostics["widget"]
+        if text is None or not text.winfo_exists():
+            return
+        text.config(state=tk.NORMAL)
+        text.delete("1.0", tk.END)
+        text.insert(tk.END, diagnostics["text"])
+        text.config(state=tk.DISABLED)
+
+    def reload_stats():
+        # 计时进程保存了新的统计数据：重新只读打开存储和汇总
+        store = open_store(args)
+        rollup.load(store)
+        stats.stats_store = store
+        stats.reload_data()
+
+    window = stats.open(session, build_diagnostics)
+    window.protocol("WM_DELETE_WINDOW", root.destroy)
+
+    def poll():
+        while True:
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                # 计时程序已退出或关闭了统计窗口
+                root.destroy()
+                return
+            kind = message.pop("type", None)
+            if kind == "session":
+                stats.update_session(session=message)
+            elif kind == "tick":
+                stats.update_session(run_time=message["run_time"])
+            elif kind == "alert":
+                stats.update_session(alert_time=message["time"])
+            elif kind == "stats_saved":
+                reload_stats()
+            elif kind == "diagnostics":
+                diagnostics["text"] = message["text"]
+                show_diagnostics()
+            elif kind == "raise":
+                window.deiconify()
+                window.lift()
+                window.focus_force()
+        root.after(POLL_MS, poll)
+
+    root.after(POLL_MS, poll)
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
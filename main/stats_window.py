@@ -0,0 +1,423 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime, timedelta
+
+from stats_store import seconds_to_hms
+from stats_rollup import SECONDS, ALERTS, SESSIONS
+from compact_events import load_compact_history
+from virtual_table import SortIndex, lazy_treeview, lazy_listbox
+from chart_render import (png_to_photo, build_alert_distribution, build_runtime_trend, build_alert_frequency,
+                          build_work_session_chart, build_focus_heatmap, build_interval_distribution,
+                          build_rolling_averages)
+
+
+def format_hms(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def read_work_sessions(events_file, snapshot, start_date, read_only=False):
+    """（后台线程）从紧凑二进制历史中读取显示范围内的工作时间段（秒数，无需解析字符串）"""
+    all_sessions = []
+    history = load_compact_history(events_file, snapshot, read_only)
+    try:
+        for date, _, _, sessions in history.iter_range(start_date):
+            for start_seconds, _, duration_seconds in sessions:
+                all_sessions.append((date, start_seconds, duration_seconds))
+    finally:
+        history.close()
+    return all_sessions
+
+
+def read_focus_report(events_file, snapshot, focus_analytics, start_date, analytics_seconds=None, read_only=False):
+    """（后台线程）与紧凑历史同步显示范围内的日期，保存按天小结并返回专注分析结果"""
+    started = time.perf_counter()
+    history = load_compact_history(events_file, snapshot, read_only)
+    try:
+        focus_analytics.refresh(history, start_date)
+    finally:
+        history.close()
+    report = focus_analytics.report(start_date)
+    if analytics_seconds is not None:
+        analytics_seconds.observe(time.perf_counter() - started)
+    focus_analytics.save()
+    return report
+
+
+class StatsWindow:
+    """统计窗口：选项卡在首次选中时才创建，图表在后台线程中绘制
+
+    只读访问统计存储和汇总索引；当前会话选项卡显示会话快照（字典，时间均为墙上时间戳），
+    不直接访问计时核心，所以既可以在计时进程中打开，也可以由stats_viewer在独立进程中打开。
+    read_only为True时（独立进程）紧凑历史过期也不写回文件。
+    会话快照的字段：start_time、run_time、alert_times和info（附加说明行）。
+    """
+
+    def __init__(self, parent, stats_store, stats_rollup, events_file, chart_renderer, focus_analytics,
+                 view_days=None, analytics_seconds=None, read_only=False):
+        self.parent = parent
+        self.stats_store = stats_store
+        self.stats_rollup = stats_rollup
+        self.events_file = events_file
+        self.chart_renderer = chart_renderer
+        self.focus_analytics = focus_analytics
+        self.view_days = view_days  # 历史数据和图表只查询最近这么多天，None为全部
+        self.analytics_seconds = analytics_seconds
+        self.read_only = read_only
+        self.window = None
+        self.session = None
+        self.session_widgets = None
+        self.data_frames = ()
+        self.builders = {}
+
+    def view_start(self):
+        """返回显示范围的起始日期，不限制时返回None"""
+        if self.view_days is None:
+            return None
+        return (datetime.now() - timedelta(days=self.view_days)).strftime("%Y-%m-%d")
+
+    def day_buckets(self):
+        """显示范围内每天的[秒数, 提示次数, 时间段数]：SQLite存储按日期范围查询，否则读取汇总索引"""
+        if hasattr(self.stats_store, "day_totals"):
+            return self.stats_store.day_totals(self.view_start())
+        return self.stats_rollup.days_in_range(self.view_start())
+
+    def open(self, session, build_diagnostics=None):
+        """打开窗口；build_diagnostics(frame)填充诊断选项卡，为None时不显示该选项卡"""
+        self.session = session
+        self.session_widgets = None
+        stats_window = self.window = tk.Toplevel(self.parent)
+        stats_window.title("统计数据")
+        stats_window.geometry("700x500")
+        stats_window.resizable(True, True)
+
+        # 创建选项卡
+        notebook = self.notebook = ttk.Notebook(stats_window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # 当前会话选项卡
+        current_frame = ttk.Frame(notebook, padding=10)
+        notebook.add(current_frame, text="当前会话")
+
+        # 历史数据选项卡
+        history_frame = ttk.Frame(notebook, padding=10)
+        notebook.add(history_frame, text="历史数据")
+
+        # 图表分析选项卡
+        chart_frame = ttk.Frame(notebook, padding=10)
+        notebook.add(chart_frame, text="图表分析")
+
+        # 专注分析选项卡
+        focus_frame = ttk.Frame(notebook, padding=10)
+        notebook.add(focus_frame, text="专注分析")
+
+        # 每个选项卡只在第一次被选中时填充
+        self.builders = {
+            str(current_frame): lambda: self.build_current_tab(current_frame),
+            str(history_frame): lambda: self.build_history_tab(history_frame),
+            str(chart_frame): lambda: self.build_chart_tab(chart_frame),
+            str(focus_frame): lambda: self.build_focus_tab(focus_frame),
+        }
+        self.data_frames = ((history_frame, self.build_history_tab), (chart_frame, self.build_chart_tab),
+                            (focus_frame, self.build_focus_tab))
+
+        # 诊断选项卡
+        if build_diagnostics is not None:
+            diagnostics_frame = ttk.Frame(notebook, padding=10)
+            notebook.add(diagnostics_frame, text="诊断")
+            self.builders[str(diagnostics_frame)] = lambda: build_diagnostics(diagnostics_frame)
+
+        notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        # 立即填充默认选中的第一个选项卡
+        self.on_tab_changed(None)
+        return stats_window
+
+    def on_tab_changed(self, event):
+        builder = self.builders.pop(self.notebook.select(), None)
+        if builder:
+            builder()
+
+    def reload_data(self):
+        """统计数据已更新：清空历史、图表和专注分析选项卡，再次选中时重新填充"""
+        if self.window is None or not self.window.winfo_exists():
+            return
+        for frame, build in self.data_frames:
+            for child in frame.winfo_children():
+                child.destroy()
+            self.builders[str(frame)] = lambda frame=frame, build=build: build(frame)
+        self.on_tab_changed(None)
+
+    def show_chart(self, parent_frame, build_fn, *args):
+        """先显示占位文字，图表在后台绘制完成后再替换为图片"""
+        chart_label = ttk.Label(parent_frame, text="正在生成图表…", font=("SimHei", 10), anchor="center")
+        chart_label.pack(fill=tk.BOTH, expand=True)
+
+        def on_done(png):
+            # 窗口可能已经关闭
+            if not chart_label.winfo_exists():
+                return
+            photo = png_to_photo(png, chart_label)
+            chart_label.config(image=photo, text="")
+            chart_label.image = photo  # 保持引用，避免图片被回收
+
+        def on_error(error):
+            # 用错误信息替换占位文字
+            if chart_label.winfo_exists():
+                chart_label.config(text=f"生成图表出错: {error}", foreground="red")
+
+        self.chart_renderer.submit(build_fn, args, on_done, on_error)
+
+    def build_current_tab(self, current_frame):
+        """填充当前会话选项卡"""
+        session = self.session
+        alert_times = session["alert_times"]
+
+        # 创建当前会话信息框
+        info_frame = ttk.LabelFrame(current_frame, text="会话信息", padding=10)
+        info_frame.pack(fill=tk.X, pady=5)
+
+        start_time_label = ttk.Label(info_frame, font=("SimHei", 10))
+        start_time_label.pack(anchor="w", pady=2)
+        run_time_label = ttk.Label(info_frame, font=("SimHei", 10))
+        run_time_label.pack(anchor="w", pady=2)
+        alert_count_label = ttk.Label(info_frame, font=("SimHei", 10))
+        alert_count_label.pack(anchor="w", pady=2)
+        for line in session.get("info", ()):
+            ttk.Label(info_frame, text=line, font=("SimHei", 10)).pack(anchor="w", pady=2)
+
+        # 提示时间列表和分布图框架
+        alert_frame = ttk.Frame(current_frame)
+        alert_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        # 提示时间列表
+        alert_list_frame = ttk.LabelFrame(alert_frame, text="提示时间列表", padding=10)
+        alert_list_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+
+        # 创建滚动条
+        scrollbar = ttk.Scrollbar(alert_list_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # 创建列表框
+        alert_listbox = tk.Listbox(alert_list_frame, font=("SimHei", 9))
+        alert_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # 填充会话信息和提示时间（虚拟列表：只创建一个窗口的行，滚动条按总行数显示）
+        alert_rows = lazy_listbox(alert_listbox, scrollbar)
+        self.session_widgets = (start_time_label, run_time_label, alert_count_label, alert_rows)
+        self.show_session()
+
+        # 当前会话提示时间分布图
+        if len(alert_times) > 0:
+            alert_chart_frame = ttk.LabelFrame(alert_frame, text="提示时间分布", padding=10)
+            alert_chart_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
+
+            # 提取小时和分钟
+            times = [datetime.fromtimestamp(t) for t in alert_times]
+            alert_hours = [t.hour + t.minute/60 for t in times]
+            self.show_chart(alert_chart_frame, build_alert_distribution, alert_hours)
+
+    def alert_row(self, i):
+        alert_time_str = datetime.fromtimestamp(self.session["alert_times"][i]).strftime("%Y-%m-%d %H:%M:%S")
+        return f"{i+1}. {alert_time_str}"
+
+    def show_session(self, alerts_changed=True):
+        """把会话快照显示到当前会话选项卡（选项卡尚未创建时跳过）"""
+        if self.session_widgets is None or not self.session_widgets[0].winfo_exists():
+            return
+        start_time_label, run_time_label, alert_count_label, alert_rows = self.session_widgets
+        start_time = self.session["start_time"]
+        start_time_label.config(text=f"会话开始时间: {datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S') if start_time else '未开始'}")
+        run_time_label.config(text=f"运行时长: {format_hms(self.session['run_time'])}")
+        if alerts_changed:
+            alert_count_label.config(text=f"提示次数: {len(self.session['alert_times'])}")
+            alert_rows.reset(len(self.session["alert_times"]), self.alert_row)
+
+    def update_session(self, run_time=None, alert_time=None, session=None):
+        """应用当前会话的增量：新的运行时长、一次新的提示或重置后的完整快照"""
+        if session is not None:
+            self.session.update(session)
+        if run_time is not None:
+            self.session["run_time"] = run_time
+        if alert_time is not None:
+            self.session["alert_times"].append(alert_time)
+        self.show_session(alerts_changed=session is not None or alert_time is not None)
+
+    def build_history_tab(self, history_frame):
+        """填充历史数据选项卡"""
+        # 创建历史数据表格
+        history_table_frame = ttk.LabelFrame(history_frame, text="每日使用统计", padding=10)
+        history_table_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        # 创建表格头部
+        columns = ("日期", "总运行时长", "提示次数", "工作时间段数")
+        tree = ttk.Treeview(history_table_frame, columns=columns, show="headings")
+
+        # 设置列宽和对齐方式
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, anchor="center", width=100)
+
+        # 添加滚动条
+        tree_scroll = ttk.Scrollbar(history_table_frame, orient="vertical")
+        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        # 只读取显示范围内的每日数据
+        days = self.day_buckets()
+        sort_index = SortIndex(days, {
+            "日期": lambda day: day[0],
+            "总运行时长": lambda day: day[1][SECONDS],
+            "提示次数": lambda day: day[1][ALERTS],
+            "工作时间段数": lambda day: day[1][SESSIONS],
+        })
+        rows = lazy_treeview(tree, tree_scroll)  # 虚拟列表，同时接管滚动条
+        sort_state = {"column": "日期", "descending": True}
+
+        def show_sorted():
+            day_at = sort_index.order(sort_state["column"], sort_state["descending"])
+
+            def row_at(i):
+                date, bucket = day_at(i)
+                return (date, seconds_to_hms(bucket[SECONDS]), bucket[ALERTS], bucket[SESSIONS])
+
+            rows.reset(len(days), row_at)
+
+        def sort_by(column):
+            # 再次点击同一列时切换升降序
+            if sort_state["column"] == column:
+                sort_state["descending"] = not sort_state["descending"]
+            else:
+                sort_state["column"] = column
+                sort_state["descending"] = False
+            show_sorted()
+
+        for col in columns:
+            tree.heading(col, command=lambda c=col: sort_by(c))
+
+        # 填充历史数据（默认按日期倒序，只创建一个窗口的行）
+        show_sorted()
+
+    def build_chart_tab(self, chart_frame):
+        """填充图表分析选项卡"""
+        rollup_days = self.day_buckets()
+        if not rollup_days:
+            return
+
+        # 创建上下分栏
+        top_chart_frame = ttk.Frame(chart_frame)
+        top_chart_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=(0, 5))
+
+        bottom_chart_frame = ttk.Frame(chart_frame)
+        bottom_chart_frame.pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True, pady=(5, 0))
+
+        # 在上部分创建左右分栏
+        left_chart_frame = ttk.Frame(top_chart_frame)
+        left_chart_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+
+        right_chart_frame = ttk.Frame(top_chart_frame)
+        right_chart_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
+
+        # 每日运行时长趋势图
+        runtime_frame = ttk.LabelFrame(left_chart_frame, text="每日运行时长趋势", padding=10)
+        runtime_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        # 准备数据
+        dates = []
+        runtimes = []
+        alert_counts = []
+
+        # 按日期排序（汇总索引中已是整数秒和计数）
+        for date, bucket in rollup_days:
+            dates.append(date)
+            # 转换为小时
+            runtimes.append(bucket[SECONDS] / 3600)
+            alert_counts.append(bucket[ALERTS])
+
+        self.show_chart(runtime_frame, build_runtime_trend, dates, runtimes)
+
+        # 提示频率分析图
+        alert_freq_frame = ttk.LabelFrame(right_chart_frame, text="提示频率分析", padding=10)
+        alert_freq_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.show_chart(alert_freq_frame, build_alert_frequency, dates, alert_counts)
+
+        # 工作时间段分布图
+        work_session_frame = ttk.LabelFrame(bottom_chart_frame, text="工作时间段分布", padding=10)
+        work_session_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        # 创建工作时间段可视化
+        self.create_work_session_chart(work_session_frame)
+
+    def build_focus_tab(self, focus_frame):
+        """填充专注分析选项卡：连续天数、中位数、热力图、间隔分布和滚动平均
+
+        分析在后台线程中与紧凑历史同步并汇总，期间显示占位文字。
+        """
+        placeholder = ttk.Label(focus_frame, text="正在分析历史数据…", font=("SimHei", 10), anchor="center")
+        placeholder.pack(fill=tk.BOTH, expand=True)
+
+        def on_done(report):
+            if not placeholder.winfo_exists():
+                return
+            placeholder.destroy()
+            self.show_focus_report(focus_frame, report)
+
+        def on_error(error):
+            if placeholder.winfo_exists():
+                placeholder.config(text=f"分析历史数据出错: {error}", foreground="red")
+
+        # 快照在主线程中取，之后的记录不影响后台读取
+        self.chart_renderer.run(read_focus_report, (self.events_file, self.stats_store.snapshot(), self.focus_analytics,
+                                                    self.view_start(), self.analytics_seconds, self.read_only),
+                                on_done, on_error)
+
+    def show_focus_report(self, focus_frame, report):
+        if report is None:
+            ttk.Label(focus_frame, text="暂无统计数据", font=("SimHei", 12)).pack(expand=True)
+            return
+
+        # 摘要
+        summary_frame = ttk.LabelFrame(focus_frame, text="摘要", padding=10)
+        summary_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(summary_frame, text=f"连续专注: 当前 {report['current_streak']} 天，最长 {report['longest_streak']} 天（每天至少 {self.focus_analytics.streak_seconds // 60} 分钟）", font=("SimHei", 10)).pack(anchor="w", pady=2)
+        ttk.Label(summary_frame, text=f"工作时间段: {report['session_count']} 个，中位时长 {seconds_to_hms(report['session_median_seconds'])}", font=("SimHei", 10)).pack(anchor="w", pady=2)
+        ttk.Label(summary_frame, text=f"提示间隔中位数: 约 {report['interval_median_minutes']} 分钟", font=("SimHei", 10)).pack(anchor="w", pady=2)
+
+        # 上部左右两张图，下部滚动平均
+        top_chart_frame = ttk.Frame(focus_frame)
+        top_chart_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=(0, 5))
+        heatmap_frame = ttk.LabelFrame(top_chart_frame, text="提示时间热力图", padding=10)
+        heatmap_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        self.show_chart(heatmap_frame, build_focus_heatmap, report["heatmap"])
+        interval_frame = ttk.LabelFrame(top_chart_frame, text="提示间隔分布", padding=10)
+        interval_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
+        self.show_chart(interval_frame, build_interval_distribution, report["interval_bins"])
+
+        rolling_frame = ttk.LabelFrame(focus_frame, text="工作时长滚动平均", padding=10)
+        rolling_frame.pack(side=tk.BOTTOM, fill=tk.BOTH, expand=True, pady=(5, 0))
+        self.show_chart(rolling_frame, build_rolling_averages, report["dates"], report["daily_hours"], report["rolling"])
+
+    def create_work_session_chart(self, parent_frame):
+        """创建工作时间段分布图表：紧凑历史在后台线程中同步和读取，期间显示占位文字"""
+        placeholder = ttk.Label(parent_frame, text="正在读取历史数据…", font=("SimHei", 10), anchor="center")
+        placeholder.pack(fill=tk.BOTH, expand=True)
+
+        def on_done(all_sessions):
+            if not placeholder.winfo_exists():
+                return
+            placeholder.destroy()
+            if not all_sessions:
+                # 如果没有工作时间段数据，显示提示信息
+                ttk.Label(parent_frame, text="暂无工作时间段数据", font=("SimHei", 12)).pack(expand=True)
+                return
+            self.show_chart(parent_frame, build_work_session_chart, all_sessions)
+
+        def on_error(error):
+            if placeholder.winfo_exists():
+                placeholder.config(text=f"读取历史数据出错: {error}", foreground="red")
+
+        # 快照在主线程中取，之后的记录不影响后台读取
+        self.chart_renderer.run(read_work_sessions,
+                                (self.events_file, self.stats_store.snapshot(), self.view_start(), self.read_only),
+                                on_done, on_error)
@@ -0,0 +1,192 @@
+import argparse
+import random
+import threading
+import time
+from bisect import bisect_right
+
+# 挂起时间的处理策略：计入工作时间，或像暂停一样排除
+SUSPEND_POLICIES = ("exclude", "count")
+# 墙上时间与单调时间的差值变化超过该秒数时，视为挂起或时钟跳变
+JUMP_THRESHOLD = 2.0
+# Linux上CLOCK_BOOTTIME包含挂起时间，与CLOCK_MONOTONIC的差值就是准确的挂起时长
+BOOTTIME = getattr(time, "CLOCK_BOOTTIME", None)
+
+
+def boot_clock():
+    return time.clock_gettime(BOOTTIME)
+
+
+class TimeSource:
+    """计时用的时钟：读数只由单调时钟推进，不受NTP校时和手动改时间影响
+
+    读数以创建时的墙上时间为起点，可以直接作为截止时间和时长使用；
+    系统挂起的时间按策略计入（读数跳过挂起时长）或排除（读数停在挂起时）。
+    墙上时间只用于显示和统计标签，通过to_wall转换。
+    """
+
+    def __init__(self, suspend_policy="exclude", wall=time.time, monotonic=time.monotonic,
+                 boottime=boot_clock if BOOTTIME is not None else None, threshold=JUMP_THRESHOLD):
+        if suspend_policy not in SUSPEND_POLICIES:
+            raise ValueError(f"未知的挂起策略: {suspend_policy}")
+        self.suspend_policy = suspend_policy
+        self.wall = wall
+        self.monotonic = monotonic
+        self.boottime = boottime
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._mono_origin = self._last_mono = monotonic()
+        self.origin = self._last_wall = wall()
+        self._boot_gap = boottime() - self._mono_origin if boottime else None
+        self.suspended = 0.0  # 检测到的挂起总时长（秒）
+        self.suspends = 0  # 检测到的挂起次数
+        self.wall_steps = 0  # 墙上时间被调整的次数
+        # 墙上时间相对读数的偏移，按读数分段：[(读数, 偏移)]，只在挂起或时钟跳变时追加
+        self._segment_starts = [self.origin]
+        self._offsets = [0.0]
+
+    def __call__(self):
+        with self._lock:
+            mono = self.monotonic()
+            wall = self.wall()
+            gap = (wall - self._last_wall) - (mono - self._last_mono)
+            if self._boot_gap is not None:
+                boot_gap = self.boottime() - mono
+                slept = boot_gap - self._boot_gap
+                if slept > self.threshold:
+                    self._boot_gap = boot_gap
+                    self.suspended += slept
+                    self.suspends += 1
+                    gap -= slept
+                if abs(gap) > self.threshold:
+                    self.wall_steps += 1
+            elif gap > self.threshold:
+                # 没有CLOCK_BOOTTIME时，墙上时间比单调时间多走的部分视为挂起（无法与向前校时区分）
+                self.suspended += gap
+                self.suspends += 1
+            elif gap < -self.threshold:
+                self.wall_steps += 1
+            self._last_mono = mono
+            self._last_wall = wall
+
+            now = self.origin + (mono - self._mono_origin)
+            if self.suspend_policy == "count":
+                now += self.suspended
+            offset = wall - now
+            if abs(offset - self._offsets[-1]) > self.threshold:
+                self._segment_starts.append(now)
+                self._offsets.append(offset)
+            return now
+
+    def to_wall(self, t):
+        """把读数转换为墙上时间戳（按读数所在时段的偏移）"""
+        with self._lock:
+            index = bisect_right(self._segment_starts, t) - 1
+            return t + self._offsets[max(index, 0)]
+
+
+class DriftClocks:
+    """可以手动推进、调整墙上时间和模拟挂起的底层时钟，供漂移检查使用"""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.wall_now = start
+        self.mono_now = 1000.0
+        self.slept = 0.0
+
+    def wall(self):
+        return self.wall_now
+
+    def monotonic(self):
+        return self.mono_now
+
+    def boottime(self):
+        return self.mono_now + self.slept
+
+    def advance(self, seconds):
+        self.wall_now += seconds
+        self.mono_now += seconds
+
+    def step_wall(self, seconds):
+        """NTP或手动校时：只有墙上时间跳变"""
+        self.wall_now += seconds
+
+    def suspend(self, seconds):
+        """系统挂起：墙上时间和BOOTTIME前进，单调时钟停止"""
+        self.wall_now += seconds
+        self.slept += seconds
+
+
+def run_drift_scenario(event, amount, policy, use_boottime=True, work_minutes=90, seed=0):
+    """工作半个循环后发生一次时钟事件，返回第一次进入休息时的 {纯工作时间, 实际经过时间, 挂起次数, 校时次数}"""
+    from scheduler import DeadlineScheduler
+    from timer_engine import TimerEngine
+
+    clocks = DriftClocks()
+    source = TimeSource(policy, wall=clocks.wall, monotonic=clocks.monotonic,
+                        boottime=clocks.boottime if use_boottime else None)
+    started = clocks.boottime()
+    scheduler = DeadlineScheduler(clock=source)
+    engine = TimerEngine(scheduler, clock=source, rng=random.Random(seed), work_duration=work_minutes * 60,
+                         display_ticks=False)
+    breaks = []
+    engine.subscribe(lambda name, **data: breaks.append(clocks.boottime()) if name == "break_started" else None)
+    engine.start()
+
+    def step(seconds):
+        # 以1秒为步长推进，相当于真实运行中每秒一次的唤醒
+        for _ in range(int(seconds)):
+            clocks.advance(1.0)
+            scheduler.run_pending()
+
+    step(work_minutes * 30)
+    if event == "suspend":
+        clocks.suspend(amount)
+    elif event == "step":
+        clocks.step_wall(amount)
+    scheduler.run_pending()
+    while not breaks and clocks.boottime() - started < 4 * work_minutes * 60 + abs(amount):
+        step(1)
+    return {"work_seconds": engine.pure_work_time, "real_seconds": (breaks[0] if breaks else clocks.boottime()) - started,
+            "suspends": source.suspends, "wall_steps": source.wall_steps}
+
+
+DRIFT_SCENARIOS = (
+    # (名称, 事件, 秒数, 策略, 使用BOOTTIME)
+    ("校时 +1小时", "step", 3600, "exclude", True),
+    ("校时 +1小时（计入挂起）", "step", 3600, "count", True),
+    ("校时 -1小时", "step", -3600, "exclude", True),
+    ("挂起2小时（排除）", "suspend", 7200, "exclude", True),
+    ("挂起2小时（计入）", "suspend", 7200, "count", True),
+    ("挂起2小时（排除，无BOOTTIME）", "suspend", 7200, "exclude", False),
+    ("校时 -1小时（无BOOTTIME）", "step", -3600, "exclude", False),
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检查校时和系统挂起对工作循环的影响")
+    parser.add_argument("--work-minutes", type=int, default=90, help="大循环工作时长（分钟）")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="允许的误差（秒）")
+    args = parser.parse_args(argv)
+
+    work = args.work_minutes * 60
+    failures = 0
+    for name, event, amount, policy, use_boottime in DRIFT_SCENARIOS:
+        result = run_drift_scenario(event, amount, policy, use_boottime, args.work_minutes)
+        # 校时不影响循环；排除挂起时循环顺延挂起时长；
+        # 计入挂起时挂起时长全部算作工作时间，挂起期间已满一个循环的话恢复后立即进入休息
+        expected_real = expected_work = work
+        if event == "suspend" and policy == "exclude":
+            expected_real = work + amount
+        elif event == "suspend":
+            expected_real = max(work, work / 2 + amount)
+            expected_work = expected_real
+        ok = (abs(result["real_seconds"] - expected_real) <= args.tolerance
+              and abs(result["work_seconds"] - expected_work) <= args.tolerance)
+        failures += not ok
+        print(f"{'通过' if ok else '失败'}  {name:<24} 进入休息时实际经过 {result['real_seconds']:8.0f}s"
+              f"（期望 {expected_real:.0f}s）纯工作时间 {result['work_seconds']:7.0f}s（期望 {expected_work:.0f}s）"
+              f"  挂起 {result['suspends']} 次  校时 {result['wall_steps']} 次")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
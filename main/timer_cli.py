@@ -0,0 +1,160 @@
+import argparse
+import os
+import random
+import signal
+import sys
+import threading
+from datetime import datetime
+
+from scheduler import BlockingScheduler, PollingScheduler, SimulatedClock, run_simulation
+from stats_rollup import StatsRollup, merge_foreign_events, record_session, store_source
+from stats_store import JournalStatsStore, seconds_to_hms
+from time_source import SUSPEND_POLICIES, TimeSource
+from timer_engine import TimerEngine
+
+DEFAULT_STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timer_stats.json")
+
+
+def add_engine_arguments(parser):
+    parser.add_argument("--work-minutes", type=float, default=90, help="每个大循环的工作时长（分钟）")
+    parser.add_argument("--break-minutes", type=float, default=20, help="休息时长（分钟）")
+    parser.add_argument("--min-interval", type=int, default=3 * 60, help="最小提示间隔（秒）")
+    parser.add_argument("--max-interval", type=int, default=5 * 60, help="最大提示间隔（秒）")
+
+
+def engine_options(args):
+    return {
+        "work_duration": int(args.work_minutes * 60),
+        "break_duration": int(args.break_minutes * 60),
+        "min_interval": args.min_interval,
+        "max_interval": args.max_interval,
+    }
+
+
+def save_engine_stats(stats_file, engine):
+    """把计时核心的本次会话追加写入统计文件及其汇总索引"""
+    store = JournalStatsStore(stats_file)
+    store.load()
+    rollup = StatsRollup(os.path.splitext(stats_file)[0] + ".rollup.json")
+    rollup.load(store)
+    record_session(store, rollup, datetime.now().strftime("%Y-%m-%d"), engine)
+    store.save()
+    merge_foreign_events(store, rollup)
+    rollup.save(store.seq, store_source(store))
+
+
+def run_daemon(args):
+    """无界面实时运行：提示时响铃并打印事件，退出时写入统计数据"""
+    # 截止时间和工作时长使用单调时钟，不受校时和系统挂起影响
+    clock = TimeSource(args.suspend_policy)
+    scheduler = BlockingScheduler(clock=clock)
+    engine = TimerEngine(scheduler, clock=clock, auto_resume=args.auto_resume, display_ticks=False,
+                         **engine_options(args))
+    stop_event = threading.Event()
+
+    def on_event(event, **data):
+        now = datetime.now().strftime("%H:%M:%S")
+        if event == "alert":
+            # 终端响铃代替提示音
+            sys.stdout.write("\a" * data["repeat_count"])
+            print(f"[{now}] 提示 x{data['repeat_count']}")
+        elif event == "next_alert":
+            print(f"[{now}] 下一次提示时间：{datetime.fromtimestamp(engine.wall_time(data['time'])).strftime('%H:%M:%S')}")
+        elif event == "break_started":
+            print(f"[{now}] 休息开始，结束时间：{datetime.fromtimestamp(engine.wall_time(data['end_time'])).strftime('%H:%M:%S')}")
+        elif event == "break_ended":
+            print(f"[{now}] 休息结束")
+            if not engine.auto_resume:
+                stop_event.set()
+        elif event in ("started", "paused", "stopped"):
+            print(f"[{now}] {event}")
+        sys.stdout.flush()
+
+    engine.subscribe(on_event)
+
+    def request_stop(signum, frame):
+        stop_event.set()
+        scheduler.wake()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    engine.start()
+    scheduler.run(stop_event)
+    engine.shutdown()
+
+    if args.no_stats:
+        return
+    save_engine_stats(args.stats_file, engine)
+    print(f"纯工作时间 {seconds_to_hms(engine.pure_work_time)}，提示 {len(engine.alert_times)} 次，已写入统计数据")
+
+
+def run_simulated(args):
+    """用虚拟时钟快速模拟若干天的连续工作/休息循环"""
+    clock = SimulatedClock()
+    scheduler = BlockingScheduler(clock=clock)
+    engine = TimerEngine(scheduler, clock=clock, rng=random.Random(args.seed),
+                         auto_resume=True, display_ticks=False, **engine_options(args))
+    counts = {"alert": 0, "break_started": 0}
+
+    def on_event(event, **data):
+        if event in counts:
+            counts[event] += 1
+
+    engine.subscribe(on_event)
+    engine.start()
+    run_simulation(scheduler, clock, clock.now + args.days * 86400)
+    engine.shutdown()
+
+    print(f"模拟天数: {args.days}")
+    print(f"纯工作时间: {seconds_to_hms(engine.pure_work_time)}")
+    print(f"大循环（休息）次数: {counts['break_started']}")
+    print(f"提示次数: {len(engine.alert_times)}")
+    print(f"工作时间段数: {len(engine.work_sessions)}")
+    print(f"调度器唤醒次数: {scheduler.wakeups}（{scheduler.wakeups_per_minute():.2f} 次/分钟）")
+    if args.legacy_minutes > 0:
+        # 用同一个唤醒计数实测旧版0.1秒轮询（每秒10次唤醒，只模拟开头一段）
+        minutes = min(args.legacy_minutes, args.days * 1440)
+        legacy = simulate_legacy_polling(args, minutes)
+        print(f"旧版轮询唤醒（实测前 {minutes:g} 分钟）: {legacy.wakeups} 次（{legacy.wakeups_per_minute():.2f} 次/分钟）")
+
+
+def simulate_legacy_polling(args, minutes):
+    """用旧版的固定间隔轮询驱动同样的计时核心，返回调度器"""
+    clock = SimulatedClock()
+    scheduler = PollingScheduler(clock=clock)
+    engine = TimerEngine(scheduler, clock=clock, rng=random.Random(args.seed),
+                         auto_resume=True, display_ticks=False, **engine_options(args))
+    engine.start()
+    run_simulation(scheduler, clock, clock.now + minutes * 60)
+    engine.shutdown()
+    return scheduler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="定时提示音程序（无界面模式）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="无界面实时运行计时器")
+    add_engine_arguments(run_parser)
+    run_parser.add_argument("--auto-resume", action="store_true", help="休息结束后自动继续工作（否则退出）")
+    run_parser.add_argument("--stats-file", default=DEFAULT_STATS_FILE, help="统计数据文件")
+    run_parser.add_argument("--no-stats", action="store_true", help="不写入统计数据")
+    run_parser.add_argument("--suspend-policy", choices=SUSPEND_POLICIES, default="exclude",
+                            help="系统挂起的时间是否计入工作时间")
+    run_parser.set_defaults(func=run_daemon)
+
+    sim_parser = subparsers.add_parser("simulate", help="用虚拟时钟快速模拟")
+    add_engine_arguments(sim_parser)
+    sim_parser.add_argument("--days", type=float, default=30, help="模拟天数")
+    sim_parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+    sim_parser.add_argument("--legacy-minutes", type=float, default=120,
+                            help="对比用的旧版轮询模拟多少分钟（0为不对比）")
+    sim_parser.set_defaults(func=run_simulated)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
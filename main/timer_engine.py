@@ -0,0 +1,352 @@
+import random
+import time
+
+from compact_events import AlertLog, WorkSessionLog
+from scheduler import next_whole_second
+
+
+class TimerEngine:
+    """与界面无关的计时核心：工作/休息循环、随机提示和纯工作时间统计
+
+    时钟、随机数和调度器都可以注入（时钟通常是time_source.TimeSource，截止时间和时长
+    不受校时和系统挂起影响，读数通过wall_time转换为墙上时间）；状态变化通过事件通知订阅者：
+      started, paused, stopped            —— 运行状态变化
+      alert(repeat_count, time, deadline) —— 需要播放提示音（deadline为计划时间）
+      next_alert(time)                    —— 下一次提示时间
+      last_interval(duration)             —— 上个随机片段运行时长
+      tick(interval_elapsed, work_time)   —— 整秒显示刷新
+      break_started(end_time)             —— 进入休息
+      break_tick(remaining)               —— 休息倒计时整秒刷新
+      break_ended(early)                  —— 休息结束
+      session_reset(full)                 —— 会话数据已写入统计并重置
+    """
+
+    def __init__(self, scheduler, clock=time.time, rng=None, work_duration=90 * 60,
+                 break_duration=20 * 60, min_interval=3 * 60, max_interval=5 * 60, auto_resume=False,
+                 display_ticks=True):
+        self.scheduler = scheduler
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.listeners = []
+
+        # 设置默认参数
+        self.work_duration = work_duration  # 90分钟工作时间（秒）
+        self.break_duration = break_duration  # 20分钟休息时间（秒）
+        self.min_interval = min_interval  # 最小提示间隔（秒）
+        self.max_interval = max_interval  # 最大提示间隔（秒）
+        self.auto_resume = auto_resume  # 休息结束后是否自动继续工作（无界面模式使用）
+        self.display_ticks = display_ticks  # 没有显示时可以关闭整秒刷新
+
+        # 程序状态变量
+        self.running = False
+        self.in_break = False
+        self.alert_job = None
+        self.cycle_job = None
+        self.tick_job = None
+        self.break_job = None
+        self.next_alert_time = None
+        self.cycle_end_time = None
+        self.break_end_time = None
+        self.pause_start_time = None
+
+        # 数据统计变量
+        self.alert_times = AlertLog()  # 记录每次提示的时间
+        self.session_start_time = None  # 本次会话开始时间
+        self.total_run_time = 0  # 总运行时间（秒）
+        self.current_interval_start_time = None  # 当前随机片段开始时间
+        self.last_interval_duration = 0  # 上个随机片段的持续时间
+
+        # 纯工作时间记录
+        self.pure_work_time = 0  # 尚未写入统计的纯工作时间（不包括暂停和休息）
+        self.recorded_work_time = 0  # 本次会话中已写入统计的纯工作时间，只用于循环边界和显示
+        self.work_start_time = None  # 当前工作开始时间
+
+        self.work_sessions = WorkSessionLog()  # 记录工作时间段，迭代时为 {'start': timestamp, 'end': timestamp, 'duration': seconds}
+        self.current_work_session_start = None  # 当前工作时间段开始时间
+
+    def subscribe(self, listener):
+        """注册事件回调 listener(event, **data)"""
+        self.listeners.append(listener)
+
+    def emit(self, event, **data):
+        for listener in self.listeners:
+            listener(event, **data)
+
+    def start(self):
+        """开始或从暂停中恢复工作"""
+        if self.running or self.in_break:
+            return
+        self.running = True
+        current_time = self.clock()
+
+        # 记录工作开始时间
+        self.work_start_time = current_time
+
+        # 如果是首次启动，记录会话开始时间
+        if not self.session_start_time:
+            self.session_start_time = current_time
+            self.current_interval_start_time = current_time
+            self.current_work_session_start = current_time  # 记录工作时间段开始
+            # 重置上个片段运行时长
+            self.last_interval_duration = 0
+            self.emit("last_interval", duration=self.last_interval_duration)
+        else:
+            # 从暂停状态恢复，调整session_start_time以排除暂停时间
+            if self.pause_start_time is not None:
+                self.session_start_time += current_time - self.pause_start_time
+                self.pause_start_time = None
+            self.current_interval_start_time = current_time
+            self.current_work_session_start = current_time  # 重新开始工作时间段
+
+        self.emit("started")
+        self.arm_timer_jobs()
+
+    def pause(self):
+        """暂停计时器（不清空数据）"""
+        if not self.running:
+            return
+        self.running = False
+        self.cancel_timer_jobs()
+        current_time = self.clock()
+
+        # 累计纯工作时间
+        if self.work_start_time:
+            self.pure_work_time += current_time - self.work_start_time
+            self.work_start_time = None
+
+        # 记录暂停开始时间，用于计算暂停时长
+        self.pause_start_time = current_time
+
+        # 记录当前工作时间段结束
+        if self.current_work_session_start:
+            self.work_sessions.add(self.current_work_session_start, current_time)
+            self.current_work_session_start = None
+        self.emit("paused")
+
+    def stop(self):
+        """完全停止计时器，把本次运行时长计入总运行时间，结算纯工作时间和当前工作时间段"""
+        if not self.running:
+            return
+        self.running = False
+        self.cancel_timer_jobs()
+        current_time = self.clock()
+        if self.work_start_time:
+            self.pure_work_time += current_time - self.work_start_time
+            self.work_start_time = None
+        if self.current_work_session_start:
+            self.work_sessions.add(self.current_work_session_start, current_time)
+            self.current_work_session_start = None
+        if self.session_start_time:
+            self.total_run_time += current_time - self.session_start_time
+        self.emit("stopped")
+
+    def shutdown(self):
+        """退出前结算：累计纯工作时间、运行时长和最后一个工作时间段"""
+        self.scheduler.cancel(self.break_job)
+        self.break_job = None
+        if not self.running:
+            return
+        self.running = False
+        self.cancel_timer_jobs()
+        current_time = self.clock()
+
+        if self.work_start_time:
+            self.pure_work_time += current_time - self.work_start_time
+            self.work_start_time = None
+
+        if self.session_start_time:
+            self.total_run_time += current_time - self.session_start_time
+            if self.current_work_session_start:
+                self.work_sessions.add(self.current_work_session_start, current_time)
+                self.current_work_session_start = None
+
+    def reset_session(self, full=False):
+        """统计数据写入后重置会话数据；full为True时连同会话开始时间一起重置
+
+        已写入统计的纯工作时间清零（转入recorded_work_time，循环边界保持连续），
+        下次写入统计时不会重复计算。
+        """
+        self.total_run_time = 0
+        self.recorded_work_time += self.pure_work_time
+        self.pure_work_time = 0
+        self.alert_times.clear()
+        self.work_sessions.clear()
+        if full:
+            self.session_start_time = None
+            self.current_work_session_start = None
+            self.recorded_work_time = 0
+        self.emit("session_reset", full=full)
+
+    def end_fragment(self):
+        """结束当前随机片段，未运行时返回False"""
+        if not self.running:
+            return False
+        self.alert()
+        # 计算当前片段持续时间并保存为上个片段时长
+        if self.current_interval_start_time:
+            current_time = self.clock()
+            self.last_interval_duration = current_time - self.current_interval_start_time
+            self.emit("last_interval", duration=self.last_interval_duration)
+            # 重置当前随机片段开始时间，显示跳秒重新对齐
+            self.current_interval_start_time = current_time
+            self.restart_display_tick()
+        return True
+
+    def end_cycle(self):
+        """结束当前90分钟循环并进入休息，未运行时返回False"""
+        if not self.running:
+            return False
+        self.alert()
+        self.start_break()
+        return True
+
+    def alert(self, repeat_count=1, deadline=None):
+        """记录提示时间并通知播放提示音；deadline为计划的提示时间（手动触发时为当前时间）"""
+        alert_time = self.clock()
+        self.alert_times.append(alert_time)
+        self.emit("alert", repeat_count=repeat_count, time=alert_time,
+                  deadline=alert_time if deadline is None else deadline)
+
+    def wall_time(self, t):
+        """把时钟读数转换为墙上时间，只用于显示和统计标签"""
+        to_wall = getattr(self.clock, "to_wall", None)
+        return t if to_wall is None else to_wall(t)
+
+    def current_work_time(self, current_time=None):
+        """本次会话累计的纯工作时间（含已写入统计的部分和正在进行的工作）"""
+        if current_time is None:
+            current_time = self.clock()
+        work_time = self.recorded_work_time + self.pure_work_time
+        if self.work_start_time:
+            return work_time + (current_time - self.work_start_time)
+        return work_time
+
+    def session_run_time(self):
+        """本次会话的运行时长（含正在运行的部分）"""
+        if self.running and self.session_start_time:
+            return self.total_run_time + self.clock() - self.session_start_time
+        return self.total_run_time
+
+    def arm_timer_jobs(self):
+        """安排提示、循环结束和显示刷新事件"""
+        current_time = self.clock()
+        self.next_alert_time = current_time + self.rng.randint(self.min_interval, self.max_interval)
+        self.emit("next_alert", time=self.next_alert_time)
+
+        # 初始化当前随机片段开始时间
+        self.current_interval_start_time = current_time
+
+        # 下一个90分钟倍数（90分钟、180分钟、270分钟...）对应的时间点
+        work_time = self.recorded_work_time + self.pure_work_time
+        next_boundary = (int(work_time // self.work_duration) + 1) * self.work_duration
+        cycle_end_time = self.work_start_time + (next_boundary - work_time)
+
+        self.cycle_end_time = cycle_end_time
+        self.cycle_job = self.scheduler.schedule_at(cycle_end_time, self.on_cycle_end)
+        self.alert_job = self.scheduler.schedule_at(self.next_alert_time, self.on_alert_due)
+        self.restart_display_tick()
+
+    def cancel_timer_jobs(self):
+        """取消所有计时相关的调度事件"""
+        for job in (self.alert_job, self.cycle_job, self.tick_job):
+            self.scheduler.cancel(job)
+        self.alert_job = None
+        self.cycle_job = None
+        self.tick_job = None
+
+    def on_cycle_end(self):
+        """累计工作时间达到90分钟的倍数，触发休息"""
+        self.cycle_job = None
+        if not self.running:
+            return
+        self.alert(3, deadline=self.cycle_end_time)  # 进入休息时播放三次提示音
+        self.start_break()
+
+    def on_alert_due(self):
+        """随机提示时间到"""
+        self.alert_job = None
+        if not self.running:
+            return
+        current_time = self.clock()
+        self.alert(deadline=self.next_alert_time)  # 小循环提示音播放一次
+        if self.current_interval_start_time:
+            self.last_interval_duration = current_time - self.current_interval_start_time
+            self.emit("last_interval", duration=self.last_interval_duration)
+        # 计算下一次提示时间
+        self.next_alert_time = current_time + self.rng.randint(self.min_interval, self.max_interval)
+        self.emit("next_alert", time=self.next_alert_time)
+        self.alert_job = self.scheduler.schedule_at(self.next_alert_time, self.on_alert_due)
+        # 重置当前随机片段开始时间
+        self.current_interval_start_time = current_time
+        self.restart_display_tick()
+
+    def restart_display_tick(self):
+        """按当前片段起点重新对齐显示跳秒"""
+        self.scheduler.cancel(self.tick_job)
+        self.tick_job = None
+        if self.display_ticks:
+            self.on_display_tick()
+
+    def on_display_tick(self):
+        """每到整秒刷新一次显示，其余时间不唤醒"""
+        if not self.running:
+            return
+        current_time = self.clock()
+        interval_elapsed = current_time - self.current_interval_start_time if self.current_interval_start_time else 0
+        self.emit("tick", interval_elapsed=interval_elapsed, work_time=self.current_work_time(current_time))
+
+        # 安排下一次整秒刷新
+        origin = self.current_interval_start_time or current_time
+        self.tick_job = self.scheduler.schedule_at(next_whole_second(current_time, origin), self.on_display_tick)
+
+    def start_break(self):
+        """累计纯工作时间、结束当前工作时间段，暂停主计时器并进入休息倒计时"""
+        current_time = self.clock()
+        if self.work_start_time:
+            self.pure_work_time += current_time - self.work_start_time
+            self.work_start_time = None
+        if self.current_work_session_start:
+            self.work_sessions.add(self.current_work_session_start, current_time)
+            self.current_work_session_start = None
+
+        self.running = False
+        self.cancel_timer_jobs()
+        self.in_break = True
+        self.break_end_time = current_time + self.break_duration
+        self.emit("break_started", end_time=self.break_end_time)
+        self.on_break_tick()
+
+    def on_break_tick(self):
+        """休息倒计时在剩余秒数跳变时刷新"""
+        self.break_job = None
+        if not self.in_break:
+            return
+        remaining = self.break_end_time - self.clock()
+        if remaining <= 0:
+            self.finish_break(early=False)
+            return
+        if not self.display_ticks:
+            # 没有显示时直接睡到休息结束
+            self.break_job = self.scheduler.schedule_at(self.break_end_time, self.on_break_tick)
+            return
+        self.emit("break_tick", remaining=remaining)
+        fraction = remaining - int(remaining)
+        self.break_job = self.scheduler.schedule_in(fraction or 1.0, self.on_break_tick)
+
+    def end_break(self):
+        """手动结束休息"""
+        if not self.in_break:
+            return
+        self.scheduler.cancel(self.break_job)
+        self.break_job = None
+        self.finish_break(early=True)
+
+    def finish_break(self, early):
+        """休息结束：播放三次提示音，等待重新启动（或自动继续）"""
+        self.in_break = False
+        self.alert(3, deadline=None if early else self.break_end_time)
+        # 不重置session_start_time和累计工作时间，保持循环边界的连续性
+        self.work_start_time = None
+        self.emit("break_ended", early=early)
+        if self.auto_resume:
+            self.start()
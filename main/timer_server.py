@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import math
+import os
+import random
+import re
+import signal
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from scheduler import SimulatedClock, TimerWheel, run_simulation
+from time_source import SUSPEND_POLICIES, TimeSource
+from timer_cli import save_engine_stats
+from timer_engine import TimerEngine
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "pomodoro-timer.sock")
+DEFAULT_PORT = 8765
+# 允许通过命令设置的计时参数（与TimerEngine的参数同名，时间单位为秒）
+ENGINE_OPTIONS = ("work_duration", "break_duration", "min_interval", "max_interval", "auto_resume")
+# 会话名同时用作统计文件名
+SESSION_NAME = re.compile(r"^[\w.-]{1,64}$")
+# 订阅者写缓冲超过该字节数时视为读取太慢，断开连接
+MAX_CLIENT_BUFFER = 1 << 20
+ENGINE_COMMANDS = ("start", "pause", "stop", "end_fragment", "end_cycle", "end_break")
+# 事件中表示时间点的字段，推送前换算为墙上时间
+WALL_TIME_FIELDS = ("time", "deadline", "end_time")
+
+
+class CommandError(Exception):
+    """客户端命令无效"""
+
+
+def engine_options(request):
+    """检查create命令中的计时参数，返回传给TimerEngine的参数"""
+    options = {}
+    for key in ENGINE_OPTIONS:
+        if key not in request:
+            continue
+        value = request[key]
+        if key == "auto_resume":
+            if not isinstance(value, bool):
+                raise CommandError(f"{key}必须是布尔值")
+        elif isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+            raise CommandError(f"{key}必须是正整数（秒）")
+        options[key] = value
+    # 未指定的一端使用TimerEngine的默认值
+    defaults = inspect.signature(TimerEngine).parameters
+    min_interval = options.get("min_interval", defaults["min_interval"].default)
+    max_interval = options.get("max_interval", defaults["max_interval"].default)
+    if min_interval > max_interval:
+        raise CommandError(f"min_interval（{min_interval}）不能大于max_interval（{max_interval}）")
+    if not isinstance(request.get("start", False), bool):
+        raise CommandError("start必须是布尔值")
+    return options
+
+
+class TimerServer:
+    """在一个事件循环中运行多个计时会话，所有会话共用一个时间轮和随机数生成器
+
+    控制协议为按行分隔的JSON：客户端发送 {"cmd": ..., "session": ...}，
+    服务端回复 {"ok": true, ...} 或 {"ok": false, "error": ...}；
+    订阅后会收到 {"session": ..., "event": ..., ...} 形式的计时事件。
+    """
+
+    def __init__(self, clock=time.time, resolution=0.1, stats_dir=None, seed=None):
+        self.wheel = TimerWheel(clock=clock, resolution=resolution)
+        self.rng = random.Random(seed)
+        self.stats_dir = stats_dir
+        self.sessions = {}
+        self.removing = set()  # 正在后台写入统计、即将删除的会话
+        self.subscribers = {}  # 会话名（或"*"表示全部）-> 订阅的连接集合
+        self.events_sent = 0
+        self._wakeup = None
+
+    def create_session(self, name, **options):
+        """新建一个会话（不自动开始）"""
+        if not SESSION_NAME.match(name or ""):
+            raise CommandError(f"无效的会话名: {name!r}")
+        if name in self.sessions:
+            raise CommandError(f"会话已存在: {name}")
+        engine = TimerEngine(self.wheel, clock=self.wheel.clock, rng=self.rng, display_ticks=False, **options)
+        engine.subscribe(functools.partial(self.publish, name))
+        self.sessions[name] = engine
+        return engine
+
+    def remove_session(self, name):
+        """结束会话，设置了统计目录时写入该会话的统计数据；写入成功后才删除会话（同步写入，用于退出时）"""
+        engine = self.get_session(name)
+        engine.shutdown()
+        if self.needs_save(engine):
+            try:
+                save_engine_stats(self.stats_file(name), engine)
+            except OSError as e:
+                # 会话已停止但保留，可以稍后再次删除重试
+                raise CommandError(f"写入统计数据出错，会话未删除: {e}") from e
+        del self.sessions[name]
+        self.publish(name, "removed")
+
+    async def remove_session_async(self, name):
+        """与remove_session相同，但统计数据在线程池中写入（含fsync），不阻塞其他会话；
+        写入期间该会话不接受其他命令"""
+        engine = self.get_session(name)
+        engine.shutdown()
+        if self.needs_save(engine):
+            self.removing.add(name)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, save_engine_stats, self.stats_file(name), engine)
+            except OSError as e:
+                raise CommandError(f"写入统计数据出错，会话未删除: {e}") from e
+            finally:
+                self.removing.discard(name)
+        del self.sessions[name]
+        self.publish(name, "removed")
+
+    def needs_save(self, engine):
+        return self.stats_dir and (engine.pure_work_time or len(engine.alert_times))
+
+    def stats_file(self, name):
+        return os.path.join(self.stats_dir, f"{name}.json")
+
+    def get_session(self, name):
+        if name in self.removing:
+            raise CommandError(f"会话正在删除: {name}")
+        try:
+            return self.sessions[name]
+        except KeyError:
+            raise CommandError(f"会话不存在: {name}") from None
+
+    def session_status(self, name):
+        engine = self.get_session(name)
+        return {
+            "session": name,
+            "running": engine.running,
+            "in_break": engine.in_break,
+            "work_time": engine.current_work_time(),
+            "run_time": engine.session_run_time(),
+            "alerts": len(engine.alert_times),
+            "work_sessions": len(engine.work_sessions),
+            "next_alert_time": engine.wall_time(engine.next_alert_time) if engine.running else None,
+            "break_end_time": engine.wall_time(engine.break_end_time) if engine.in_break else None,
+        }
+
+    def publish(self, name, event, **data):
+        """把会话事件推送给订阅者；没有订阅者时不做序列化"""
+        targets = self.subscribers.get(name)
+        everyone = self.subscribers.get("*")
+        if not targets and not everyone:
+            return
+        engine = self.sessions.get(name)
+        if engine is not None:
+            # 事件中的时间点换算为墙上时间再推送
+            data = {key: engine.wall_time(value) if key in WALL_TIME_FIELDS else value for key, value in data.items()}
+        line = (json.dumps({"session": name, "event": event, **data}, ensure_ascii=False) + "\n").encode("utf-8")
+        for writer in list(targets or ()) + list(everyone or ()):
+            self.send(writer, line)
+
+    def send(self, writer, line):
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            # 读取太慢的订阅者直接断开，避免拖慢其他会话
+            self.unsubscribe_all(writer)
+            writer.close()
+            return
+        writer.write(line)
+        self.events_sent += 1
+
+    def unsubscribe_all(self, writer):
+        for key in list(self.subscribers):
+            self.subscribers[key].discard(writer)
+            if not self.subscribers[key]:
+                del self.subscribers[key]
+
+    async def handle_command(self, request, writer=None):
+        """执行一条命令并返回回复内容"""
+        if not isinstance(request, dict):
+            raise CommandError("命令必须是JSON对象")
+        cmd = request.get("cmd")
+        name = request.get("session")
+        if cmd == "create":
+            unknown = set(request) - {"cmd", "session", "start"} - set(ENGINE_OPTIONS)
+            if unknown:
+                raise CommandError(f"未知参数: {', '.join(sorted(unknown))}")
+            engine = self.create_session(name, **engine_options(request))
+            if request.get("start", False):
+                try:
+                    engine.start()
+                except Exception as e:
+                    # 不留下状态为运行中却没有任何任务的会话
+                    engine.shutdown()
+                    del self.sessions[name]
+                    raise CommandError(f"无法开始会话: {e}") from e
+            return {"session": name}
+        if cmd == "remove":
+            await self.remove_session_async(name)
+            return {"session": name}
+        if cmd in ENGINE_COMMANDS:
+            getattr(self.get_session(name), cmd)()
+            return self.session_status(name)
+        if cmd == "status":
+            return self.session_status(name)
+        if cmd == "list":
+            return {"sessions": sorted(self.sessions)}
+        if cmd == "stats":
+            return {"sessions": len(self.sessions),
+                    "running": sum(1 for engine in self.sessions.values() if engine.running),
+                    "pending_jobs": self.wheel.live,
+                    "wakeups": self.wheel.wakeups,
+                    "events_sent": self.events_sent}
+        if cmd in ("subscribe", "unsubscribe"):
+            if writer is None:
+                raise CommandError("订阅需要连接")
+            key = name or "*"
+            if key != "*":
+                self.get_session(key)
+            if cmd == "subscribe":
+                self.subscribers.setdefault(key, set()).add(writer)
+            elif key in self.subscribers:
+                self.subscribers[key].discard(writer)
+            return {"session": key}
+        raise CommandError(f"未知命令: {cmd!r}")
+
+    async def handle_client(self, reader, writer):
+        """逐行读取命令并回复，连接断开时取消订阅"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = {"ok": True, **await self.handle_command(json.loads(line), writer)}
+                except (CommandError, ValueError, TypeError) as e:
+                    reply = {"ok": False, "error": str(e)}
+                # 命令可能安排了新的任务，唤醒时间轮
+                self._wakeup.set()
+                writer.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.unsubscribe_all(writer)
+            writer.close()
+
+    async def drive_wheel(self):
+        """睡到最近一个任务所在刻度的结束时刻再推进时间轮；新命令可能安排了更早的任务，随时唤醒重新计算"""
+        resolution = self.wheel.resolution
+        while True:
+            self._wakeup.clear()
+            deadline = self.wheel.next_deadline()
+            if deadline is None:
+                await self._wakeup.wait()
+                continue
+            delay = math.ceil(deadline / resolution) * resolution - self.wheel.clock()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            self.wheel.run_pending()
+
+    async def serve(self, path=None, host="127.0.0.1", port=None):
+        """在本地套接字上提供服务，直到收到SIGINT/SIGTERM"""
+        self._wakeup = asyncio.Event()
+        if port is None and hasattr(socket, "AF_UNIX"):
+            if os.path.exists(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.handle_client, path=path)
+            print(f"监听 {path}")
+        else:
+            server = await asyncio.start_server(self.handle_client, host=host, port=port or DEFAULT_PORT)
+            print(f"监听 {host}:{port or DEFAULT_PORT}")
+        sys.stdout.flush()
+
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        driver = asyncio.ensure_future(self.drive_wheel())
+        async with server:
+            try:
+                await stop.wait()
+            finally:
+                driver.cancel()
+                for name in list(self.sessions):
+                    self.remove_session(name)
+        if port is None and path and os.path.exists(path):
+            os.remove(path)
+
+
+def run_server(args):
+    if args.stats_dir:
+        os.makedirs(args.stats_dir, exist_ok=True)
+    server = TimerServer(clock=TimeSource(args.suspend_policy), resolution=args.resolution, stats_dir=args.stats_dir)
+    asyncio.run(server.serve(path=args.socket, port=args.port))
+
+
+def run_client(args):
+    """发送一条命令并打印回复；--follow时继续打印推送的事件"""
+    if args.port is None and hasattr(socket, "AF_UNIX"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(args.socket)
+    else:
+        sock = socket.create_connection(("127.0.0.1", args.port or DEFAULT_PORT))
+    with sock, sock.makefile("rwb") as stream:
+        stream.write((args.command.strip() + "\n").encode("utf-8"))
+        stream.flush()
+        for line in stream:
+            print(line.decode("utf-8").rstrip())
+            if not args.follow:
+                break
+
+
+def run_benchmark(args):
+    """用虚拟时钟模拟大量会话，测量每个会话的内存和推进时间轮的CPU时间"""
+    clock = SimulatedClock()
+    server = TimerServer(clock=clock, resolution=args.resolution, seed=0)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(args.sessions):
+        server.create_session(f"user{i}", auto_resume=True).start()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cpu_start = time.process_time()
+    run_simulation(server.wheel, clock, clock.now + args.hours * 3600)
+    cpu = time.process_time() - cpu_start
+    alerts = sum(len(engine.alert_times) for engine in server.sessions.values())
+    print(f"会话数: {args.sessions}")
+    print(f"每个会话内存: {(after - before) / args.sessions / 1024:.1f} KB")
+    print(f"模拟 {args.hours} 小时，提示 {alerts} 次，CPU {cpu:.2f} s（实际时间的 {cpu / (args.hours * 3600) * 100:.4f}%）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多会话计时服务")
+    subparsers = parser.add_subparsers(dest="command_name", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动服务")
+    serve_parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix套接字路径")
+    serve_parser.add_argument("--port", type=int, default=None, help="改为监听127.0.0.1上的TCP端口")
+    serve_parser.add_argument("--stats-dir", default=None, help="会话结束时把统计数据写入该目录（每个会话一个文件）")
+    serve_parser.add_argument("--resolution", type=float, default=0.1, help="时间轮刻度（秒）")
+    serve_parser.add_argument("--suspend-policy", choices=SUSPEND_POLICIES, default="exclude",
+                              help="系统挂起的时间是否计入工作时间")
+    serve_parser.set_defaults(func=run_server)
+
+    send_parser = subparsers.add_parser("send", help="发送一条JSON命令")
+    send_parser.add_argument("command", help='例如 {"cmd": "create", "session": "alice", "start": true}')
+    send_parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix套接字路径")
+    send_parser.add_argument("--port", type=int, default=None, help="连接127.0.0.1上的TCP端口")
+    send_parser.add_argument("--follow", action="store_true", help="持续打印订阅的事件")
+    send_parser.set_defaults(func=run_client)
+
+    bench_parser = subparsers.add_parser("bench", help="用虚拟时钟测量大量会话的开销")
+    bench_parser.add_argument("--sessions", type=int, default=10000, help="会话数")
+    bench_parser.add_argument("--hours", type=float, default=8, help="模拟小时数")
+    bench_parser.add_argument("--resolution", type=float, default=0.1, help="时间轮刻度（秒）")
+    bench_parser.set_defaults(func=run_benchmark)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
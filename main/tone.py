@@ -0,0 +1,106 @@
+import hashlib
+import json
+import math
+import os
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 缓存格式版本，修改合成算法时递增以作废旧缓存
+TONE_CACHE_VERSION = 1
+
+DEFAULT_TONE = {
+    "frequencies": [320],  # 使用较低的频率（320Hz）使声音更柔和
+    "duration": 1.5,
+    "attack": 0.3,  # 淡入
+    "decay": 0.0,
+    "sustain": 1.0,
+    "release": 0.5,  # 淡出
+    "volume": 0.94,  # 与旧版 120/128 的振幅一致
+}
+
+
+def envelope_points(duration, attack, decay, sustain, release):
+    """返回ADSR包络的折线节点（时间, 振幅）"""
+    attack = min(attack, duration)
+    decay = min(decay, duration - attack)
+    release = min(release, duration - attack - decay)
+    times = [0.0, attack, attack + decay, duration - release, duration]
+    levels = [0.0, 1.0, sustain, sustain, 0.0]
+    return times, levels
+
+
+def synthesize_tone(frequencies=(320,), duration=1.5, attack=0.3, decay=0.0, sustain=1.0,
+                    release=0.5, volume=0.94, sample_rate=44100, channels=2):
+    """生成16位有符号PCM缓冲区（本机字节序、多声道交错，对应mixer的size=-16），frequencies为多个频率时生成和弦"""
+    frequencies = list(frequencies)
+    n_samples = int(sample_rate * duration)
+    times, levels = envelope_points(duration, attack, decay, sustain, release)
+    peak = 32767 * volume / len(frequencies)
+
+    if np is not None:
+        # 一次性批量计算所有采样点
+        t = np.arange(n_samples) / sample_rate
+        wave = np.zeros(n_samples)
+        for frequency in frequencies:
+            wave += np.sin(2 * np.pi * frequency * t)
+        wave *= np.interp(t, times, levels) * peak
+        samples = wave.astype(np.int16)
+        return np.repeat(samples, channels).tobytes()
+
+    # 没有numpy时退回逐点计算（结果会被缓存，只需算一次）
+    samples = array("h")
+    for i in range(n_samples):
+        t = i / sample_rate
+        amplitude = _interp(t, times, levels)
+        value = sum(math.sin(2 * math.pi * f * t) for f in frequencies)
+        sample = int(value * amplitude * peak)
+        samples.extend([sample] * channels)
+    return samples.tobytes()
+
+
+def _interp(x, xs, ys):
+    """分段线性插值（np.interp的纯Python版本）"""
+    for i in range(1, len(xs)):
+        if x <= xs[i]:
+            span = xs[i] - xs[i - 1]
+            if span <= 0:
+                return ys[i]
+            return ys[i - 1] + (ys[i] - ys[i - 1]) * (x - xs[i - 1]) / span
+    return ys[-1]
+
+
+def tone_cache_key(params):
+    """根据合成参数计算缓存键"""
+    payload = json.dumps({"version": TONE_CACHE_VERSION, **params}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def load_tone(cache_dir, sample_rate=44100, channels=2, **overrides):
+    """读取缓存的提示音，缓存不存在时合成并写入磁盘"""
+    params = dict(DEFAULT_TONE)
+    params.update(overrides)
+    params["sample_rate"] = sample_rate
+    params["channels"] = channels
+    cache_path = os.path.join(cache_dir, f"tone_{tone_cache_key(params)}.pcm")
+
+    try:
+        with open(cache_path, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+
+    buf = synthesize_tone(**params)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再替换，避免留下半截缓存
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buf)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"写入提示音缓存出错: {e}")
+    return buf
@@ -0,0 +1,77 @@
+import threading
+
+
+class UiUpdates:
+    """界面更新通道：任意线程提交状态快照，Tk主线程按帧合并后只把有变化的值写入控件
+
+    Tk不是线程安全的，工作线程只能调用post()；写入控件总是在Tk主线程的after()回调中进行。
+    """
+
+    FRAME_MS = 50  # 同一帧内的多次提交合并为一次刷新
+    POLL_MS = 250  # 有工作线程提交时的拉取间隔
+
+    def __init__(self, widget, frame_ms=FRAME_MS):
+        self.widget = widget
+        self.frame_ms = frame_ms
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._shown = {}
+        self._targets = {}
+        self._armed = False
+        self._tk_thread = threading.get_ident()
+        self._watched = []
+        # 实际写入控件和因没有变化而跳过的次数
+        self.redraws = 0
+        self.skipped = 0
+
+    def bind(self, key, target):
+        """把键绑定到StringVar（或接受一个值的函数）"""
+        self._targets[key] = target.set if hasattr(target, "set") else target
+        self._shown[key] = target.get() if hasattr(target, "get") else None
+
+    def unbind(self, key):
+        self._targets.pop(key, None)
+        self._shown.pop(key, None)
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def post(self, **values):
+        """提交一组显示值（已格式化的文本），同一个键只保留最新的值"""
+        with self._lock:
+            self._pending.update(values)
+            arm = not self._armed and threading.get_ident() == self._tk_thread
+            if arm:
+                self._armed = True
+        if arm:
+            self.widget.after(self.frame_ms, self.flush)
+
+    def watch(self, thread):
+        """在工作线程存活期间定期拉取它提交的快照（在Tk主线程调用）"""
+        self._watched.append(thread)
+        if len(self._watched) == 1:
+            self.widget.after(self.POLL_MS, self._poll)
+
+    def flush(self):
+        """把待刷新的值写入控件，跳过与当前显示相同的值"""
+        with self._lock:
+            snapshot, self._pending = self._pending, {}
+            self._armed = False
+        for key, value in snapshot.items():
+            setter = self._targets.get(key)
+            if setter is None:
+                continue
+            if self._shown.get(key) == value:
+                self.skipped += 1
+                continue
+            self._shown[key] = value
+            setter(value)
+            self.redraws += 1
+
+    def _poll(self):
+        self.flush()
+        self._watched = [thread for thread in self._watched if thread.is_alive()]
+        if self._watched:
+            self.widget.after(self.POLL_MS, self._poll)
+        else:
+            # 线程结束前的最后一次提交
+            self.flush()
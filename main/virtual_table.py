@@ -0,0 +1,118 @@
+import tkinter as tk
+
+# 控件中实际存在的行数（应明显多于一屏能显示的行数）
+WINDOW_ROWS = 300
+
+
+class LazyRows:
+    """虚拟列表：控件中只保留固定数量的行（一个窗口），滚动接近窗口边缘时重新绑定窗口内的行，
+    滚动条由本类接管，按总行数显示位置和滑块大小"""
+
+    def __init__(self, widget, scrollbar, bind_rows, window_rows=WINDOW_ROWS):
+        self.widget = widget
+        self.scrollbar = scrollbar
+        self.bind_rows = bind_rows  # bind_rows(rows)：让控件恰好显示这些行
+        self.window_rows = window_rows
+        self.total = 0
+        self.row_at = None
+        self.first = 0  # 窗口第一行在全部数据中的下标
+        self.count = 0  # 窗口中的行数
+        self.rebinding = False
+        widget.configure(yscrollcommand=self.yscroll)
+        scrollbar.configure(command=self.yview)
+
+    def reset(self, total, row_at):
+        """更换数据源（例如重新排序后），回到第一行"""
+        self.total = total
+        self.row_at = row_at
+        self.bind(0)
+        self.widget.yview_moveto(0)
+
+    def bind(self, first):
+        """把窗口移到从first开始的行"""
+        first = max(0, min(first, self.total - self.window_rows))
+        end = min(first + self.window_rows, self.total)
+        self.bind_rows([self.row_at(i) for i in range(first, end)])
+        self.first = first
+        self.count = end - first
+
+    def show(self, top, visible=0):
+        """把第top行滚动到顶部，不在窗口中（或离边缘不足一屏）时先重新绑定，使它位于窗口中部"""
+        self.rebinding = False
+        if not self.total or not self.widget.winfo_exists():
+            return
+        top = max(0, min(int(top), self.total - 1))
+        if (top < self.first + visible and self.first > 0) or \
+                (top + 2 * visible > self.first + self.count and self.first + self.count < self.total) or \
+                not self.first <= top < self.first + self.count:
+            self.bind(top - (self.window_rows - visible) // 2)
+        self.widget.yview_moveto((top - self.first) / self.count)
+
+    def yview(self, *args):
+        """滚动条回调：拖动时按总行数定位，按钮和翻页交给控件滚动"""
+        if args and args[0] == "moveto":
+            self.show(float(args[1]) * self.total, self.visible_rows())
+        else:
+            self.widget.yview(*args)
+
+    def visible_rows(self):
+        first, last = self.widget.yview()
+        return int((float(last) - float(first)) * self.count)
+
+    def yscroll(self, first, last):
+        """控件滚动后的回调：把窗口内的位置换算为全部数据中的位置，接近窗口边缘时安排重新绑定"""
+        if not self.count:
+            self.scrollbar.set(0, 1)
+            return
+        top = float(first) * self.count
+        bottom = float(last) * self.count
+        self.scrollbar.set((self.first + top) / self.total, (self.first + bottom) / self.total)
+        visible = bottom - top
+        near_start = top < visible and self.first > 0
+        near_end = bottom + visible > self.count and self.first + self.count < self.total
+        if (near_start or near_end) and not self.rebinding:
+            self.rebinding = True
+            self.widget.after_idle(self.show, self.first + round(top), int(visible))
+
+
+class SortIndex:
+    """按列预先计算的排序下标，切换升降序时只需反向读取"""
+
+    def __init__(self, rows, keys):
+        self.rows = rows
+        self.keys = keys  # {列名: 取排序键的函数}
+        self.orders = {}
+
+    def order(self, column, descending=False):
+        if column not in self.orders:
+            key = self.keys[column]
+            self.orders[column] = sorted(range(len(self.rows)), key=lambda i: key(self.rows[i]))
+        ascending = self.orders[column]
+        n = len(ascending)
+        if descending:
+            return lambda i: self.rows[ascending[n - 1 - i]]
+        return lambda i: self.rows[ascending[i]]
+
+
+def lazy_treeview(tree, scrollbar, window_rows=WINDOW_ROWS):
+    """为ttk.Treeview创建虚拟列表：重新绑定时原地更新已有的行，只增删数量差"""
+    def bind_rows(rows):
+        items = tree.get_children()
+        for item, values in zip(items, rows):
+            tree.item(item, values=values)
+        if len(items) > len(rows):
+            tree.delete(*items[len(rows):])
+        for values in rows[len(items):]:
+            tree.insert("", tk.END, values=values)
+
+    return LazyRows(tree, scrollbar, bind_rows, window_rows)
+
+
+def lazy_listbox(listbox, scrollbar, window_rows=WINDOW_ROWS):
+    """为tk.Listbox创建虚拟列表"""
+    def bind_rows(rows):
+        listbox.delete(0, tk.END)
+        if rows:
+            listbox.insert(tk.END, *rows)
+
+    return LazyRows(listbox, scrollbar, bind_rows, window_rows)